@@ -0,0 +1,162 @@
+"""
+Admission Control Module
+Guards the expensive endpoints. Each endpoint runs at most a few computations
+at once with a short bounded queue behind them, identical requests already in
+flight share one computation, and every client has a token bucket per
+endpoint. Requests that cannot be admitted are rejected with a Retry-After
+hint instead of piling more work onto a loaded host
+"""
+import math
+import threading
+import time
+from config import Config
+from throttling import TokenBucket, InflightCall
+from instrumentation import ADMISSION_DECISIONS
+
+class AdmissionRejected(Exception):
+    """The endpoint or the client's budget is saturated; retry after `retry_after` seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _Endpoint:
+    def __init__(self, limits):
+        self.concurrency = limits['concurrency']
+        self.queue = limits['queue']
+        self.rate = limits['rate']
+        self.burst = limits['burst']
+        self.running = 0
+        self.waiting = 0
+        self.average_seconds = None     # EWMA of computation time, for Retry-After
+        self.slot_free = threading.Condition()
+
+class AdmissionController:
+    def __init__(self, limits=None):
+        limits = limits or Config.ADMISSION_LIMITS
+        self._endpoints = {name: _Endpoint(endpoint_limits) for name, endpoint_limits in limits.items()}
+        self._buckets = {}      # (client, endpoint) -> TokenBucket
+        self._inflight = {}     # (endpoint, key) -> InflightCall being computed
+        self._lock = threading.Lock()
+
+    def run(self, endpoint, client, compute, key=None):
+        """
+        Run `compute` for `client` if the endpoint admits it
+
+        Args:
+            endpoint: Name in ADMISSION_LIMITS
+            client: Identity the token bucket is kept for (the remote address)
+            compute: Function producing the result
+            key: Requests with the same endpoint and key share one computation
+
+        Returns:
+            The result of compute(), possibly computed for another request
+
+        Raises:
+            AdmissionRejected when the client is over its rate or the endpoint's
+            queue is full or did not drain in time
+        """
+        limits = self._endpoints[endpoint]
+        if not self._bucket(client, endpoint, limits).acquire(timeout=0):
+            ADMISSION_DECISIONS.inc(endpoint=endpoint, result='rate_limited')
+            raise AdmissionRejected(f'Too many {endpoint} requests from this client',
+                                    math.ceil(1 / limits.rate))
+
+        with self._lock:
+            call = self._inflight.get((endpoint, key))
+            leader = call is None
+            if leader:
+                call = self._inflight[(endpoint, key)] = InflightCall()
+
+        if not leader:
+            ADMISSION_DECISIONS.inc(endpoint=endpoint, result='coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            self._acquire_slot(endpoint, limits)
+            try:
+                started = time.monotonic()
+                call.result = compute()
+                return call.result
+            finally:
+                self._release_slot(limits, time.monotonic() - started)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop((endpoint, key), None)
+            call.done.set()
+
+    def status(self):
+        """Running and queued computations and the average time per endpoint"""
+        return {
+            name: {
+                'running': limits.running,
+                'queued': limits.waiting,
+                'concurrency': limits.concurrency,
+                'queue': limits.queue,
+                'average_seconds': round(limits.average_seconds, 2) if limits.average_seconds is not None else None
+            }
+            for name, limits in self._endpoints.items()
+        }
+
+    def _acquire_slot(self, endpoint, limits):
+        """Take a computation slot, queueing for up to ADMISSION_QUEUE_TIMEOUT seconds"""
+        with limits.slot_free:
+            if limits.running < limits.concurrency:
+                limits.running += 1
+                ADMISSION_DECISIONS.inc(endpoint=endpoint, result='admitted')
+                return
+            if limits.waiting >= limits.queue:
+                ADMISSION_DECISIONS.inc(endpoint=endpoint, result='queue_full')
+                raise AdmissionRejected(f'The {endpoint} endpoint is busy', self._retry_after(limits))
+
+            limits.waiting += 1
+            try:
+                admitted = limits.slot_free.wait_for(lambda: limits.running < limits.concurrency,
+                                                     timeout=Config.ADMISSION_QUEUE_TIMEOUT)
+            finally:
+                limits.waiting -= 1
+            if not admitted:
+                ADMISSION_DECISIONS.inc(endpoint=endpoint, result='queue_timeout')
+                raise AdmissionRejected(f'The {endpoint} endpoint is busy', self._retry_after(limits))
+            limits.running += 1
+            ADMISSION_DECISIONS.inc(endpoint=endpoint, result='queued')
+
+    @staticmethod
+    def _release_slot(limits, seconds):
+        with limits.slot_free:
+            limits.running -= 1
+            limits.average_seconds = (seconds if limits.average_seconds is None
+                                      else 0.8 * limits.average_seconds + 0.2 * seconds)
+            limits.slot_free.notify()
+
+    @staticmethod
+    def _retry_after(limits):
+        """Seconds until the running and queued computations should have drained"""
+        average = limits.average_seconds or 1
+        return max(1, math.ceil(average * (limits.waiting + limits.running) / limits.concurrency))
+
+    def _bucket(self, client, endpoint, limits):
+        with self._lock:
+            bucket = self._buckets.get((client, endpoint))
+            if bucket is None:
+                if len(self._buckets) >= Config.ADMISSION_MAX_CLIENTS:
+                    self._buckets.clear()   # forgetting idle clients only ever refills their buckets
+                bucket = self._buckets[(client, endpoint)] = TokenBucket(limits.rate, limits.burst)
+            return bucket
+
+_shared_controller = None
+_shared_lock = threading.Lock()
+
+def get_admission_controller():
+    """Return the process-wide controller shared by all request threads"""
+    global _shared_controller
+    with _shared_lock:
+        if _shared_controller is None:
+            _shared_controller = AdmissionController()
+        return _shared_controller
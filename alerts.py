@@ -0,0 +1,291 @@
+"""
+Alerts Module
+Turns IssueDiagnoser results into notifications. Issues are deduplicated by
+fingerprint (category and title), so only transitions are alerted: an issue
+firing, escalating or resolving. Transitions are queued in a bounded queue
+and a dispatcher thread batches them over a short window, groups them and
+delivers one notification per batch to each sink (webhook, file or syslog),
+retrying failed deliveries with backoff
+"""
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime
+from config import Config
+from issue_diagnosis import SEVERITY_RANK
+
+class WebhookSink:
+    name = 'webhook'
+
+    def __init__(self, url, timeout=None):
+        import requests
+        self.url = url
+        self.timeout = timeout or Config.ALERT_WEBHOOK_TIMEOUT
+        self._session = requests.Session()
+
+    def send(self, notification):
+        response = self._session.post(self.url, json=notification, timeout=self.timeout)
+        response.raise_for_status()
+
+class FileSink:
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, notification):
+        """Append the notification as one JSON line"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(notification, default=str) + '\n')
+
+class SyslogSink:
+    name = 'syslog'
+
+    def __init__(self, ident='sptool'):
+        import syslog     # Unix only
+        self._syslog = syslog
+        syslog.openlog(ident, 0, syslog.LOG_DAEMON)
+
+    def send(self, notification):
+        """One syslog line per alert, at warning level for firing and notice for resolved"""
+        for alert in notification['alerts']:
+            priority = self._syslog.LOG_NOTICE if alert['state'] == 'resolved' else self._syslog.LOG_WARNING
+            self._syslog.syslog(priority, f"[{alert['state']}] {alert['severity']} {alert['category']}: "
+                                          f"{alert['title']}")
+
+class AlertDispatcher:
+    def __init__(self, sinks, batch_window=None):
+        """
+        Args:
+            sinks: Objects with a `name` and a send(notification) that raises on failure
+            batch_window: Seconds transitions are collected before a notification
+        """
+        if Config.ALERT_MIN_SEVERITY not in SEVERITY_RANK:
+            raise ValueError(f'ALERT_MIN_SEVERITY must be one of {", ".join(SEVERITY_RANK)}, '
+                             f'not {Config.ALERT_MIN_SEVERITY!r}')
+        self.min_rank = SEVERITY_RANK[Config.ALERT_MIN_SEVERITY]
+        self.sinks = list(sinks)
+        self.sampler = None
+        self.diagnose = None
+        self.batch_window = Config.ALERT_BATCH_WINDOW if batch_window is None else batch_window
+        self.host = socket.gethostname()
+        self._queue = queue.Queue(maxsize=Config.ALERT_QUEUE_SIZE)
+        self._active = {}   # (category, title) -> {'since', 'severity', 'missed'}
+        self._last_submit = None
+        self._diagnosing = threading.Lock()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'queued': 0, 'dropped': 0, 'notifications': 0,
+                      'delivered': {sink.name: 0 for sink in self.sinks},
+                      'failed': {sink.name: 0 for sink in self.sinks},
+                      'last_error': None}
+
+    def start(self):
+        """Start the delivery thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='sptool-alerts', daemon=True)
+        self._thread.start()
+
+    def watch(self, sampler, diagnose):
+        """
+        Diagnose from the sampler's thread when nothing else has for ALERT_INTERVAL seconds
+
+        `diagnose` runs a diagnosis whose issues reach submit() through the
+        IssueDiagnoser listener, like those of dashboard requests.
+        """
+        self.sampler = sampler
+        self.diagnose = diagnose
+        sampler.add_listener(self.maybe_diagnose)
+
+    def stop(self, timeout=5):
+        """Deliver what is queued, then stop the delivery thread"""
+        if self._thread:
+            self._queue.put(None, timeout=timeout)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def flush(self, timeout=5):
+        """Wait until every queued transition has been delivered or given up on"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def maybe_diagnose(self):
+        """Sampler listener: diagnose when nothing else has within ALERT_INTERVAL seconds"""
+        interval = Config.ALERT_INTERVAL * getattr(self.sampler, 'slowdown', 1)
+        if self._last_submit is not None and time.monotonic() - self._last_submit < interval:
+            return
+        if not self._diagnosing.acquire(blocking=False):
+            return
+        self._last_submit = time.monotonic()
+        threading.Thread(target=self._diagnose_in_background, name='sptool-alerts-diagnose', daemon=True).start()
+
+    def _diagnose_in_background(self):
+        try:
+            self.diagnose()
+        except Exception as e:
+            self.stats['last_error'] = str(e)
+        finally:
+            self._diagnosing.release()
+
+    def submit(self, issues):
+        """
+        Compare a diagnosis with the active alerts and queue the transitions
+
+        Issues below ALERT_MIN_SEVERITY are ignored. An alert resolves after its
+        issue has been missing from ALERT_RESOLVE_AFTER diagnoses in a row.
+        """
+        now = time.time()
+        self._last_submit = time.monotonic()
+        current = {}
+        for issue in issues:
+            if SEVERITY_RANK.get(issue.get('severity'), 0) >= self.min_rank:
+                current[(issue.get('category'), issue.get('title'))] = issue
+
+        with self._lock:
+            for fingerprint, issue in current.items():
+                active = self._active.get(fingerprint)
+                if active is None:
+                    self._active[fingerprint] = {'since': now, 'severity': issue.get('severity'), 'missed': 0}
+                    self._enqueue('firing', issue, now, now)
+                    continue
+                active['missed'] = 0
+                if SEVERITY_RANK.get(issue.get('severity'), 0) > SEVERITY_RANK.get(active['severity'], 0):
+                    active['severity'] = issue.get('severity')
+                    self._enqueue('escalated', issue, active['since'], now)
+
+            for fingerprint in [fp for fp in self._active if fp not in current]:
+                active = self._active[fingerprint]
+                active['missed'] += 1
+                if active['missed'] >= Config.ALERT_RESOLVE_AFTER:
+                    del self._active[fingerprint]
+                    category, title = fingerprint
+                    self._enqueue('resolved', {'category': category, 'title': title,
+                                               'severity': active['severity']}, active['since'], now)
+
+    def _enqueue(self, state, issue, since, now):
+        alert = {
+            'state': state,
+            'category': issue.get('category'),
+            'title': issue.get('title'),
+            'severity': issue.get('severity'),
+            'description': issue.get('description'),
+            'since': datetime.fromtimestamp(since).isoformat(),
+            'at': datetime.fromtimestamp(now).isoformat()
+        }
+        try:
+            self._queue.put_nowait(alert)
+            self.stats['queued'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            alert = self._queue.get()
+            if alert is None:
+                self._queue.task_done()
+                break
+            batch = [alert]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < Config.ALERT_BATCH_MAX:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    alert = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if alert is None:
+                    stopping = True
+                    self._queue.task_done()
+                    break
+                batch.append(alert)
+            try:
+                self._deliver(self._notification(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _notification(self, batch):
+        """One payload for a batch, with alerts grouped by state, category and severity"""
+        groups = {}
+        for alert in batch:
+            key = (alert['state'], alert['category'], alert['severity'])
+            group = groups.setdefault(key, {'state': key[0], 'category': key[1], 'severity': key[2],
+                                            'count': 0, 'titles': []})
+            group['count'] += 1
+            if len(group['titles']) < Config.ALERT_GROUP_TITLES:
+                group['titles'].append(alert['title'])
+        firing = sum(1 for alert in batch if alert['state'] != 'resolved')
+        return {
+            'host': self.host,
+            'sent_at': datetime.now().isoformat(),
+            'summary': f'{self.host}: {firing} firing, {len(batch) - firing} resolved',
+            'groups': sorted(groups.values(), key=lambda g: (g['state'] == 'resolved',
+                                                             -SEVERITY_RANK.get(g['severity'], 0), g['category'])),
+            'alerts': batch
+        }
+
+    def _deliver(self, notification):
+        self.stats['notifications'] += 1
+        for sink in self.sinks:
+            for attempt in range(Config.ALERT_RETRIES + 1):
+                try:
+                    sink.send(notification)
+                    self.stats['delivered'][sink.name] += 1
+                    break
+                except Exception as e:
+                    self.stats['last_error'] = f'{sink.name}: {e}'
+                    if attempt == Config.ALERT_RETRIES:
+                        self.stats['failed'][sink.name] += 1
+                    else:
+                        time.sleep(Config.ALERT_RETRY_BACKOFF * 2 ** attempt)
+
+    def status(self):
+        """Active alerts, queue depth and delivery counts"""
+        with self._lock:
+            active = [{'category': category, 'title': title, 'severity': state['severity'],
+                       'since': datetime.fromtimestamp(state['since']).isoformat()}
+                      for (category, title), state in self._active.items()]
+        return {
+            'enabled': Config.ALERTS_ENABLED,
+            'sinks': [sink.name for sink in self.sinks],
+            'active': active,
+            'queue_depth': self._queue.qsize(),
+            'queued': self.stats['queued'],
+            'dropped': self.stats['dropped'],
+            'notifications': self.stats['notifications'],
+            'delivered': dict(self.stats['delivered']),
+            'failed': dict(self.stats['failed']),
+            'last_error': self.stats['last_error']
+        }
+
+def _configured_sinks():
+    sinks = []
+    if Config.ALERT_WEBHOOK_URL:
+        sinks.append(WebhookSink(Config.ALERT_WEBHOOK_URL))
+    if Config.ALERT_FILE:
+        sinks.append(FileSink(os.path.expanduser(Config.ALERT_FILE)))
+    if Config.ALERT_SYSLOG:
+        try:
+            sinks.append(SyslogSink())
+        except ImportError:
+            pass
+    return sinks
+
+_shared_dispatcher = None
+_shared_lock = threading.Lock()
+
+def get_alert_dispatcher():
+    """Return the process-wide dispatcher with the sinks from Config, started on first use"""
+    global _shared_dispatcher
+    with _shared_lock:
+        if _shared_dispatcher is None:
+            _shared_dispatcher = AlertDispatcher(_configured_sinks())
+            _shared_dispatcher.start()
+        return _shared_dispatcher
@@ -2,22 +2,61 @@
 SPTool - System Performance Troubleshooting Tool
 Flask application for diagnosing and fixing system issues
 """
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, g, Response
 from config import Config
 from system_diagnostics import SystemDiagnostics
 from command_executor import CommandExecutor
 from issue_diagnosis import IssueDiagnoser
 from chat_agent import ChatAgent
+from local_responder import LocalResponder
+from capabilities import get_capabilities
+from admission import get_admission_controller, AdmissionRejected
+from remediation import RemediationEngine
+from alerts import get_alert_dispatcher
+from metrics_history import get_metrics_history
+from metrics_sampler import get_sampler
+from disk_usage import get_disk_usage_analyzer
+from process_table import ProcessTable
+from process_groups import ProcessGroupAggregator
+from instrumentation import REGISTRY, HTTP_REQUEST_SECONDS
 import logging
+import os
+import threading
+import time
+from datetime import datetime
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Initialize modules
-diagnostics = SystemDiagnostics()
-executor = CommandExecutor()
-diagnoser = IssueDiagnoser()
-chat_agent = ChatAgent()
+class _Lazy:
+    """Stand-in that builds the real object on first attribute access"""
+    
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+    
+    def __getattr__(self, name):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return getattr(self._instance, name)
+
+# Initialize modules on first use so startup stays cheap; they share one SystemDiagnostics
+diagnostics = _Lazy(SystemDiagnostics)
+executor = _Lazy(CommandExecutor)
+diagnoser = _Lazy(lambda: IssueDiagnoser(diagnostics=diagnostics))
+chat_agent = _Lazy(lambda: ChatAgent(
+    diagnostics=diagnostics,
+    responder=LocalResponder(diagnoser=diagnoser, executor=executor)
+))
+# Policies diagnose through admission control, so they share in-flight diagnoses with the dashboard
+remediation = _Lazy(lambda: RemediationEngine(
+    diagnose=lambda: get_admission_controller().run('diagnosis', 'auto-remediation', diagnoser.diagnose_all),
+    executor=executor,
+    sampler=get_sampler()
+))
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +64,33 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+def _admit(endpoint, compute, key=None):
+    """Run an expensive computation through admission control for this client"""
+    return get_admission_controller().run(endpoint, request.remote_addr, compute, key=key)
+
+def _too_busy(error):
+    """429 with Retry-After for a request admission control turned away"""
+    response = jsonify({'success': False, 'error': f'{error}, retry in {error.retry_after}s',
+                        'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
 @app.route('/')
 def index():
     """Main dashboard page"""
@@ -39,12 +105,41 @@ def get_system_info():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/system/mode')
+def get_degraded_mode():
+    """Get degraded-host mode status: whether SPTool is throttling itself and why"""
+    try:
+        mode = diagnostics.get_degraded_mode()
+        return jsonify({'success': True, 'data': mode})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/system/disk-usage')
+def get_disk_usage_breakdown():
+    """Get the largest directories and files on a mountpoint"""
+    try:
+        mountpoint = request.args.get('mountpoint', '/')
+        wait = request.args.get('wait', 'false').lower() == 'true'
+        if mountpoint not in {partition.mountpoint for partition in diagnostics.source.disk_partitions()}:
+            return jsonify({'success': False, 'error': f'"{mountpoint}" is not a mounted filesystem'}), 400
+        report = _admit('disk_usage', lambda: get_disk_usage_analyzer().analyze(
+            mountpoint, wait=wait, defer=diagnostics.is_degraded()), key=(mountpoint, wait))
+        if 'error' in report:
+            return jsonify({'success': False, 'error': report['error']}), 400
+        return jsonify({'success': True, 'data': report})
+    except AdmissionRejected as e:
+        return _too_busy(e)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/system/diagnostic')
 def get_diagnostic():
     """Get full system diagnostic"""
     try:
-        diagnostic = diagnostics.get_full_diagnostic()
+        diagnostic = _admit('diagnostic', diagnostics.get_full_diagnostic)
         return jsonify({'success': True, 'data': diagnostic})
+    except AdmissionRejected as e:
+        return _too_busy(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -52,8 +147,10 @@ def get_diagnostic():
 def diagnose_full():
     """Run full system diagnosis and identify issues"""
     try:
-        diagnosis = diagnoser.diagnose_all()
+        diagnosis = _admit('diagnosis', diagnoser.diagnose_all)
         return jsonify({'success': True, 'data': diagnosis})
+    except AdmissionRejected as e:
+        return _too_busy(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -81,6 +178,14 @@ def get_available_fixes():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/fixes/capabilities')
+def get_fix_capabilities():
+    """Get the host capability probe and the fixes it ruled out"""
+    try:
+        return jsonify({'success': True, 'data': executor.get_capabilities()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/fixes/preview', methods=['POST'])
 def preview_fix():
     """Preview a fix without executing it"""
@@ -121,6 +226,66 @@ def execute_fix():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/fixes/effectiveness')
+def get_fix_effectiveness():
+    """Get measured before/after effectiveness per fix"""
+    try:
+        return jsonify({'success': True, 'data': executor.get_fix_effectiveness()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/fixes/progress/<fix_id>')
+def get_fix_progress(fix_id):
+    """Get the progress of a running native fix such as clear_temp"""
+    try:
+        progress = executor.get_progress(fix_id)
+        if 'error' in progress and 'state' not in progress:
+            return jsonify({'success': False, 'error': progress['error']}), 404
+        return jsonify({'success': True, 'data': progress})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/remediation')
+def remediation_status():
+    """Auto-remediation policies, their budgets and recent decisions"""
+    try:
+        return jsonify({'success': True, 'data': remediation.status()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/audit')
+def query_audit():
+    """Query the fix audit log by fix_id, outcome and time range"""
+    try:
+        if not executor.audit:
+            return jsonify({'success': False, 'error': 'Action logging is disabled'}), 503
+        
+        try:
+            since = _parse_time(request.args.get('since'))
+            until = _parse_time(request.args.get('until'))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'since/until must be epoch seconds or ISO 8601'}), 400
+        
+        records = executor.audit.query(
+            fix_id=request.args.get('fix_id'),
+            outcome=request.args.get('outcome'),
+            since=since,
+            until=until,
+            limit=min(request.args.get('limit', 100, type=int), 1000)
+        )
+        return jsonify({'success': True, 'data': records, 'pending': executor.audit.pending()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _parse_time(value):
+    """Parse epoch seconds or an ISO 8601 timestamp into epoch seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
 @app.route('/api/processes/top')
 def get_top_processes():
     """Get top CPU and memory consuming processes"""
@@ -130,6 +295,53 @@ def get_top_processes():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/processes/drilldown')
+def process_drilldown():
+    """Get top processes sorted by any drill-down metric"""
+    try:
+        sort_by = request.args.get('sort_by', 'cpu_percent')
+        limit = request.args.get('limit', 15, type=int)
+        
+        if sort_by not in ProcessTable.SORT_KEYS:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid sort_by. Choose from: {", ".join(ProcessTable.SORT_KEYS)}'
+            }), 400
+        
+        processes = diagnostics.get_process_drilldown(sort_by=sort_by, limit=limit)
+        return jsonify({'success': True, 'data': processes})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/processes/groups')
+def process_groups():
+    """Get resource usage aggregated by process tree, systemd unit or cgroup"""
+    try:
+        by = request.args.get('by', 'tree')
+        limit = request.args.get('limit', 15, type=int)
+        
+        if by not in ProcessGroupAggregator.GROUP_BY:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid grouping. Choose from: {", ".join(ProcessGroupAggregator.GROUP_BY)}'
+            }), 400
+        
+        groups = diagnostics.get_process_groups(by=by, limit=limit)
+        return jsonify({'success': True, 'data': groups})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/processes/<int:pid>/details')
+def process_details(pid):
+    """Get the full resource drill-down for a single process"""
+    try:
+        details = diagnostics.get_process_details(pid)
+        if 'error' in details:
+            return jsonify({'success': False, 'error': details['error']}), 404
+        return jsonify({'success': True, 'data': details})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/processes/validate/<int:pid>')
 def validate_process(pid):
     """Validate a process ID"""
@@ -150,15 +362,12 @@ def chat():
         if not message:
             return jsonify({'success': False, 'error': 'No message provided'}), 400
         
-        if not chat_agent.is_configured():
-            return jsonify({
-                'success': False,
-                'error': 'AI chat is not configured. Please add your OPENAI_API_KEY to the .env file.',
-                'response': None
-            }), 503
-        
-        result = chat_agent.chat(message, include_system_context=include_context)
+        # Without an API key the local knowledge base answers; identical messages in flight share one answer
+        result = _admit('chat', lambda: chat_agent.chat(message, include_system_context=include_context),
+                        key=(message, bool(include_context)))
         return jsonify(result)
+    except AdmissionRejected as e:
+        return _too_busy(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -175,13 +384,6 @@ def reset_chat():
 def quick_analysis():
     """Get quick AI analysis of system state"""
     try:
-        if not chat_agent.is_configured():
-            return jsonify({
-                'success': False,
-                'error': 'AI chat is not configured.',
-                'response': None
-            }), 503
-        
         result = chat_agent.get_quick_analysis()
         return jsonify(result)
     except Exception as e:
@@ -192,9 +394,58 @@ def chat_status():
     """Check if chat is configured and available"""
     return jsonify({
         'configured': chat_agent.is_configured(),
-        'api_key_set': bool(Config.OPENAI_API_KEY)
+        'api_key_set': bool(Config.OPENAI_API_KEY),
+        'local_available': True
     })
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: internal timings, counters and sampled host metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/alerts')
+def alerts_status():
+    """Active alerts, alert queue depth and delivery counts per sink"""
+    try:
+        return jsonify({'success': True, 'data': get_alert_dispatcher().status()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/history/snapshots')
+def history_snapshots():
+    """Ids and times of the recorded system snapshots"""
+    try:
+        return jsonify({'success': True, 'data': get_metrics_history().snapshots()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/history/diff')
+def history_diff():
+    """What changed between two snapshots: processes, mounts, interfaces and metrics"""
+    try:
+        try:
+            from_time = _parse_time(request.args.get('from'))
+            to_time = _parse_time(request.args.get('to'))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'from/to must be epoch seconds or ISO 8601'}), 400
+        from_id = request.args.get('from_id', type=int)
+        to_id = request.args.get('to_id', type=int)
+        if (from_id is None) == (from_time is None) or (to_id is not None and to_time is not None):
+            return jsonify({'success': False, 'error': 'Give the earlier snapshot as from or from_id, '
+                                                       'and the later one as at most one of to or to_id'}), 400
+        
+        result = get_metrics_history().diff(from_id=from_id, to_id=to_id, from_time=from_time, to_time=to_time)
+        if 'error' in result:
+            return jsonify({'success': False, **result}), 404
+        return jsonify({'success': True, 'data': result})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admission')
+def admission_status():
+    """Running and queued computations per guarded endpoint"""
+    return jsonify({'success': True, 'data': get_admission_controller().status()})
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
@@ -224,6 +475,22 @@ if __name__ == '__main__':
     Press CTRL+C to stop the server
     """)
     
+    # With the debug reloader this block also runs in the monitor process, which serves nothing;
+    # background workers start only in the serving process so they never run twice
+    serving = not app.config['DEBUG'] or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    if serving:
+        # Probe distro, binaries and sudo in the background so the first fix request does not wait
+        threading.Thread(target=get_capabilities, name='sptool-capabilities', daemon=True).start()
+        if Config.HISTORY_ENABLED:
+            get_metrics_history()
+        if Config.AUTO_REMEDIATION_ENABLED:
+            threading.Thread(target=remediation.start, name='sptool-remediation-start', daemon=True).start()
+        if Config.ALERTS_ENABLED:
+            dispatcher = get_alert_dispatcher()
+            diagnoser.add_listener(dispatcher.submit)
+            dispatcher.watch(get_sampler(), lambda: get_admission_controller().run('diagnosis', 'alerts',
+                                                                                   diagnoser.diagnose_all))
+    
     app.run(
         host=app.config['HOST'],
         port=app.config['PORT'],
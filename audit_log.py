@@ -0,0 +1,281 @@
+"""
+Audit Log Module
+Queue-backed writer for structured fix-execution records. Request threads only
+enqueue; a background thread flushes batches to SQLite with size-based rotation
+"""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    fix_id TEXT,
+    outcome TEXT NOT NULL,
+    dry_run INTEGER NOT NULL DEFAULT 0,
+    command TEXT,
+    params TEXT,
+    returncode INTEGER,
+    error TEXT,
+    duration_ms REAL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_audit_fix_ts ON audit (fix_id, ts);
+CREATE INDEX IF NOT EXISTS idx_audit_outcome_ts ON audit (outcome, ts);
+CREATE INDEX IF NOT EXISTS idx_audit_ts ON audit (ts);
+"""
+
+COLUMNS = ('ts', 'timestamp', 'fix_id', 'outcome', 'dry_run', 'command', 'params',
+           'returncode', 'error', 'duration_ms', 'extra')
+
+class AuditLog:
+    def __init__(self, path=None, max_bytes=None, backup_count=None):
+        self.path = path or Config.AUDIT_DB_FILE
+        self.max_bytes = max_bytes or Config.AUDIT_MAX_BYTES
+        self.backup_count = backup_count if backup_count is not None else Config.AUDIT_BACKUP_COUNT
+        self.batch_size = Config.AUDIT_BATCH_SIZE
+        self.flush_interval = Config.AUDIT_FLUSH_INTERVAL
+        self.dropped = 0
+        self.rotation_errors = 0    # failed roll-overs; the records stay in the current file
+        self._queue = queue.Queue(maxsize=Config.AUDIT_QUEUE_SIZE)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._conn = None
+
+    def start(self):
+        """Start the background writer thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='sptool-audit', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush outstanding records and stop the writer"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def record(self, fix_id, outcome, **fields):
+        """
+        Queue a structured audit record without waiting for disk I/O
+
+        Args:
+            fix_id: ID of the fix the record is about
+            outcome: 'dry_run', 'success', 'failure', 'timeout', 'error' or 'rejected'
+            **fields: command, params, dry_run, returncode, error, duration_ms;
+                      anything else is stored as JSON in 'extra'
+        
+        Returns:
+            The record's timestamp, which identifies it for annotate()
+        """
+        now = time.time()
+        entry = {
+            'ts': now,
+            'timestamp': datetime.fromtimestamp(now).isoformat(),
+            'fix_id': fix_id,
+            'outcome': outcome,
+            'dry_run': int(bool(fields.pop('dry_run', False))),
+            'command': fields.pop('command', None),
+            'params': json.dumps(fields.pop('params', None), default=str),
+            'returncode': fields.pop('returncode', None),
+            'error': fields.pop('error', None),
+            'duration_ms': fields.pop('duration_ms', None),
+            'extra': json.dumps(fields, default=str) if fields else None,
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+        return now
+
+    def annotate(self, fix_id, ts, **fields):
+        """Queue extra fields to merge into an already recorded entry, e.g. a measured fix impact"""
+        try:
+            self._queue.put_nowait({'annotate': (fix_id, ts), 'fields': fields})
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5):
+        """Wait until every queued record has been written; False if some are still queued"""
+        if not self._thread:
+            self._write_batch(self._drain())
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and self._thread.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def pending(self):
+        """Records queued but not yet written"""
+        return self._queue.unfinished_tasks
+
+    def query(self, fix_id=None, outcome=None, since=None, until=None, limit=100):
+        """
+        Query audit records, newest first, across the current and rotated files
+
+        Waits at most AUDIT_QUERY_WAIT seconds for queued records, then reads
+        what is written; pending() tells how many records were left out.
+
+        Args:
+            fix_id: Only records for this fix
+            outcome: Only records with this outcome
+            since/until: Epoch seconds bounding the record time
+            limit: Maximum number of records
+
+        Returns:
+            List of record dictionaries
+        """
+        self.flush(timeout=Config.AUDIT_QUERY_WAIT)
+
+        clauses = []
+        args = []
+        if fix_id:
+            clauses.append('fix_id = ?')
+            args.append(fix_id)
+        if outcome:
+            clauses.append('outcome = ?')
+            args.append(outcome)
+        if since is not None:
+            clauses.append('ts >= ?')
+            args.append(since)
+        if until is not None:
+            clauses.append('ts <= ?')
+            args.append(until)
+        where = f'WHERE {" AND ".join(clauses)}' if clauses else ''
+        sql = f'SELECT {", ".join(COLUMNS)} FROM audit {where} ORDER BY ts DESC LIMIT ?'
+
+        records = []
+        for path in self._files():
+            if len(records) >= limit:
+                break
+            conn = None
+            try:
+                conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+                rows = conn.execute(sql, args + [limit - len(records)]).fetchall()
+            except sqlite3.Error:
+                rows = []
+            finally:
+                if conn is not None:
+                    conn.close()
+            for row in rows:
+                record = dict(zip(COLUMNS, row))
+                record['dry_run'] = bool(record['dry_run'])
+                record['params'] = json.loads(record['params']) if record['params'] else None
+                extra = record.pop('extra')
+                if extra:
+                    record.update(json.loads(extra))
+                records.append(record)
+
+        return records
+
+    def _run(self):
+        while True:
+            stopping = self._stop_event.is_set()
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if stopping:
+                    break
+                continue
+            batch = [first] + self._drain(self.batch_size - 1)
+            self._write_batch(batch)
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def _drain(self, limit=None):
+        batch = []
+        while limit is None or len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    f'INSERT INTO audit ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})',
+                    [tuple(entry[column] for column in COLUMNS) for entry in batch if 'annotate' not in entry]
+                )
+                # Annotations are queued after their record, so it is already inserted
+                for entry in batch:
+                    if 'annotate' in entry:
+                        self._apply_annotation(conn, *entry['annotate'], entry['fields'])
+        except sqlite3.Error:
+            self.dropped += len(batch)
+        else:
+            try:
+                self._rotate_if_needed()
+            except OSError:
+                # The batch is committed; keep writing to the current file and retry next batch
+                self.rotation_errors += 1
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    @staticmethod
+    def _apply_annotation(conn, fix_id, ts, fields):
+        row = conn.execute('SELECT id, extra FROM audit WHERE fix_id = ? AND ts = ?', (fix_id, ts)).fetchone()
+        if row is None:
+            return      # rotated out in the meantime
+        extra = json.loads(row[1]) if row[1] else {}
+        extra.update(fields)
+        conn.execute('UPDATE audit SET extra = ? WHERE id = ?', (json.dumps(extra, default=str), row[0]))
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _rotate_if_needed(self):
+        """Roll the database over to .1, .2, ... once it exceeds max_bytes"""
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return
+
+        self._conn.close()
+        self._conn = None
+        for index in range(self.backup_count - 1, 0, -1):
+            src = f'{self.path}.{index}'
+            if os.path.exists(src):
+                os.replace(src, f'{self.path}.{index + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+    def _files(self):
+        """Current file first, then rotated files from newest to oldest"""
+        paths = [self.path] + [f'{self.path}.{i}' for i in range(1, self.backup_count + 1)]
+        return [path for path in paths if os.path.exists(path)]
+
+_shared_audit_log = None
+_shared_lock = threading.Lock()
+
+def get_audit_log():
+    """Return the process-wide audit log, starting its writer on first use"""
+    global _shared_audit_log
+    with _shared_lock:
+        if _shared_audit_log is None:
+            _shared_audit_log = AuditLog()
+            _shared_audit_log.start()
+        return _shared_audit_log
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for SPTool
+Measures latency (p50/p99) and allocations of the diagnostic, diagnosis and
+API hot paths against a deterministic psutil stub, and compares the results
+with a stored baseline
+
+Usage:
+    python benchmark.py                      # run and compare with benchmark_baseline.json
+    python benchmark.py --save-baseline      # run and store the results as the new baseline
+    python benchmark.py --processes 5000     # synthetic process count for the stub
+
+The API run also times a cold `import app` in fresh interpreters and lists the
+slowest imports, since SPTool is often started on demand on loaded hosts.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import psutil
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+svmem = namedtuple('svmem', 'total available percent used free')
+sswap = namedtuple('sswap', 'total used free percent sin sout')
+scpufreq = namedtuple('scpufreq', 'current min max')
+scputimes = namedtuple('scputimes', 'user nice system idle iowait irq softirq steal')
+sdiskpart = namedtuple('sdiskpart', 'device mountpoint fstype opts')
+sdiskusage = namedtuple('sdiskusage', 'total used free percent')
+sdiskio = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes read_time write_time busy_time')
+snetio = namedtuple('snetio', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+snicstats = namedtuple('snicstats', 'isup duplex speed mtu')
+snicaddr = namedtuple('snicaddr', 'family address netmask broadcast ptp')
+sconn = namedtuple('sconn', 'fd family type laddr raddr status pid')
+shwtemp = namedtuple('shwtemp', 'label current high critical')
+pmem = namedtuple('pmem', 'rss vms')
+pfullmem = namedtuple('pfullmem', 'rss vms uss')
+pctxsw = namedtuple('pctxsw', 'voluntary involuntary')
+pio = namedtuple('pio', 'read_count write_count read_bytes write_bytes')
+
+class FakeProcess:
+    """Stand-in for psutil.Process backed by a synthetic process record"""
+
+    def __init__(self, fake, pid):
+        if pid not in fake.processes:
+            raise psutil.NoSuchProcess(pid)
+        self._fake = fake
+        self._record = fake.processes[pid]
+        self.pid = pid
+        self.info = {}
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def name(self):
+        return self._record['name']
+
+    def ppid(self):
+        return self._record['ppid']
+
+    def create_time(self):
+        return self._record['create_time']
+
+    def cpu_percent(self, interval=None):
+        return self._record['cpu_percent']
+
+    def memory_percent(self):
+        return self._record['memory_percent']
+
+    def memory_info(self):
+        return pmem(self._record['rss'], self._record['rss'] * 2)
+
+    def memory_full_info(self):
+        return pfullmem(self._record['rss'], self._record['rss'] * 2, int(self._record['rss'] * 0.8))
+
+    def num_threads(self):
+        return self._record['num_threads']
+
+    def num_fds(self):
+        return self._record['num_fds']
+
+    def num_ctx_switches(self):
+        ticks = self._fake.ticks
+        return pctxsw(self._record['ctx'] * ticks, ticks)
+
+    def io_counters(self):
+        ticks = self._fake.ticks
+        return pio(ticks, ticks, self._record['io_rate'] * ticks, self._record['io_rate'] * ticks // 2)
+
+class FakePsutil:
+    """
+    Deterministic data source (see data_sources.py) with the psutil functions SPTool calls.
+    Cumulative counters advance on every call so rate computations have data,
+    and interval-based calls sleep for interval * blocking_scale so blocking
+    collection still shows up in the timings
+    """
+    NoSuchProcess = psutil.NoSuchProcess
+    AccessDenied = psutil.AccessDenied
+    ZombieProcess = psutil.ZombieProcess
+    Process = None  # bound per instance in __init__
+
+    def __init__(self, num_processes=1000, num_cpus=8, seed=42, blocking_scale=0.01):
+        rng = random.Random(seed)
+        self.num_cpus = num_cpus
+        self.blocking_scale = blocking_scale
+        self.ticks = 1
+        self.processes = {}
+        for pid in range(1, num_processes + 1):
+            self.processes[pid] = {
+                'name': f'proc-{pid % 97}',
+                'ppid': 0 if pid == 1 else rng.randint(1, max(1, pid - 1)),
+                'create_time': 1_700_000_000 + pid,
+                'cpu_percent': round(rng.expovariate(1 / 3), 1),
+                'memory_percent': round(rng.expovariate(1 / 0.5), 2),
+                'rss': rng.randint(1, 500) * 1024 * 1024,
+                'num_threads': rng.randint(1, 64),
+                'num_fds': rng.randint(3, 2000),
+                'ctx': rng.randint(1, 500),
+                'io_rate': rng.randint(0, 1_000_000),
+            }
+        self.Process = lambda pid: FakeProcess(self, pid)
+
+    def _advance(self):
+        self.ticks += 1
+        return self.ticks
+
+    def _block(self, interval):
+        if interval:
+            time.sleep(interval * self.blocking_scale)
+
+    def cpu_percent(self, interval=None, percpu=False):
+        self._block(interval)
+        if percpu:
+            return [50.0 + i for i in range(self.num_cpus)]
+        return 55.0
+
+    def cpu_count(self, logical=True):
+        return self.num_cpus
+
+    def cpu_freq(self, percpu=False):
+        freq = scpufreq(2400.0, 800.0, 3600.0)
+        return [freq] * self.num_cpus if percpu else freq
+
+    def cpu_times(self, percpu=False):
+        t = self._advance()
+        times = scputimes(t * 5, 0, t * 2, t * 3, 0, 0, 0, 0)
+        return [times] * self.num_cpus if percpu else times
+
+    def getloadavg(self):
+        return (1.5, 1.2, 1.0)
+
+    def virtual_memory(self):
+        total = 16 * 1024 ** 3
+        return svmem(total, total // 3, 66.7, total // 2, total // 6)
+
+    def swap_memory(self):
+        return sswap(4 * 1024 ** 3, 1024 ** 3, 3 * 1024 ** 3, 25.0, 0, 0)
+
+    def disk_partitions(self, all=False):
+        return [sdiskpart('/dev/sda1', '/', 'ext4', 'rw'),
+                sdiskpart('/dev/sdb1', '/data', 'xfs', 'rw')]
+
+    def disk_usage(self, path):
+        return sdiskusage(500 * 1024 ** 3, 400 * 1024 ** 3, 100 * 1024 ** 3, 80.0)
+
+    def disk_io_counters(self, perdisk=False):
+        t = self._advance()
+        counters = sdiskio(t * 100, t * 50, t * 4096 * 100, t * 4096 * 50, t * 200, t * 100, t * 500)
+        return {'sda': counters, 'sda1': counters, 'sdb': counters, 'sdb1': counters} if perdisk else counters
+
+    def net_io_counters(self, pernic=False):
+        t = self._advance()
+        counters = snetio(t * 10 ** 6, t * 2 * 10 ** 6, t * 1000, t * 2000, 0, 0, 0, 0)
+        return {'lo': counters, 'eth0': counters} if pernic else counters
+
+    def net_if_stats(self):
+        return {'lo': snicstats(True, 0, 0, 65536), 'eth0': snicstats(True, 2, 1000, 1500)}
+
+    def net_if_addrs(self):
+        return {'lo': [snicaddr(2, '127.0.0.1', '255.0.0.0', None, None)],
+                'eth0': [snicaddr(2, '10.0.0.2', '255.255.255.0', None, None)]}
+
+    def net_connections(self, kind='inet'):
+        states = ['ESTABLISHED'] * 50 + ['TIME_WAIT'] * 20 + ['LISTEN'] * 5
+        return [sconn(-1, 2, 1, None, None, status, None) for status in states]
+
+    def pids(self):
+        return list(self.processes)
+
+    def process_iter(self, attrs=None):
+        for pid in self.processes:
+            proc = FakeProcess(self, pid)
+            if attrs:
+                proc.info = {attr: (pid if attr == 'pid' else getattr(proc, attr)()) for attr in attrs}
+            yield proc
+
+    def boot_time(self):
+        return time.time() - 86400
+
+    def sensors_temperatures(self):
+        return {'coretemp': [shwtemp(f'Core {i}', 55.0, 80.0, 95.0) for i in range(self.num_cpus)]}
+
+    # Data source extensions beyond psutil (see data_sources.LiveSource)
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def pressure(self):
+        psi = {'avg10': 1.0, 'avg60': 1.0, 'avg300': 1.0, 'total': self.ticks * 1000}
+        return {
+            'psi_available': True,
+            'psi': {resource: {'some': dict(psi), 'full': dict(psi)} for resource in ('cpu', 'memory', 'io')},
+            'cpu_count': self.num_cpus,
+            'load_average': list(self.getloadavg()),
+            'load_per_cpu': round(self.getloadavg()[0] / self.num_cpus, 2),
+            'runnable': 2,
+            'total_threads': len(self.processes)
+        }
+
+    def process_groups(self, limit=10):
+        return {by: {'available': False} for by in ('tree', 'unit', 'cgroup')}
+
+def measure(func, iterations, warmup=2):
+    """Run func repeatedly and return latency percentiles and allocations"""
+    for _ in range(warmup):
+        func()
+
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return _summarize(durations, peak_alloc_bytes=peak, retained_bytes=retained)
+
+def measure_concurrent(func, requests, workers):
+    """Call func from several threads at once and return per-call latency percentiles"""
+    def timed_call(_):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        durations = list(pool.map(timed_call, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    result = _summarize(durations)
+    result['throughput_rps'] = round(requests / elapsed, 1)
+    result['workers'] = workers
+    return result
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    max_rss_kb = None
+print(json.dumps({{'elapsed': elapsed, 'max_rss_kb': max_rss_kb, 'openai': 'openai' in sys.modules}}))
+"""
+
+def measure_import(module='app', runs=5, top=5):
+    """
+    Time a cold import of `module` in fresh interpreters
+
+    Returns the latency summary plus the child's peak RSS, whether openai was
+    imported, and the slowest imports by cumulative time from -X importtime
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    durations = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', IMPORT_SCRIPT.format(module=module)],
+            cwd=here, capture_output=True, text=True, check=True
+        )
+        child = json.loads(completed.stdout.strip().splitlines()[-1])
+        durations.append(child['elapsed'])
+
+    # "import time: self [us] | cumulative | imported package" from the last run;
+    # nesting is shown by indentation, keep the modules `module` imports directly
+    imports = []
+    for line in completed.stderr.splitlines():
+        fields = line.split('|')
+        if line.startswith('import time:') and len(fields) == 3 and fields[1].strip().isdigit():
+            name = fields[2][1:]
+            indent = len(name) - len(name.lstrip())
+            if indent == 0:
+                if name == module:
+                    break
+                imports = []    # interpreter startup (site), not part of the import
+            elif indent == 2:
+                imports.append((name.strip(), int(fields[1])))
+    slowest = sorted(imports, key=lambda item: item[1], reverse=True)
+
+    return _summarize(
+        durations,
+        max_rss_kb=child['max_rss_kb'],
+        imports_openai=child['openai'],
+        slowest_imports=[(name, round(us / 1000, 1)) for name, us in slowest[:top]]
+    )
+
+def _summarize(durations, **extra):
+    ordered = sorted(durations)
+    p99_index = min(len(ordered) - 1, int(round(0.99 * (len(ordered) - 1))))
+    result = {
+        'iterations': len(ordered),
+        'p50_ms': round(statistics.median(ordered) * 1000, 3),
+        'p99_ms': round(ordered[p99_index] * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+    }
+    result.update(extra)
+    return result
+
+def run_benchmarks(iterations=20, processes=2000, concurrency=8, include_api=True):
+    """
+    Run every benchmark case against the psutil stub
+
+    Returns:
+        Dictionary of case name -> measurement
+    """
+    from system_diagnostics import SystemDiagnostics
+    from issue_diagnosis import IssueDiagnoser
+
+    fake = FakePsutil(num_processes=processes)
+    results = {}
+
+    diagnostics = SystemDiagnostics(source=fake)
+    diagnoser = IssueDiagnoser(diagnostics=diagnostics)
+    diagnostics.sampler.sample_once()
+    diagnostics.sampler.sample_once()
+
+    results['get_full_diagnostic'] = measure(diagnostics.get_full_diagnostic, iterations)
+    results['get_top_processes'] = measure(lambda: diagnostics.get_top_processes(limit=15), iterations)
+    results['get_process_drilldown'] = measure(
+        lambda: diagnostics.get_process_drilldown(sort_by='rss_mb', limit=15), iterations)
+    results['diagnose_all'] = measure(diagnoser.diagnose_all, iterations)
+    results['diagnose_symptom'] = measure(lambda: diagnoser.diagnose_symptom('my computer is slow'), iterations)
+
+    if include_api:
+        results['import_app'] = measure_import('app', runs=min(iterations, 5))
+        import app as sptool_app
+        from admission import AdmissionController
+        from config import Config
+        # Every test-client request comes from one address; admit them all so the endpoints are measured
+        requests = iterations * concurrency
+        admission = AdmissionController({
+            endpoint: {'concurrency': concurrency, 'queue': requests, 'rate': requests, 'burst': requests}
+            for endpoint in Config.ADMISSION_LIMITS
+        })
+        with mock.patch.object(sptool_app, 'diagnostics', diagnostics), \
+                mock.patch.object(sptool_app, 'diagnoser', diagnoser), \
+                mock.patch.object(sptool_app, 'get_admission_controller', lambda: admission):
+            client_app = sptool_app.app
+            for name, path in (('api_processes_top', '/api/processes/top'),
+                               ('api_diagnosis_full', '/api/diagnosis/full'),
+                               ('api_system_diagnostic', '/api/system/diagnostic')):
+                results[name] = measure_concurrent(
+                    lambda path=path: _get_ok(client_app, path),
+                    requests=requests,
+                    workers=concurrency
+                )
+
+    return results
+
+def _get_ok(client_app, path):
+    """GET through the test client; a timed request that did not succeed would time the error path"""
+    response = client_app.test_client().get(path)
+    assert response.status_code == 200, f'{path} returned {response.status_code}: {response.get_data(as_text=True)}'
+    return response
+
+def compare(results, baseline, tolerance):
+    """Compare p50/p99 with the baseline; returns a list of regression descriptions"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            if base.get(key) and current[key] > base[key] * (1 + tolerance):
+                regressions.append(f'{name} {key}: {base[key]} -> {current[key]} ms')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='SPTool benchmark suite')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=2000, help='Synthetic process count')
+    parser.add_argument('--concurrency', type=int, default=8, help='Threads for API load')
+    parser.add_argument('--no-api', action='store_true', help='Skip the Flask endpoint cases')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before flagging (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        iterations=args.iterations,
+        processes=args.processes,
+        concurrency=args.concurrency,
+        include_api=not args.no_api
+    )
+
+    print("=" * 78)
+    print(f"{'Case':<28}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'peak KB':>10}{'rps':>10}")
+    print("=" * 78)
+    for name, result in results.items():
+        alloc = result.get('peak_alloc_bytes')
+        print(f"{name:<28}{result['p50_ms']:>10}{result['p99_ms']:>10}{result['mean_ms']:>10}"
+              f"{(round(alloc / 1024, 1) if alloc is not None else '-'):>10}"
+              f"{result.get('throughput_rps', '-'):>10}")
+    print("=" * 78)
+
+    startup = results.get('import_app')
+    if startup:
+        print(f"Import profile for app: p50 {startup['p50_ms']} ms, peak RSS "
+              f"{startup['max_rss_kb']} KB, openai imported: {startup['imports_openai']}")
+        for name, ms in startup['slowest_imports']:
+            print(f"   {name:<40}{ms:>8} ms")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("⚠️  Regressions against baseline:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        return 1
+
+    print("✅ No regressions against baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
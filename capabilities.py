@@ -0,0 +1,136 @@
+"""
+Capabilities Module
+Probes once per process what the host can actually run: the distro, its
+package manager, binaries on PATH and whether sudo works without a password.
+CommandExecutor uses the result to offer only fixes that can succeed here
+"""
+import os
+import platform
+import shutil
+import subprocess
+import threading
+import time
+from config import Config
+
+# Package managers in the order they are preferred when several are installed
+PACKAGE_MANAGERS = ('pacman', 'apt-get', 'dnf', 'yum', 'zypper', 'apk')
+
+# Admin tools often live in sbin, which is not on PATH for regular users
+EXTRA_PATH = ('/usr/local/sbin', '/usr/sbin', '/sbin')
+
+class CapabilityProbe:
+    def __init__(self):
+        self.os_type = platform.system()
+        self._which = {}
+        self._lock = threading.Lock()
+        self._search_path = self._build_search_path()
+        self.distro = None
+        self.package_manager = None
+        self.systemd = False
+        self.is_root = False
+        self.sudo = False
+        self.probe_ms = None
+
+    def probe(self):
+        """Detect the distro, package manager, init system and privileges"""
+        started = time.monotonic()
+        self.distro = self._read_distro()
+        self.package_manager = next((pm for pm in PACKAGE_MANAGERS if self.which(pm)), None)
+        self.systemd = os.path.isdir('/run/systemd/system')
+        self.is_root = self._is_admin()
+        self.sudo = self.is_root or self._sudo_non_interactive()
+        self.probe_ms = round((time.monotonic() - started) * 1000, 1)
+        return self
+
+    def which(self, name):
+        """Cached shutil.which over PATH plus the sbin directories"""
+        with self._lock:
+            if name not in self._which:
+                self._which[name] = shutil.which(name, path=self._search_path)
+            return self._which[name]
+
+    def has(self, name):
+        """Whether a capability is available: 'sudo', 'systemd' or a binary name"""
+        if name == 'sudo':
+            return self.sudo
+        if name == 'systemd':
+            return self.systemd
+        return self.which(name) is not None
+
+    def missing(self, requires):
+        """The capabilities in `requires` that this host lacks"""
+        return [name for name in requires if not self.has(name)]
+
+    def summary(self):
+        """Probe results for the API"""
+        with self._lock:
+            binaries = dict(self._which)
+        return {
+            'os': self.os_type,
+            'distro': self.distro,
+            'package_manager': self.package_manager,
+            'systemd': self.systemd,
+            'is_root': self.is_root,
+            'sudo_non_interactive': self.sudo,
+            'binaries': binaries,
+            'probe_ms': self.probe_ms
+        }
+
+    @staticmethod
+    def _build_search_path():
+        entries = os.environ.get('PATH', os.defpath).split(os.pathsep)
+        if platform.system() != 'Windows':
+            entries += [entry for entry in EXTRA_PATH if entry not in entries]
+        return os.pathsep.join(entries)
+
+    def _read_distro(self):
+        """ID, ID_LIKE and PRETTY_NAME from os-release on Linux, the release elsewhere"""
+        if self.os_type != 'Linux':
+            return {'id': self.os_type.lower(), 'like': [], 'name': f'{self.os_type} {platform.release()}'}
+        fields = {}
+        for path in ('/etc/os-release', '/usr/lib/os-release'):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        key, sep, value = line.strip().partition('=')
+                        if sep:
+                            fields[key] = value.strip('"\'')
+                break
+            except OSError:
+                continue
+        return {
+            'id': fields.get('ID', 'linux'),
+            'like': fields.get('ID_LIKE', '').split(),
+            'name': fields.get('PRETTY_NAME', 'Linux')
+        }
+
+    def _is_admin(self):
+        if self.os_type == 'Windows':
+            try:
+                import ctypes
+                return bool(ctypes.windll.shell32.IsUserAnAdmin())
+            except Exception:
+                return False
+        return hasattr(os, 'geteuid') and os.geteuid() == 0
+
+    def _sudo_non_interactive(self):
+        """True if sudo runs without prompting, i.e. NOPASSWD or cached credentials"""
+        if self.os_type == 'Windows' or not self.which('sudo'):
+            return False
+        try:
+            result = subprocess.run(['sudo', '-n', 'true'], capture_output=True,
+                                    timeout=Config.CAPABILITY_SUDO_TIMEOUT)
+            return result.returncode == 0
+        except (subprocess.TimeoutExpired, OSError):
+            return False
+
+_shared_probe = None
+_shared_lock = threading.Lock()
+
+def get_capabilities():
+    """Return the process-wide probe, running it on first use"""
+    global _shared_probe
+    with _shared_lock:
+        if _shared_probe is None:
+            _shared_probe = CapabilityProbe().probe()
+        return _shared_probe
@@ -2,18 +2,40 @@
 AI Chat Agent Module for SPTool
 Provides intelligent troubleshooting assistance using OpenAI
 """
-import openai
 from config import Config
-from system_diagnostics import SystemDiagnostics
+from instrumentation import CHAT_SECONDS, CHAT_TOKENS
+from openai_client import get_openai_client
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 class ChatAgent:
-    def __init__(self):
+    def __init__(self, diagnostics=None, responder=None):
         self.api_key = Config.OPENAI_API_KEY
-        if self.api_key:
-            openai.api_key = self.api_key
-        self.diagnostics = SystemDiagnostics()
+        self._diagnostics = diagnostics
+        self._responder = responder
+        self.client = get_openai_client()
         self.conversation_history = []
+        self._llm_pool = ThreadPoolExecutor(max_workers=Config.OPENAI_MAX_CONCURRENCY,
+                                            thread_name_prefix='sptool-chat')
+    
+    @property
+    def diagnostics(self):
+        if self._diagnostics is None:
+            from system_diagnostics import SystemDiagnostics
+            self._diagnostics = SystemDiagnostics()
+        return self._diagnostics
+    
+    @property
+    def responder(self):
+        """Local knowledge-base responder used offline and when it is confident"""
+        if self._responder is None:
+            from local_responder import LocalResponder
+            self._responder = LocalResponder()
+        return self._responder
         
     def is_configured(self):
         """Check if OpenAI API key is configured"""
@@ -39,17 +61,62 @@ class ChatAgent:
         except Exception as e:
             return {'error': str(e)}
     
-    def chat(self, user_message, include_system_context=True):
+    def chat(self, user_message, include_system_context=True, coalesce=False, use_history=True):
         """
         Send a message to the AI agent and get a response
         
         Args:
             user_message: The user's message
             include_system_context: Whether to include current system diagnostics
+            coalesce: Share the answer with an identical request already in flight
+            use_history: Send the conversation so far and add this exchange to it
             
         Returns:
             Dictionary with response and metadata
         """
+        started = time.perf_counter()
+        result = self._respond(user_message, include_system_context, coalesce, use_history)
+        if result.get('source') == 'local':
+            outcome = 'local'
+        else:
+            outcome = 'success' if result.get('success') else 'error'
+        CHAT_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        return result
+    
+    def _respond(self, user_message, include_system_context, coalesce, use_history=True):
+        """
+        Answer locally when the knowledge base is confident or OpenAI is not
+        configured; otherwise ask OpenAI, falling back to the local answer (marked
+        'fallback') if it fails, raises or takes longer than CHAT_LLM_WAIT seconds
+        """
+        remember = self._remember if use_history else (lambda user, assistant: None)
+        local = self.responder.answer(user_message)
+        if local['confident'] or not self.is_configured():
+            remember(user_message, local['response'])
+            return local
+        
+        future = self._llm_pool.submit(self._chat, user_message, include_system_context, coalesce, use_history)
+        try:
+            result = future.result(timeout=Config.CHAT_LLM_WAIT)
+        except FutureTimeout:
+            result = {'success': False, 'error': 'The AI assistant did not answer in time'}
+        except Exception as e:
+            # openai errors raised before _chat's handlers, connection errors, openai not installed
+            logger.warning('AI assistant request failed, answering locally: %r', e)
+            result = {'success': False, 'error': f'The AI assistant failed: {e}'}
+        
+        if result.get('success'):
+            remember(user_message, result['response'])
+            return dict(result, source='openai')
+        remember(user_message, local['response'])
+        return dict(local, fallback=True, llm_error=result.get('error'))
+    
+    def _remember(self, user_message, assistant_message):
+        self.conversation_history.append({"role": "user", "content": user_message})
+        self.conversation_history.append({"role": "assistant", "content": assistant_message})
+    
+    def _chat(self, user_message, include_system_context, coalesce=False, use_history=True):
+        """Build the prompt and call OpenAI; the caller updates the conversation history"""
         if not self.is_configured():
             return {
                 'success': False,
@@ -57,6 +124,7 @@ class ChatAgent:
                 'response': None
             }
         
+        openai = self.client.module()
         try:
             # Build system prompt
             system_prompt = """You are SPTool Assistant, an expert system administrator and troubleshooting agent. 
@@ -87,24 +155,25 @@ Keep responses under 200 words unless detailed explanation is needed."""
             messages = [{"role": "system", "content": system_prompt}]
             
             # Add conversation history (last 10 messages to stay within limits)
-            messages.extend(self.conversation_history[-10:])
+            if use_history:
+                messages.extend(self.conversation_history[-10:])
             
             # Add current user message
             messages.append({"role": "user", "content": user_message})
             
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            # Call OpenAI API through the shared pooled, rate-limited client
+            response = self.client.chat_completion(
                 messages=messages,
                 max_tokens=500,
-                temperature=0.7
+                temperature=0.7,
+                coalesce=coalesce
             )
             
             assistant_message = response.choices[0].message.content
             
-            # Update conversation history
-            self.conversation_history.append({"role": "user", "content": user_message})
-            self.conversation_history.append({"role": "assistant", "content": assistant_message})
+            usage = response.usage
+            CHAT_TOKENS.inc(usage.prompt_tokens, type='prompt')
+            CHAT_TOKENS.inc(usage.completion_tokens, type='completion')
             
             return {
                 'success': True,
@@ -144,6 +213,9 @@ Keep responses under 200 words unless detailed explanation is needed."""
     
     def get_quick_analysis(self):
         """Get a quick AI analysis of current system state"""
+        if not self.is_configured():
+            return self.responder.quick_analysis()
+        
         context = self.get_system_context()
         
         if 'error' in context:
@@ -153,15 +225,24 @@ Keep responses under 200 words unless detailed explanation is needed."""
                 'response': None
             }
         
+        # Rounded, in a fixed order and without the conversation, so dashboards asking at
+        # about the same time render the same prompt and share one request
+        step = Config.QUICK_ANALYSIS_STEP
+        rounded = lambda value: int(round((value or 0) / step) * step)
+        processes = sorted(
+            ({'name': p['name'], 'cpu': rounded(p['cpu']), 'memory': rounded(p['memory'])}
+             for p in context.get('top_processes', [])),
+            key=lambda p: (-p['cpu'], -p['memory'], p['name'] or '')
+        )
         prompt = f"""Based on this system state, provide a brief analysis (2-3 sentences):
 
-CPU: {context.get('cpu_usage')}%
-Memory: {context.get('memory_usage')}%
-Disk: {context.get('disk_usage')}
+CPU: ~{rounded(context.get('cpu_usage'))}%
+Memory: ~{rounded(context.get('memory_usage'))}%
+Disk: {[rounded(percent) for percent in context.get('disk_usage', [])]}
 
-Top processes: {json.dumps(context.get('top_processes', []), indent=2)}
+Top processes: {json.dumps(processes, indent=2)}
 
 Is there anything concerning? Any recommendations?"""
         
-        return self.chat(prompt, include_system_context=False)
+        return self.chat(prompt, include_system_context=False, coalesce=True, use_history=False)
 
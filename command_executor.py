@@ -2,117 +2,174 @@
 Secure Command Executor Module
 Handles safe execution of system fix commands with whitelisting
 """
+import os
+import re
 import subprocess
 import platform
-import logging
+import time
+import psutil
 from datetime import datetime
 from config import Config
-
-# Configure logging
-logging.basicConfig(
-    filename=Config.LOG_FILE,
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from audit_log import get_audit_log
+from capabilities import get_capabilities
+from temp_cleanup import get_temp_cleaner
+from fix_impact import get_fix_impact_tracker
+from instrumentation import FIX_EXECUTIONS, FIX_SECONDS
 
 class CommandExecutor:
-    def __init__(self):
+    def __init__(self, source=None):
         self.os_type = platform.system()
-        self.whitelisted_commands = self._get_whitelisted_commands()
+        self.source = source or psutil
+        self.capabilities = get_capabilities()
+        self.whitelisted_commands, self.unavailable = self._compile_catalog(self._get_whitelisted_commands())
+        self.audit = get_audit_log() if Config.LOG_ACTIONS else None
     
     def _get_whitelisted_commands(self):
-        """Define whitelisted commands per operating system"""
+        """
+        Define whitelisted commands per operating system
+        
+        'requires' lists the binaries (or 'sudo' / 'systemd') a fix needs and
+        'expected_seconds' its typical duration. 'native' fixes run in-process
+        through the handler the factory returns instead of a shell command. Fixes with 'alternatives' use
+        the first alternative this host can run; its keys override the entry's.
+        """
         
         linux_commands = {
             'clear_cache': {
                 'command': 'sync && echo 3 | sudo tee /proc/sys/vm/drop_caches',
                 'description': 'Clear system cache',
                 'requires_sudo': True,
-                'risk': 'low'
+                'risk': 'low',
+                'requires': ('sync', 'tee', 'sudo'),
+                'expected_seconds': 5
             },
             'clear_temp': {
-                'command': 'find /tmp -type f -atime +7 -delete',
+                'command': 'Delete unused files from /tmp and /var/tmp',
                 'description': 'Clear temporary files older than 7 days',
                 'requires_sudo': False,
-                'risk': 'low'
+                'risk': 'low',
+                'native': get_temp_cleaner,
+                'requires': (),
+                'expected_seconds': 10
             },
             'restart_network': {
                 'command': 'sudo systemctl restart NetworkManager',
                 'description': 'Restart network manager',
                 'requires_sudo': True,
-                'risk': 'medium'
+                'risk': 'medium',
+                'requires': ('systemd', 'systemctl', 'NetworkManager', 'sudo'),
+                'expected_seconds': 5
             },
             'flush_dns': {
-                'command': 'sudo systemd-resolve --flush-caches',
                 'description': 'Flush DNS cache',
                 'requires_sudo': True,
-                'risk': 'low'
+                'risk': 'low',
+                'expected_seconds': 1,
+                'alternatives': [
+                    {'command': 'sudo resolvectl flush-caches', 'requires': ('resolvectl', 'sudo')},
+                    {'command': 'sudo systemd-resolve --flush-caches', 'requires': ('systemd-resolve', 'sudo')},
+                ]
             },
             'kill_process': {
                 'command': 'kill -9 {pid}',
                 'description': 'Kill a specific process by PID',
                 'requires_sudo': False,
                 'risk': 'high',
-                'parameterized': True
+                'parameterized': True,
+                'requires': (),
+                'expected_seconds': 1
             },
             'update_system': {
-                'command': 'sudo pacman -Syu --noconfirm',
-                'description': 'Update system packages (Arch Linux)',
+                'description': 'Update system packages',
                 'requires_sudo': True,
-                'risk': 'medium'
+                'risk': 'medium',
+                'expected_seconds': 300,
+                'timeout': 1800,
+                'alternatives': [
+                    {'command': 'sudo pacman -Syu --noconfirm', 'requires': ('pacman', 'sudo'),
+                     'description': 'Update system packages (pacman)'},
+                    {'command': 'sudo apt-get update && sudo env DEBIAN_FRONTEND=noninteractive apt-get -y upgrade',
+                     'requires': ('apt-get', 'sudo'), 'description': 'Update system packages (apt)'},
+                    {'command': 'sudo dnf -y upgrade', 'requires': ('dnf', 'sudo'),
+                     'description': 'Update system packages (dnf)'},
+                    {'command': 'sudo yum -y update', 'requires': ('yum', 'sudo'),
+                     'description': 'Update system packages (yum)'},
+                    {'command': 'sudo zypper --non-interactive update', 'requires': ('zypper', 'sudo'),
+                     'description': 'Update system packages (zypper)'},
+                    {'command': 'sudo apk upgrade', 'requires': ('apk', 'sudo'),
+                     'description': 'Update system packages (apk)'},
+                ]
             },
             'check_disk': {
                 'command': 'df -h',
                 'description': 'Check disk usage',
                 'requires_sudo': False,
-                'risk': 'none'
+                'risk': 'none',
+                'requires': ('df',),
+                'expected_seconds': 1
             },
             'free_memory': {
                 'command': 'free -h',
                 'description': 'Display memory usage',
                 'requires_sudo': False,
-                'risk': 'none'
+                'risk': 'none',
+                'requires': ('free',),
+                'expected_seconds': 1
             }
         }
         
         windows_commands = {
             'clear_temp': {
-                'command': 'del /q /f /s %TEMP%\\*',
+                'command': 'Delete unused files from %TEMP%',
                 'description': 'Clear temporary files',
                 'requires_sudo': False,
-                'risk': 'low'
+                'risk': 'low',
+                'native': get_temp_cleaner,
+                'requires': (),
+                'expected_seconds': 10
             },
             'flush_dns': {
                 'command': 'ipconfig /flushdns',
                 'description': 'Flush DNS cache',
                 'requires_sudo': True,
-                'risk': 'low'
+                'risk': 'low',
+                'requires': ('ipconfig',),
+                'expected_seconds': 1
             },
             'restart_service': {
                 'command': 'net stop {service} && net start {service}',
                 'description': 'Restart a Windows service',
                 'requires_sudo': True,
                 'risk': 'medium',
-                'parameterized': True
+                'parameterized': True,
+                'requires': ('net', 'sudo'),
+                'expected_seconds': 10
             },
             'kill_process': {
                 'command': 'taskkill /F /PID {pid}',
                 'description': 'Kill a specific process by PID',
                 'requires_sudo': True,
                 'risk': 'high',
-                'parameterized': True
+                'parameterized': True,
+                'requires': ('taskkill',),
+                'expected_seconds': 1
             },
             'check_disk': {
                 'command': 'wmic logicaldisk get size,freespace,caption',
                 'description': 'Check disk space',
                 'requires_sudo': False,
-                'risk': 'none'
+                'risk': 'none',
+                'requires': ('wmic',),
+                'expected_seconds': 2
             },
             'disk_cleanup': {
                 'command': 'cleanmgr /sagerun:1',
                 'description': 'Run disk cleanup utility',
                 'requires_sudo': True,
-                'risk': 'low'
+                'risk': 'low',
+                'requires': ('cleanmgr', 'sudo'),
+                'expected_seconds': 120,
+                'timeout': 600
             }
         }
         
@@ -123,8 +180,41 @@ class CommandExecutor:
         else:
             return {}
     
+    def _compile_catalog(self, commands):
+        """
+        Resolve alternatives against the capability probe and adapt sudo
+        
+        sudo is dropped when already root and run with -n otherwise, so a fix
+        fails at once instead of waiting for a password until the timeout.
+        
+        Returns:
+            (commands that can run here, {fix_id: reason} for those that cannot)
+        """
+        available = {}
+        unavailable = {}
+        for fix_id, cmd_info in commands.items():
+            candidates = cmd_info.get('alternatives') or [{}]
+            chosen = None
+            reasons = []
+            for alternative in candidates:
+                merged = {key: value for key, value in cmd_info.items() if key != 'alternatives'}
+                merged.update(alternative)
+                missing = self.capabilities.missing(merged.get('requires', ()))
+                if not missing:
+                    chosen = merged
+                    break
+                reasons.append(', '.join(missing))
+            if chosen is None:
+                unavailable[fix_id] = 'requires ' + ' or '.join(reasons)
+                continue
+            if self.os_type == 'Linux' and 'sudo' in chosen.get('requires', ()):
+                prefix = '' if self.capabilities.is_root else 'sudo -n '
+                chosen['command'] = re.sub(r'\bsudo ', prefix, chosen['command'])
+            available[fix_id] = chosen
+        return available, unavailable
+    
     def get_available_fixes(self):
-        """Return list of available fixes for current OS"""
+        """Return list of fixes that can run on this host"""
         fixes = []
         for cmd_id, cmd_info in self.whitelisted_commands.items():
             fixes.append({
@@ -132,11 +222,16 @@ class CommandExecutor:
                 'description': cmd_info['description'],
                 'requires_sudo': cmd_info['requires_sudo'],
                 'risk': cmd_info['risk'],
-                'parameterized': cmd_info.get('parameterized', False)
+                'parameterized': cmd_info.get('parameterized', False),
+                'expected_seconds': cmd_info.get('expected_seconds')
             })
         return fixes
     
-    def execute_fix(self, fix_id, params=None, dry_run=False):
+    def get_capabilities(self):
+        """Probe results and the fixes left out of the catalog, with the reason"""
+        return dict(self.capabilities.summary(), unavailable_fixes=dict(self.unavailable))
+    
+    def execute_fix(self, fix_id, params=None, dry_run=False, trigger=None):
         """
         Execute a whitelisted fix command
         
@@ -144,11 +239,25 @@ class CommandExecutor:
             fix_id: ID of the fix to execute
             params: Dictionary of parameters for parameterized commands
             dry_run: If True, don't actually execute, just return what would be run
+            trigger: What started the fix when it was not a user, e.g. 'policy:<name>';
+                     stored with the audit record
         
         Returns:
             Dictionary with execution results
         """
+        if fix_id in self.unavailable:
+            reason = self.unavailable[fix_id]
+            self._audit(fix_id, 'rejected', params=params, dry_run=dry_run, error=f'unavailable: {reason}',
+                        trigger=trigger)
+            return {
+                'success': False,
+                'error': f'Fix "{fix_id}" cannot run on this host: {reason}',
+                'timestamp': datetime.now().isoformat()
+            }
+        
         if fix_id not in self.whitelisted_commands:
+            self._audit(fix_id, 'rejected', params=params, dry_run=dry_run, error='not whitelisted',
+                        trigger=trigger)
             return {
                 'success': False,
                 'error': f'Command "{fix_id}" is not whitelisted',
@@ -158,6 +267,18 @@ class CommandExecutor:
         cmd_info = self.whitelisted_commands[fix_id]
         command = cmd_info['command']
         
+        if fix_id == 'kill_process' and params and 'pid' in params:
+            check = self.validate_pid(params.get('pid'))
+            if not check['valid']:
+                self._audit(fix_id, 'rejected', params=params, dry_run=dry_run, error=check['error'],
+                            trigger=trigger)
+                return {
+                    'success': False,
+                    'error': f"Refusing to kill PID {params.get('pid')}: {check['error']}",
+                    'timestamp': datetime.now().isoformat()
+                }
+            params = dict(params, pid=int(params['pid']))
+        
         # Handle parameterized commands
         if cmd_info.get('parameterized', False):
             if not params:
@@ -175,11 +296,11 @@ class CommandExecutor:
                     'timestamp': datetime.now().isoformat()
                 }
         
-        # Log the attempted command
-        log_msg = f"Fix attempted: {fix_id} | Command: {command} | Params: {params} | Dry run: {dry_run}"
-        logging.info(log_msg)
+        if cmd_info.get('native'):
+            return self._execute_native(fix_id, cmd_info, params, dry_run, trigger)
         
         if dry_run:
+            self._audit(fix_id, 'dry_run', command=command, params=params, dry_run=True, trigger=trigger)
             return {
                 'success': True,
                 'dry_run': True,
@@ -187,26 +308,34 @@ class CommandExecutor:
                 'description': cmd_info['description'],
                 'requires_sudo': cmd_info['requires_sudo'],
                 'risk': cmd_info['risk'],
+                'expected_seconds': cmd_info.get('expected_seconds'),
                 'timestamp': datetime.now().isoformat()
             }
         
         # Execute the command
+        before = self._impact_snapshot(fix_id)
+        started = time.monotonic()
         try:
             result = subprocess.run(
                 command,
                 shell=True,
                 capture_output=True,
                 text=True,
-                timeout=30
+                timeout=cmd_info.get('timeout', Config.FIX_TIMEOUT)
             )
             
             success = result.returncode == 0
             
-            log_result = f"Fix executed: {fix_id} | Success: {success} | Return code: {result.returncode}"
+            audit_key = self._audit(
+                fix_id, 'success' if success else 'failure',
+                command=command, params=params,
+                returncode=result.returncode,
+                error=None if success else result.stderr[-2000:],
+                duration_ms=self._elapsed_ms(started),
+                trigger=trigger
+            )
             if success:
-                logging.info(log_result)
-            else:
-                logging.error(log_result + f" | Error: {result.stderr}")
+                self._track_impact(fix_id, before, audit_key)
             
             return {
                 'success': success,
@@ -215,36 +344,155 @@ class CommandExecutor:
                 'stdout': result.stdout,
                 'stderr': result.stderr,
                 'returncode': result.returncode,
+                'impact_pending': success and before is not None,
                 'timestamp': datetime.now().isoformat()
             }
             
         except subprocess.TimeoutExpired:
-            logging.error(f"Fix timed out: {fix_id}")
+            self._audit(fix_id, 'timeout', command=command, params=params,
+                        error='Command execution timed out', duration_ms=self._elapsed_ms(started),
+                        trigger=trigger)
             return {
                 'success': False,
                 'error': 'Command execution timed out',
                 'timestamp': datetime.now().isoformat()
             }
         except Exception as e:
-            logging.error(f"Fix failed: {fix_id} | Error: {str(e)}")
+            self._audit(fix_id, 'error', command=command, params=params,
+                        error=str(e), duration_ms=self._elapsed_ms(started), trigger=trigger)
             return {
                 'success': False,
                 'error': str(e),
                 'timestamp': datetime.now().isoformat()
             }
     
+    def _execute_native(self, fix_id, cmd_info, params, dry_run, trigger=None):
+        """Preview or run an in-process fix; the preview reports exactly what would change"""
+        handler = cmd_info['native']()
+        command = f"native:{fix_id}"
+        started = time.monotonic()
+        try:
+            if dry_run:
+                preview = handler.preview()
+                self._audit(fix_id, 'dry_run', command=command, params=params, dry_run=True, trigger=trigger)
+                return {
+                    'success': True,
+                    'dry_run': True,
+                    'command': f"{cmd_info['command']}: {preview['files']} files, "
+                               f"{self._format_bytes(preview['bytes'])}",
+                    'description': cmd_info['description'],
+                    'requires_sudo': cmd_info['requires_sudo'],
+                    'risk': cmd_info['risk'],
+                    'expected_seconds': cmd_info.get('expected_seconds'),
+                    'preview': preview,
+                    'timestamp': datetime.now().isoformat()
+                }
+            
+            before = self._impact_snapshot(fix_id)
+            result = handler.clean()
+            success = result.get('success', False)
+            audit_key = self._audit(fix_id, 'success' if success else 'failure', command=command, params=params,
+                                    error=result.get('error'), duration_ms=self._elapsed_ms(started),
+                                    result=result, trigger=trigger)
+            if success:
+                self._track_impact(fix_id, before, audit_key)
+            summary = (f"Deleted {result['deleted']} files, freed {self._format_bytes(result['bytes_freed'])}"
+                       f" ({result['failed']} failed, {result['skipped_open']} open files kept)"
+                       if success else result.get('error', ''))
+            return {
+                'success': success,
+                'fix_id': fix_id,
+                'description': cmd_info['description'],
+                'stdout': summary,
+                'stderr': '' if success else summary,
+                'returncode': 0 if success else 1,
+                'result': result,
+                'impact_pending': success and before is not None,
+                'timestamp': datetime.now().isoformat()
+            }
+        except Exception as e:
+            self._audit(fix_id, 'error', command=command, params=params,
+                        error=str(e), duration_ms=self._elapsed_ms(started), trigger=trigger)
+            return {
+                'success': False,
+                'error': str(e),
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    def _impact_snapshot(self, fix_id):
+        """Pre-fix values of the metrics the fix should move, or None if it is not measured"""
+        if not Config.FIX_IMPACT_ENABLED:
+            return None
+        tracker = get_fix_impact_tracker()
+        return tracker.snapshot(fix_id) if tracker.tracks(fix_id) else None
+    
+    def _track_impact(self, fix_id, before, audit_key):
+        """Measure again once the system settles and add the deltas to the audit record"""
+        if before is not None:
+            get_fix_impact_tracker().schedule(fix_id, before, audit_key)
+    
+    def get_fix_effectiveness(self):
+        """Measured effectiveness of each fix that has been run"""
+        return get_fix_impact_tracker().effectiveness()
+    
+    def get_progress(self, fix_id):
+        """Progress of a native fix that reports it, e.g. a running temp cleanup"""
+        cmd_info = self.whitelisted_commands.get(fix_id)
+        if not cmd_info or not cmd_info.get('native'):
+            return {'error': f'Fix "{fix_id}" does not report progress'}
+        return dict(cmd_info['native']().progress)
+    
+    @staticmethod
+    def _format_bytes(size):
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024:
+                return f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} TB"
+    
+    def _audit(self, fix_id, outcome, **fields):
+        """Count the outcome and queue an audit record; never blocks on log file I/O"""
+        known = fix_id in self.whitelisted_commands or fix_id in self.unavailable
+        FIX_EXECUTIONS.inc(fix_id=fix_id if known else 'unknown', outcome=outcome)
+        if fields.get('trigger') is None:
+            fields.pop('trigger', None)
+        if fields.get('duration_ms') is not None:
+            FIX_SECONDS.observe(fields['duration_ms'] / 1000, fix_id=fix_id)
+        if self.audit:
+            return self.audit.record(fix_id, outcome, **fields)
+        return None
+    
+    @staticmethod
+    def _elapsed_ms(started):
+        return round((time.monotonic() - started) * 1000, 1)
+    
+    def _protected(self, proc):
+        """Why a process must not be killed (None if it may be): init, kernel threads, SPTool itself"""
+        pid = proc.pid
+        if pid <= 1 or (self.os_type == 'Windows' and pid == 4):
+            return 'system process'
+        if pid in (os.getpid(), os.getppid()):
+            return 'SPTool itself'
+        if proc.name() in Config.PROTECTED_PROCESS_NAMES:
+            return 'system process'
+        if self.os_type == 'Linux' and (pid == 2 or proc.ppid() == 2):
+            return 'kernel thread'
+        return None
+    
     def validate_pid(self, pid):
         """Validate that a PID exists and can be killed"""
         try:
-            import psutil
-            proc = psutil.Process(int(pid))
+            proc = self.source.Process(int(pid))
+            reason = self._protected(proc)
+            if reason:
+                return {'valid': False, 'error': f'Protected process: {reason}'}
             return {
                 'valid': True,
                 'name': proc.name(),
                 'cpu_percent': proc.cpu_percent(),
                 'memory_percent': proc.memory_percent()
             }
-        except (psutil.NoSuchProcess, ValueError):
+        except (psutil.NoSuchProcess, ValueError, TypeError):
             return {'valid': False, 'error': 'Process not found'}
         except psutil.AccessDenied:
             return {'valid': False, 'error': 'Access denied'}
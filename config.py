@@ -15,15 +15,174 @@ class Config:
     
     # OpenAI API settings (optional - for AI-powered diagnosis)
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+    OPENAI_API_BASE = os.environ.get('OPENAI_API_BASE', '')  # Empty uses the openai default
+    OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
+    OPENAI_TIMEOUT = 30  # Seconds per request, and the longest wait for the local rate limit
+    OPENAI_MAX_RETRIES = 3  # Retries on rate limits, timeouts and 5xx responses
+    OPENAI_RETRY_BACKOFF = 0.5  # Seconds; retry n waits up to BACKOFF * 2**n (full jitter)
+    OPENAI_REQUESTS_PER_MINUTE = 60  # Local token-bucket rate
+    OPENAI_BURST = 10  # Requests allowed back to back before the rate applies
+    OPENAI_MAX_CONCURRENCY = 4  # Simultaneous requests, also the HTTP connection pool size
     
     # Security settings
     REQUIRE_CONFIRMATION = True  # Always require user confirmation before executing fixes
     LOG_ACTIONS = True  # Log all executed commands
-    LOG_FILE = 'sptool_actions.log'
+    FIX_TIMEOUT = 30  # Seconds a fix may run unless its catalog entry sets 'timeout'
+    PROTECTED_PROCESS_NAMES = ('init', 'systemd', 'kthreadd', 'launchd', 'kernel_task', 'System', 'smss.exe',
+                               'csrss.exe', 'wininit.exe', 'winlogon.exe', 'services.exe', 'lsass.exe')  # kill_process refuses these
+    CAPABILITY_SUDO_TIMEOUT = 2  # Seconds for the startup check that sudo works without a password
+    FIX_IMPACT_ENABLED = True  # Measure metrics before and after each executed fix
+    FIX_IMPACT_SETTLE_SECONDS = 10  # Minimum wait before the after-measurement (at least two sampler intervals)
+    FIX_IMPACT_MIN_PERCENT = 2  # Percentage-point change below which a CPU/memory delta is noise
+    FIX_IMPACT_HISTORY = 1000  # Audit records read on first use to seed effectiveness statistics
+    
+    # Auto-remediation (opt-in): policies run low-risk fixes for known issues without a human
+    AUTO_REMEDIATION_ENABLED = os.environ.get('AUTO_REMEDIATION', 'False') == 'True'
+    AUTO_REMEDIATION_SHADOW = os.environ.get('AUTO_REMEDIATION_SHADOW', 'True') == 'True'  # Only dry-run and audit
+    AUTO_REMEDIATION_INTERVAL = 30  # Seconds between policy evaluations (scaled by the sampler slowdown)
+    AUTO_REMEDIATION_RISKS = ('none', 'low')  # Fix risk levels a policy may run unattended
+    AUTO_REMEDIATION_MAX_PER_HOUR = 6  # Executions per hour across all policies
+    AUTO_REMEDIATION_HISTORY = 100  # Recent policy decisions kept for /api/remediation
+    # Each policy matches issues by category and an fnmatch title pattern. Its fix runs after
+    # `confirmations` consecutive matching evaluations, at most once per `cooldown` seconds
+    # and `max_per_hour` times an hour
+    AUTO_REMEDIATION_POLICIES = [
+        {'name': 'clear-temp-on-full-disk', 'category': 'disk', 'title': 'Low Disk Space on *',
+         'fix_id': 'clear_temp', 'confirmations': 2, 'cooldown': 3600, 'max_per_hour': 1},
+    ]
+    
+    # Admission control for the expensive endpoints: at most `concurrency` computations
+    # at once, `queue` requests waiting for one, and a per-client token bucket refilled
+    # at `rate` requests/second with bursts of `burst`
+    ADMISSION_LIMITS = {
+        'diagnosis': {'concurrency': 1, 'queue': 4, 'rate': 0.5, 'burst': 5},
+        'diagnostic': {'concurrency': 1, 'queue': 4, 'rate': 0.5, 'burst': 5},
+        'chat': {'concurrency': 2, 'queue': 4, 'rate': 0.2, 'burst': 3},
+        'disk_usage': {'concurrency': 2, 'queue': 4, 'rate': 0.5, 'burst': 5},
+    }
+    ADMISSION_QUEUE_TIMEOUT = 10  # Seconds a queued request waits for a slot before a 429
+    ADMISSION_MAX_CLIENTS = 1024  # Token buckets kept before idle clients are forgotten
+    
+    # Alerts: issue transitions batched into notifications for webhook, file or syslog sinks
+    ALERTS_ENABLED = os.environ.get('ALERTS', 'False') == 'True'
+    ALERT_WEBHOOK_URL = os.environ.get('ALERT_WEBHOOK_URL', '')  # POSTed one JSON notification per batch
+    ALERT_FILE = os.environ.get('ALERT_FILE', '')  # Appended one JSON line per batch
+    ALERT_SYSLOG = os.environ.get('ALERT_SYSLOG', 'False') == 'True'  # One syslog line per alert (Unix)
+    ALERT_MIN_SEVERITY = 'medium'  # Issues below this severity never alert
+    ALERT_INTERVAL = 60  # Seconds without any diagnosis before the sampler triggers one
+    ALERT_RESOLVE_AFTER = 2  # Diagnoses an issue must be missing from before it resolves
+    ALERT_BATCH_WINDOW = 30  # Seconds transitions are collected into one notification
+    ALERT_BATCH_MAX = 200  # Alerts per notification
+    ALERT_GROUP_TITLES = 5  # Example titles listed per group
+    ALERT_QUEUE_SIZE = 1000  # Queued transitions; more are dropped and counted
+    ALERT_RETRIES = 3  # Delivery retries per sink, waiting ALERT_RETRY_BACKOFF * 2**n between them
+    ALERT_RETRY_BACKOFF = 1
+    ALERT_WEBHOOK_TIMEOUT = 5  # Seconds per webhook request
+    
+    # Metrics history: columnar snapshots compared by /api/history/diff
+    HISTORY_ENABLED = True
+    HISTORY_INTERVAL = 60  # Seconds between snapshots
+    HISTORY_SNAPSHOTS = 1440  # Snapshots kept (24 hours at the default interval)
+    HISTORY_MAX_SERIES = 2000  # Metric series kept; new per-interface/per-mount series beyond it are not recorded
+    HISTORY_DIFF_TOP = 10  # Processes listed per diff section
+    HISTORY_DIFF_MIN_POINTS = 10  # Change of a percentage metric reported by a diff, in points
+    HISTORY_DIFF_MIN_RATIO = 0.5  # Relative change of any other metric reported by a diff
+    
+    # Audit log settings (structured records written by a background thread)
+    AUDIT_DB_FILE = 'sptool_audit.db'
+    AUDIT_MAX_BYTES = 10 * 1024 * 1024  # Rotate the database above this size
+    AUDIT_BACKUP_COUNT = 5  # Rotated files to keep (sptool_audit.db.1 ... .5)
+    AUDIT_QUEUE_SIZE = 10000  # Records beyond this are dropped rather than blocking
+    AUDIT_BATCH_SIZE = 500  # Records written per transaction
+    AUDIT_FLUSH_INTERVAL = 1  # Seconds the writer waits for new records
+    AUDIT_QUERY_WAIT = 0.5  # Seconds a query waits for queued records before reading what is written
+    
+    # Temp cleanup settings (native clear_temp fix)
+    TEMP_CLEANUP_DIRS = ('/tmp', '/var/tmp')  # Scanned by the clear_temp fix (the user temp dir on Windows)
+    TEMP_CLEANUP_MIN_AGE_DAYS = 7  # Files neither read nor written for this long are removed
+    TEMP_CLEANUP_LARGE_FILE_MB = 100  # Files at least this big...
+    TEMP_CLEANUP_LARGE_FILE_AGE_DAYS = 1  # ...are removed after this many idle days instead
+    TEMP_CLEANUP_EXCLUDE = ('.X*-lock', '.X11-unix', '.ICE-unix', 'systemd-private-*',
+                            'snap-private-tmp', '*.pid', '*.lock', '*.sock')  # Names never removed or entered
+    TEMP_CLEANUP_SKIP_OPEN = True  # Keep files some process has open (read from /proc/*/fd)
+    TEMP_CLEANUP_WORKERS = 8  # Threads scanning candidate directories
+    TEMP_CLEANUP_BATCH_SIZE = 500  # Files deleted between progress updates
+    TEMP_CLEANUP_PREVIEW_FILES = 10  # Largest candidates listed in the preview
+    
+    # Disk-usage analyzer (breakdown attached to Low Disk Space issues; no automatic scans while degraded)
+    DISK_USAGE_WORKERS = 8  # Threads listing directories in the disk-usage analyzer
+    DISK_USAGE_TOP = 10  # Largest directories/files reported, and children per tree level
+    DISK_USAGE_TREE_DEPTH = 3  # Levels of the directory-size tree in reports
+    DISK_USAGE_LARGE_FILE_MB = 100  # Files at least this big are remembered as largest-file candidates
+    DISK_USAGE_CACHE_TTL = 300  # Seconds a disk-usage report is served before a re-scan
+    DISK_USAGE_FULL_RESCAN = 3600  # Seconds after which unchanged directories are listed again too
+    
+    # Background sampler settings
+    SAMPLER_INTERVAL = 5  # Seconds between counter samples used for rates
     
     # Thresholds for issue detection
     CPU_THRESHOLD = 90  # % CPU usage to trigger warning
     MEMORY_THRESHOLD = 85  # % Memory usage to trigger warning
     DISK_THRESHOLD = 90  # % Disk usage to trigger warning
     TEMP_THRESHOLD = 80  # °C CPU temperature threshold (if available)
-
+    CPU_CORE_SATURATED = 95  # % busy at which a single core counts as saturated
+    CPU_CORE_PINNED_SAMPLES = 2  # Consecutive saturated samples before a core is reported as pinned
+    CPU_CORE_IMBALANCE = 50  # Points the busiest core may run above the median core
+    CPU_CORE_TOP_PROCESSES = 3  # Busiest processes whose threads are mapped to saturated cores
+    CPU_THROTTLE_RATIO = 0.6  # Busy cores clocked below this fraction of their maximum are throttled
+    CPU_PRESSURE_THRESHOLD = 20  # % of time runnable tasks waited for CPU (PSI some avg10)
+    MEMORY_PRESSURE_THRESHOLD = 10  # % of time tasks stalled on memory (PSI some avg10)
+    MEMORY_FULL_PRESSURE_THRESHOLD = 5  # % of time all tasks stalled on memory (PSI full avg10)
+    MEMORY_SWAPIN_THRESHOLD = 100  # Pages/s swapped back in that count as swap thrashing
+    MEMORY_SLAB_TOP = 5  # Largest slab caches listed in the memory breakdown (root only)
+    CLEAR_CACHE_MIN_DROPPABLE_MB = 512  # clear_cache is only suggested when it could free at least this much
+    CLEAR_CACHE_SLAB_PERCENT = 15  # % of RAM in reclaimable slab (dentries/inodes) worth dropping
+    CLEAR_CACHE_MAX_REFAULTS = 200  # File refaults/s above which the page cache is in active use
+    LOAD_PER_CPU_THRESHOLD = 2  # 1-minute load average per CPU when PSI is unavailable
+    DISK_UTIL_THRESHOLD = 90  # % of time a device was busy with I/O
+    DISK_AWAIT_THRESHOLD = 50  # ms average wait per I/O request
+    DISK_MIN_IOPS = 5  # Ignore latency on nearly idle devices
+    
+    # Per-process leak detection (RSS and open FD slopes)
+    LEAK_DETECTION_ENABLED = True
+    LEAK_SAMPLE_INTERVAL = 30  # Seconds between leak samples, slower than the metrics sampler
+    LEAK_HISTORY_SAMPLES = 20  # Samples kept per PID (10 minutes at the default interval)
+    LEAK_MIN_SAMPLES = 10  # Samples needed before a slope is trusted
+    LEAK_MIN_R2 = 0.8  # Fit quality required, so only steady growth counts
+    LEAK_RSS_MB_PER_HOUR = 50  # RSS growth rate reported as a probable leak
+    LEAK_FD_PER_HOUR = 100  # Open-FD growth rate reported as a probable leak
+    LEAK_URGENT_HOURS = 6  # Projected hours to exhaustion below which a leak is high severity
+    
+    # Thresholds for process-group issues (tree, systemd unit or cgroup)
+    GROUP_CPU_THRESHOLD = 50  # % of total host CPU used by one group
+    GROUP_MEMORY_THRESHOLD = 50  # % of total memory used by one group
+    GROUP_MIN_PROCESSES = 2  # Single processes are covered by the per-process checks
+    
+    # Thresholds for network issues (rates come from the background sampler)
+    NET_UTILIZATION_THRESHOLD = 80  # % of link speed
+    NET_ERROR_RATE_THRESHOLD = 1  # Interface errors per second
+    NET_DROP_PERCENT_THRESHOLD = 1  # % of packets dropped
+    NET_CLOSE_WAIT_THRESHOLD = 100  # Sockets the local application has not closed
+    NET_TIME_WAIT_THRESHOLD = 5000  # Sockets waiting to expire (ephemeral port pressure)
+    NET_SYN_SENT_THRESHOLD = 20  # Outbound connections waiting for a reply
+    
+    # Degraded-host mode: SPTool throttles itself while the host is struggling
+    DEGRADED_MODE_ENABLED = True
+    DEGRADED_CPU_PRESSURE = 40  # % PSI cpu some avg10 that switches degraded mode on
+    DEGRADED_MEMORY_PRESSURE = 20  # % PSI memory some avg10 that switches degraded mode on
+    DEGRADED_LOAD_PER_CPU = 4  # 1-minute load per CPU, used when PSI is unavailable
+    DEGRADED_MEMORY_PERCENT = 95  # % RAM used on the host
+    DEGRADED_SELF_CPU_PERCENT = 25  # % of one core used by SPTool itself
+    DEGRADED_SELF_RSS_MB = 300  # SPTool's own resident memory
+    DEGRADED_EXIT_RATIO = 0.7  # Leave degraded mode once every signal is below this share of its limit
+    DEGRADED_CHECK_INTERVAL = 2  # Seconds between re-evaluations
+    DEGRADED_SAMPLER_SLOWDOWN = 4  # Sampler interval multiplier while degraded
+    DEGRADED_PROCESS_CANDIDATES = 50  # Processes re-read between full scans while degraded
+    DEGRADED_FULL_SCAN_INTERVAL = 60  # Seconds between full process scans while degraded
+    DEGRADED_NICE = 19  # CPU niceness applied to SPTool while degraded
+    
+    # Local chat responder (answers without the LLM)
+    LOCAL_CHAT_MIN_SCORE = 0.3  # Cosine similarity above which the local answer is returned
+    LOCAL_CHAT_DIAGNOSIS_TTL = 30  # Seconds a cached diagnosis is used to enrich answers
+    CHAT_LLM_WAIT = 8  # Seconds to wait for the LLM before returning the local answer
+    QUICK_ANALYSIS_STEP = 5  # Rounding of quick-analysis percentages, so concurrent dashboards share one request
@@ -0,0 +1,392 @@
+"""
+Data Source Module
+Pluggable backends for the system data read by SystemDiagnostics and the sampler:
+- LiveSource: psutil plus the /proc readers for pressure, memory and process groups
+- RecordingSource: wraps another source and writes every result to a trace file
+- ReplaySource: feeds a recorded (or synthetic) trace back frame by frame
+
+A trace is gzip-compressed JSON lines, one frame per line. Each frame holds the
+wall and monotonic clock at the start of the frame and the result of every
+call made during it, keyed by call name and arguments.
+"""
+import argparse
+import collections
+import contextlib
+import gzip
+import json
+import sys
+import time
+import psutil
+from pressure import PressureReader
+from memory_info import MemoryInfoReader
+from process_groups import ProcessGroupAggregator
+
+PSUTIL_ERRORS = {
+    'NoSuchProcess': psutil.NoSuchProcess,
+    'ZombieProcess': psutil.ZombieProcess,
+    'AccessDenied': psutil.AccessDenied,
+}
+
+class ReplayMissingError(LookupError):
+    """The replayed code made a call that is not in the recorded frame"""
+
+class LiveSource:
+    """Reads the running system through psutil and /proc"""
+
+    def __init__(self):
+        self._pressure = None
+        self._memory = None
+        self._groups = None
+
+    def __getattr__(self, name):
+        return getattr(psutil, name)
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def pressure(self):
+        """PSI, load averages and run-queue length"""
+        if self._pressure is None:
+            self._pressure = PressureReader()
+        return self._pressure.read()
+
+    def memory_details(self, slab_top=5):
+        """Memory breakdown from /proc/meminfo and the largest slab caches"""
+        return self._memory_reader().read(slab_top=slab_top)
+
+    def vmstat(self):
+        """Paging and reclaim counters from /proc/vmstat"""
+        return self._memory_reader().read_vmstat()
+
+    def _memory_reader(self):
+        if self._memory is None:
+            self._memory = MemoryInfoReader()
+        return self._memory
+
+    def process_groups(self, limit=10):
+        """Resource usage aggregated by tree, systemd unit and cgroup"""
+        if self._groups is None:
+            self._groups = ProcessGroupAggregator()
+        return self._groups.collect_all(limit=limit)
+
+class _RecordingProcess:
+    def __init__(self, recorder, proc):
+        self._recorder = recorder
+        self._proc = proc
+        self.pid = proc.pid
+        self.info = getattr(proc, 'info', {})
+
+    def oneshot(self):
+        return self._proc.oneshot()
+
+    def __getattr__(self, name):
+        method = getattr(self._proc, name)
+
+        def call(*args, **kwargs):
+            return self._recorder._call(f'Process.{self.pid}.{name}', method, args, kwargs)
+        return call
+
+class RecordingSource:
+    """Passes calls through to another source and records their results"""
+
+    # Calls that describe the clock rather than the system
+    PASSTHROUGH = ('time', 'monotonic')
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._types = {}        # namedtuple name -> fields, written once per file
+        self._new_types = {}
+        self._processes = {}    # pid -> wrapped Process kept across frames for cpu_percent
+        self._frame = {}
+        self._frame_start = (inner.time(), inner.monotonic())
+        self.frames_written = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        if not callable(attr) or isinstance(attr, type) or name in self.PASSTHROUGH:
+            return attr
+
+        def call(*args, **kwargs):
+            return self._call(name, attr, args, kwargs)
+        return call
+
+    def time(self):
+        return self.inner.time()
+
+    def monotonic(self):
+        return self.inner.monotonic()
+
+    def Process(self, pid):
+        proc = self._processes.get(pid)
+        if proc is None:
+            proc = self._call(f'Process.{pid}', lambda: _RecordingProcess(self, self.inner.Process(pid)), (), {},
+                              record_value=False)
+            self._processes[pid] = proc
+        return proc
+
+    def process_iter(self, attrs=None):
+        procs = []
+        for proc in self.inner.process_iter(attrs):
+            procs.append(proc)
+        self._frame[_call_key('process_iter', (attrs,), {})] = self._encode(
+            [{'pid': proc.pid, 'info': proc.info} for proc in procs])
+        return iter(procs)
+
+    def next_frame(self):
+        """Write the calls made since the previous frame and start a new one"""
+        frame = {'ts': self._frame_start[0], 'mono': self._frame_start[1], 'calls': self._frame}
+        if self._new_types:
+            frame['types'] = self._new_types
+            self._new_types = {}
+        self._file.write(json.dumps(frame, separators=(',', ':')) + '\n')
+        self.frames_written += 1
+        self._frame = {}
+        self._frame_start = (self.inner.time(), self.inner.monotonic())
+        # Exited processes drop out of the wrapper cache with the next pids() listing
+        alive = set(self.inner.pids())
+        for pid in list(self._processes):
+            if pid not in alive:
+                del self._processes[pid]
+
+    def close(self):
+        self._file.close()
+
+    def _call(self, key_name, func, args, kwargs, record_value=True):
+        key = _call_key(key_name, args, kwargs)
+        try:
+            result = func(*args, **kwargs)
+        except tuple(PSUTIL_ERRORS.values()) as e:
+            self._frame[key] = {'_exc': type(e).__name__}
+            raise
+        self._frame[key] = self._encode(result) if record_value else 1
+        return result
+
+    def _encode(self, value):
+        if isinstance(value, tuple) and hasattr(value, '_fields'):
+            name = type(value).__name__
+            if name not in self._types:
+                self._types[name] = list(value._fields)
+                self._new_types[name] = list(value._fields)
+            return {'_nt': name, '_v': [self._encode(v) for v in value]}
+        if isinstance(value, dict):
+            return {str(k): self._encode(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._encode(v) for v in value]
+        if isinstance(value, (int, float, str, bool)) or value is None:
+            return value
+        return str(value)
+
+class _ReplayProcess:
+    def __init__(self, source, pid, info=None):
+        self._source = source
+        self.pid = pid
+        self.info = info or {}
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            try:
+                return self._source._lookup(f'Process.{self.pid}.{name}', args, kwargs)
+            except ReplayMissingError:
+                # Not observed in this frame, which is what an exited process looks like
+                raise psutil.NoSuchProcess(self.pid)
+        return call
+
+class ReplaySource:
+    """
+    Replays a trace written by RecordingSource.
+
+    Frames are streamed from the file one at a time, so traces of any length
+    replay in constant memory. With speed=None frames are served as fast as the
+    caller asks for them; otherwise iter_frames() sleeps so that recorded time
+    passes `speed` times faster than real time.
+    """
+
+    NoSuchProcess = psutil.NoSuchProcess
+    ZombieProcess = psutil.ZombieProcess
+    AccessDenied = psutil.AccessDenied
+
+    def __init__(self, path=None, speed=None, lines=None, types=None):
+        self.path = path
+        self.speed = speed
+        # `lines`/`types` replay part of a trace (see postmortem.py): an iterable of
+        # frame lines plus the namedtuple definitions written before the first one
+        self._lines = iter(lines) if lines is not None else _open_trace(path)
+        self._types = {}
+        self._nt_classes = {}
+        self.frame = None
+        self.frame_index = -1
+        self._define_types(types or {})
+
+    def advance(self):
+        """Move to the next frame; returns False at the end of the trace"""
+        for line in self._lines:
+            line = line.strip()
+            if not line:
+                continue
+            frame = json.loads(line)
+            self._define_types(frame.get('types', {}))
+            self.frame = frame
+            self.frame_index += 1
+            return True
+        return False
+
+    def iter_frames(self):
+        """Advance through every frame, pacing by `speed` if set; yields the frame timestamp"""
+        previous = None
+        while self.advance():
+            if self.speed and previous is not None:
+                time.sleep(max(self.frame['ts'] - previous, 0) / self.speed)
+            previous = self.frame['ts']
+            yield self.frame['ts']
+
+    def close(self):
+        close = getattr(self._lines, 'close', None)
+        if close:
+            close()
+
+    def time(self):
+        return self.frame['ts']
+
+    def monotonic(self):
+        return self.frame['mono']
+
+    def Process(self, pid):
+        recorded = self.frame['calls'].get(f'Process.{pid}') if self.frame else None
+        if isinstance(recorded, dict) and '_exc' in recorded:
+            raise PSUTIL_ERRORS.get(recorded['_exc'], psutil.NoSuchProcess)(pid)
+        return _ReplayProcess(self, pid)
+
+    def process_iter(self, attrs=None):
+        for entry in self._lookup('process_iter', (attrs,), {}):
+            yield _ReplayProcess(self, entry['pid'], entry['info'])
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self._lookup(name, args, kwargs)
+        return call
+
+    def _lookup(self, name, args, kwargs):
+        if self.frame is None:
+            raise ReplayMissingError('advance() must be called before reading the trace')
+        key = _call_key(name, args, kwargs)
+        if key not in self.frame['calls']:
+            raise ReplayMissingError(f'{key} was not recorded in frame {self.frame_index}')
+        value = self.frame['calls'][key]
+        if isinstance(value, dict) and '_exc' in value:
+            raise PSUTIL_ERRORS.get(value['_exc'], psutil.NoSuchProcess)(-1)
+        return self._decode(value)
+
+    def _define_types(self, types):
+        for name, fields in types.items():
+            self._types[name] = fields
+            self._nt_classes[name] = collections.namedtuple(name, fields)
+
+    def _decode(self, value):
+        if isinstance(value, dict):
+            if '_nt' in value:
+                return self._nt_classes[value['_nt']](*[self._decode(v) for v in value['_v']])
+            return {k: self._decode(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._decode(v) for v in value]
+        return value
+
+def _call_key(name, args, kwargs):
+    if not args and not kwargs:
+        return name
+    return f'{name}|{json.dumps([list(args), kwargs], sort_keys=True, default=str, separators=(",", ":"))}'
+
+def _open_trace(path):
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+def record_trace(path, frames, interval, source=None):
+    """
+    Record `frames` snapshots of the system `interval` seconds apart
+
+    Each frame runs the background sampler once and a full diagnostic, so the
+    trace contains everything IssueDiagnoser needs to replay it.
+    """
+    from system_diagnostics import SystemDiagnostics
+
+    recorder = RecordingSource(source or LiveSource(), path)
+    diagnostics = SystemDiagnostics(source=recorder)
+    try:
+        for index in range(frames):
+            diagnostics.sampler.sample_once()
+            diagnostics.get_full_diagnostic()
+            recorder.next_frame()
+            if index < frames - 1 and interval:
+                time.sleep(interval)
+    finally:
+        recorder.close()
+    return recorder.frames_written
+
+def replay_diagnosis(path, speed=None):
+    """
+    Run IssueDiagnoser over every frame of a trace
+
+    Yields:
+        (timestamp, diagnosis) for each frame
+    """
+    from system_diagnostics import SystemDiagnostics
+    from issue_diagnosis import IssueDiagnoser
+
+    source = ReplaySource(path, speed=speed)
+    diagnoser = IssueDiagnoser(diagnostics=SystemDiagnostics(source=source))
+    try:
+        for timestamp in source.iter_frames():
+            diagnoser.diagnostics.sampler.sample_once()
+            yield timestamp, diagnoser.diagnose_all()
+    finally:
+        source.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Record or replay SPTool system traces')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    record = sub.add_parser('record', help='Record live (or synthetic) snapshots to a trace file')
+    record.add_argument('path')
+    record.add_argument('--frames', type=int, default=60)
+    record.add_argument('--interval', type=float, default=5)
+    record.add_argument('--synthetic', type=int, metavar='PROCESSES',
+                        help='Record the deterministic benchmark stub with this many processes instead')
+
+    replay = sub.add_parser('replay', help='Run IssueDiagnoser over a trace')
+    replay.add_argument('path')
+    replay.add_argument('--speed', type=float, help='Pace the replay at this multiple of real time')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        source = None
+        if args.synthetic:
+            from benchmark import FakePsutil
+            source = FakePsutil(num_processes=args.synthetic, blocking_scale=0)
+        count = record_trace(args.path, args.frames, 0 if args.synthetic else args.interval, source)
+        print(f"Recorded {count} frames to {args.path}")
+        return 0
+
+    started = time.perf_counter()
+    frames = 0
+    for timestamp, diagnosis in replay_diagnosis(args.path, speed=args.speed):
+        frames += 1
+        titles = ', '.join(issue['title'] for issue in diagnosis['issues']) or 'no issues'
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}  {titles}")
+    print(f"Replayed {frames} frames in {time.perf_counter() - started:.2f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
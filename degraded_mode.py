@@ -0,0 +1,202 @@
+"""
+Degraded Mode Module
+Watches SPTool's own CPU and memory use and the host's pressure. While the host
+is struggling SPTool switches to a low-overhead mode: slower background
+sampling, process scans limited to the last known heavy hitters, expensive
+sections skipped, and the lowest CPU and I/O priority for its own threads
+"""
+import threading
+import time
+import platform
+import psutil
+from config import Config
+from pressure import PressureReader
+from metrics_sampler import get_sampler
+from instrumentation import REGISTRY
+
+class DegradedModeGovernor:
+    # get_full_diagnostic sections that are skipped while degraded
+    SKIPPED_SECTIONS = ('process_groups', 'temperature')
+
+    def __init__(self, sampler=None):
+        self.sampler = sampler
+        self.enabled = Config.DEGRADED_MODE_ENABLED
+        self.active = False
+        self.since = None
+        self.reasons = []
+        self.signals = {}
+        self.reniced = False
+        self._self_proc = psutil.Process()
+        self._self_proc.cpu_percent(None)   # baseline for the first reading
+        self._pressure = PressureReader()
+        self._original_priority = None      # (nice, (ioclass, value)) before renicing
+        self._last_check = None
+        self._lock = threading.Lock()
+
+    def update(self, force=False):
+        """
+        Re-evaluate the signals, at most every DEGRADED_CHECK_INTERVAL seconds
+
+        Degraded mode starts when any signal reaches its limit and ends only when
+        every signal is below DEGRADED_EXIT_RATIO of its limit, so it does not
+        flap around the threshold.
+
+        Returns:
+            True while degraded
+        """
+        if not self.enabled:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._last_check is not None and now - self._last_check < Config.DEGRADED_CHECK_INTERVAL:
+                return self.active
+            self._last_check = now
+
+            try:
+                self.signals = self._read_signals()
+            except Exception:
+                return self.active
+
+            limits = self._limits(self.signals)
+            over = [name for name, (value, limit) in limits.items() if value >= limit]
+            if over:
+                self.reasons = over
+                if not self.active:
+                    self._enter()
+            elif self.active and all(value < limit * Config.DEGRADED_EXIT_RATIO
+                                     for value, limit in limits.values()):
+                self._leave()
+            return self.active
+
+    def status(self):
+        """Current mode, the signals behind it and what is being throttled"""
+        return {
+            'enabled': self.enabled,
+            'active': self.active,
+            'since': self.since,
+            'reasons': list(self.reasons) if self.active else [],
+            'signals': dict(self.signals),
+            'reniced': self.reniced,
+            'sampler_slowdown': getattr(self.sampler, 'slowdown', 1),
+            'skipped_sections': list(self.SKIPPED_SECTIONS) if self.active else []
+        }
+
+    def export_metrics(self):
+        """Collector for the /metrics endpoint"""
+        return [('sptool_degraded_mode', 'gauge', 'Whether SPTool is throttling itself (1) or not (0)',
+                 [({}, int(self.active))])]
+
+    def _read_signals(self):
+        pressure = self._pressure.read()
+        psi = pressure.get('psi', {})
+        with self._self_proc.oneshot():
+            self_cpu = self._self_proc.cpu_percent(None)
+            self_rss = self._self_proc.memory_info().rss
+        return {
+            'cpu_pressure': psi.get('cpu', {}).get('some', {}).get('avg10'),
+            'memory_pressure': psi.get('memory', {}).get('some', {}).get('avg10'),
+            'load_per_cpu': pressure.get('load_per_cpu'),
+            'memory_percent': psutil.virtual_memory().percent,
+            'self_cpu_percent': round(self_cpu, 1),
+            'self_rss_mb': round(self_rss / (1024 * 1024), 1)
+        }
+
+    @staticmethod
+    def _limits(signals):
+        """(value, limit) for every signal that has a value"""
+        limits = {
+            'cpu_pressure': (signals['cpu_pressure'], Config.DEGRADED_CPU_PRESSURE),
+            'memory_pressure': (signals['memory_pressure'], Config.DEGRADED_MEMORY_PRESSURE),
+            'memory_percent': (signals['memory_percent'], Config.DEGRADED_MEMORY_PERCENT),
+            'self_cpu_percent': (signals['self_cpu_percent'], Config.DEGRADED_SELF_CPU_PERCENT),
+            'self_rss_mb': (signals['self_rss_mb'], Config.DEGRADED_SELF_RSS_MB),
+        }
+        # Load average counts tasks in uninterruptible sleep too, so only fall back on it without PSI
+        if signals['cpu_pressure'] is None:
+            limits['load_per_cpu'] = (signals['load_per_cpu'], Config.DEGRADED_LOAD_PER_CPU)
+        return {name: pair for name, pair in limits.items() if pair[0] is not None}
+
+    def _enter(self):
+        self.active = True
+        self.since = time.time()
+        if self.sampler is not None:
+            self.sampler.slowdown = Config.DEGRADED_SAMPLER_SLOWDOWN
+        self._set_priority(degraded=True)
+
+    def _leave(self):
+        self.active = False
+        self.since = None
+        self.reasons = []
+        if self.sampler is not None:
+            self.sampler.slowdown = 1
+        self._set_priority(degraded=False)
+
+    def _set_priority(self, degraded):
+        """
+        Renice and ionice SPTool. Linux applies both per thread, so every current
+        thread is changed; threads started later inherit from their creator.
+        Raising the priority again needs privileges, so unprivileged SPTool
+        stays reniced after the host recovers.
+        """
+        if degraded:
+            if self._original_priority is None:
+                try:
+                    self._original_priority = (self._self_proc.nice(), tuple(self._self_proc.ionice()))
+                except (psutil.Error, AttributeError, OSError):
+                    self._original_priority = (self._self_proc.nice(), None)
+            nice = Config.DEGRADED_NICE
+            ionice = (psutil.IOPRIO_CLASS_IDLE, None) if hasattr(psutil, 'IOPRIO_CLASS_IDLE') else None
+        elif self._original_priority is not None:
+            nice, ionice = self._original_priority
+            if ionice is not None and ionice[0] in (getattr(psutil, 'IOPRIO_CLASS_NONE', None),
+                                                    getattr(psutil, 'IOPRIO_CLASS_IDLE', None)):
+                ionice = (ionice[0], None)
+        else:
+            return
+
+        changed = False
+        for proc in self._threads():
+            try:
+                proc.nice(nice)
+                changed = True
+            except (psutil.Error, OSError):
+                pass
+            if ionice is not None:
+                try:
+                    proc.ionice(*ionice)
+                except (psutil.Error, OSError, ValueError):
+                    pass
+
+        if degraded:
+            self.reniced = changed or self.reniced
+        elif changed and self._self_proc.nice() == nice:
+            self.reniced = False
+
+    def _threads(self):
+        if platform.system() != 'Linux':
+            return [self._self_proc]
+        procs = []
+        try:
+            for thread in self._self_proc.threads():
+                try:
+                    procs.append(psutil.Process(thread.id))
+                except psutil.Error:
+                    pass
+        except psutil.Error:
+            pass
+        return procs or [self._self_proc]
+
+_shared_governor = None
+_shared_lock = threading.Lock()
+
+def get_governor():
+    """Return the process-wide governor, attached to the shared sampler"""
+    global _shared_governor
+    with _shared_lock:
+        if _shared_governor is None:
+            sampler = get_sampler()
+            _shared_governor = DegradedModeGovernor(sampler=sampler)
+            sampler.add_listener(_shared_governor.update)
+            REGISTRY.add_collector(_shared_governor.export_metrics)
+        return _shared_governor
@@ -0,0 +1,256 @@
+"""
+Disk Usage Module
+Finds what is filling a filesystem. A mountpoint is walked by parallel
+os.scandir workers without leaving the filesystem, and only one compact record
+per directory is kept (its own bytes, file count, subdirectory names and any
+large files), never a list of every path. Directory mtimes are remembered, so
+a re-scan only lists directories whose entries changed
+"""
+import heapq
+import os
+import queue
+import stat
+import threading
+import time
+from config import Config
+from throttling import InflightCall
+
+class _Dir:
+    __slots__ = ('mtime_ns', 'own_bytes', 'files', 'subdirs', 'large_files')
+
+    def __init__(self, mtime_ns, own_bytes, files, subdirs, large_files):
+        self.mtime_ns = mtime_ns
+        self.own_bytes = own_bytes
+        self.files = files
+        self.subdirs = subdirs          # names, not paths
+        self.large_files = large_files  # ((bytes, name), ...) at or above DISK_USAGE_LARGE_FILE_MB
+
+class DiskUsageAnalyzer:
+    def __init__(self, workers=None):
+        self.workers = workers or Config.DISK_USAGE_WORKERS
+        self._trees = {}        # mountpoint -> {path: _Dir} from the last scan
+        self._reports = {}      # mountpoint -> last report
+        self._scanning = {}     # mountpoint -> InflightCall of the scan running for it
+        self._lock = threading.Lock()
+
+    def analyze(self, mountpoint, wait=False, defer=False):
+        """
+        Largest directories and files under a mountpoint
+
+        Reports younger than DISK_USAGE_CACHE_TTL are returned as they are.
+        Otherwise a re-scan starts in the background, unless one is already
+        running, and the previous report, if any, is returned with 'stale': True;
+        wait=True waits for that scan instead. defer=True never starts a scan
+        and only returns what is cached, even with wait=True.
+
+        Returns:
+            Report dictionary, {'status': 'scanning'} before the first scan ends,
+            or {'status': 'deferred'} when a deferred call has nothing cached
+        """
+        mountpoint = os.path.abspath(mountpoint)
+        with self._lock:
+            report = self._reports.get(mountpoint)
+            fresh = report is not None and time.time() - report['scanned_at'] < Config.DISK_USAGE_CACHE_TTL
+            if fresh:
+                return report
+            if defer:
+                if report is None:
+                    return {'mountpoint': mountpoint, 'status': 'deferred'}
+                return dict(report, stale=True)
+            call = self._scanning.get(mountpoint)
+            if call is None:
+                call = self._scanning[mountpoint] = InflightCall()
+                threading.Thread(target=self._scan_in_background, args=(mountpoint, call),
+                                 name='sptool-disk-usage', daemon=True).start()
+
+        if wait:
+            call.done.wait()
+            return call.result
+        if report is None:
+            return {'mountpoint': mountpoint, 'status': 'scanning'}
+        return dict(report, stale=True)
+
+    def scan(self, mountpoint):
+        """Scan now, reusing unchanged directories from the previous scan"""
+        mountpoint = os.path.abspath(mountpoint)
+        try:
+            root_stat = os.stat(mountpoint)
+        except OSError as e:
+            return {'mountpoint': mountpoint, 'error': str(e)}
+
+        started = time.monotonic()
+        with self._lock:
+            previous = self._trees.get(mountpoint, {})
+            last = self._reports.get(mountpoint)
+        # Directory mtimes miss files growing in place, so ignore them now and then
+        if last is not None and time.time() - last['scanned_at'] > Config.DISK_USAGE_FULL_RESCAN:
+            previous = {}
+
+        tree, stats = self._walk(mountpoint, root_stat, previous)
+        report = self._report(mountpoint, tree)
+        report.update({
+            'scanned_at': time.time(),
+            'scan_seconds': round(time.monotonic() - started, 2),
+            'directories_listed': stats['listed'],
+            'directories_reused': stats['reused'],
+            'errors': stats['errors']
+        })
+        with self._lock:
+            self._trees[mountpoint] = tree
+            self._reports[mountpoint] = report
+        return report
+
+    def _scan_in_background(self, mountpoint, call):
+        try:
+            call.result = self.scan(mountpoint)
+        except Exception as e:
+            call.result = {'mountpoint': mountpoint, 'error': str(e)}
+        finally:
+            with self._lock:
+                self._scanning.pop(mountpoint, None)
+            call.done.set()
+
+    def _walk(self, root, root_stat, previous):
+        """Walk `root` with a pool of workers sharing one directory queue"""
+        device = root_stat.st_dev
+        tree = {}
+        stats = {'listed': 0, 'reused': 0, 'errors': 0}
+        seen_inodes = set()     # hard-linked files are counted once
+        lock = threading.Lock()
+        large = Config.DISK_USAGE_LARGE_FILE_MB * 1024 * 1024
+        pending = queue.Queue()
+        pending.put((root, root_stat.st_mtime_ns))
+
+        def list_dir(path, mtime_ns):
+            own_bytes = files = 0
+            subdirs = []
+            large_files = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if st.st_dev != device:
+                        continue
+                    if stat.S_ISDIR(st.st_mode):
+                        subdirs.append(entry.name)
+                        pending.put((entry.path, st.st_mtime_ns))
+                        continue
+                    if st.st_nlink > 1 and stat.S_ISREG(st.st_mode):
+                        with lock:
+                            if (st.st_dev, st.st_ino) in seen_inodes:
+                                continue
+                            seen_inodes.add((st.st_dev, st.st_ino))
+                    size = _allocated(st)
+                    own_bytes += size
+                    files += 1
+                    if size >= large:
+                        large_files.append((size, entry.name))
+            return _Dir(mtime_ns, own_bytes, files, tuple(subdirs), tuple(large_files))
+
+        def reuse_dir(path, cached):
+            for name in cached.subdirs:
+                child = os.path.join(path, name)
+                try:
+                    st = os.lstat(child)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode) and st.st_dev == device:
+                    pending.put((child, st.st_mtime_ns))
+            return cached
+
+        def worker():
+            while True:
+                item = pending.get()
+                if item is None:
+                    pending.task_done()
+                    return
+                path, mtime_ns = item
+                key = 'errors'
+                try:
+                    cached = previous.get(path)
+                    if cached is not None and cached.mtime_ns == mtime_ns:
+                        tree[path] = reuse_dir(path, cached)
+                        key = 'reused'
+                    else:
+                        tree[path] = list_dir(path, mtime_ns)
+                        key = 'listed'
+                except Exception:
+                    # Usually an OSError; whatever it is, the directory counts as an
+                    # error and the worker goes on, or pending.join() never returns
+                    pass
+                finally:
+                    with lock:
+                        stats[key] += 1
+                    pending.task_done()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        pending.join()
+        for _ in threads:
+            pending.put(None)
+        for thread in threads:
+            thread.join()
+        return tree, stats
+
+    def _report(self, root, tree):
+        """Fold directory records into subtree totals, the largest directories and files"""
+        totals = {path: entry.own_bytes for path, entry in tree.items()}
+        counts = {path: entry.files for path, entry in tree.items()}
+        # Children before parents: deeper paths first
+        for path in sorted(tree, key=lambda p: p.count(os.sep), reverse=True):
+            if path == root:
+                continue
+            parent = os.path.dirname(path)
+            if parent in totals:
+                totals[parent] += totals[path]
+                counts[parent] += counts[path]
+
+        limit = Config.DISK_USAGE_TOP
+        largest_files = heapq.nlargest(limit, (
+            (size, os.path.join(path, name))
+            for path, entry in tree.items() for size, name in entry.large_files
+        ))
+        # Directories whose own files take the most space point at what to clean
+        heaviest = heapq.nlargest(limit, ((entry.own_bytes, path) for path, entry in tree.items()))
+
+        return {
+            'mountpoint': root,
+            'total_bytes': totals.get(root, 0),
+            'total_files': counts.get(root, 0),
+            'directories': len(tree),
+            'tree': self._subtree(root, tree, totals, counts, Config.DISK_USAGE_TREE_DEPTH),
+            'largest_directories': [
+                {'path': path, 'bytes': size, 'files': tree[path].files} for size, path in heaviest if size
+            ],
+            'largest_files': [{'path': path, 'bytes': size} for size, path in largest_files]
+        }
+
+    def _subtree(self, path, tree, totals, counts, depth):
+        """Nested view of the biggest children, DISK_USAGE_TOP per level"""
+        node = {'path': path, 'bytes': totals.get(path, 0), 'files': counts.get(path, 0)}
+        entry = tree.get(path)
+        if depth > 0 and entry is not None and entry.subdirs:
+            children = [os.path.join(path, name) for name in entry.subdirs]
+            children = heapq.nlargest(Config.DISK_USAGE_TOP, (c for c in children if c in totals),
+                                      key=lambda c: totals[c])
+            node['children'] = [self._subtree(child, tree, totals, counts, depth - 1) for child in children]
+        return node
+
+def _allocated(st):
+    """Bytes actually allocated, so sparse files are not overstated"""
+    blocks = getattr(st, 'st_blocks', None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+_shared_analyzer = None
+_shared_lock = threading.Lock()
+
+def get_disk_usage_analyzer():
+    """Return the process-wide analyzer and its scan cache"""
+    global _shared_analyzer
+    with _shared_lock:
+        if _shared_analyzer is None:
+            _shared_analyzer = DiskUsageAnalyzer()
+        return _shared_analyzer
@@ -0,0 +1,212 @@
+"""
+Fix Impact Module
+Measures whether an executed fix helped. The metrics that matter for the fix
+are read from the shared sampler just before it runs and again after a
+settling window, the deltas are added to the fix's audit record, and the
+outcomes are folded into per-fix effectiveness used to rank suggested fixes
+"""
+import os
+import threading
+import time
+import psutil
+from config import Config
+from metrics_sampler import get_sampler
+from temp_cleanup import get_temp_cleaner
+
+# fix_id -> (metric, direction that counts as an improvement)
+IMPACT_METRICS = {
+    'clear_cache': (('memory_available', 'up'), ('memory_percent', 'down'), ('swap_percent', 'down')),
+    'kill_process': (('cpu_usage', 'down'), ('memory_percent', 'down')),
+    'clear_temp': (('disk_free', 'up'),),
+    'disk_cleanup': (('disk_free', 'up'),),
+    'restart_network': (('network_errors', 'down'), ('network_drops', 'down')),
+    'restart_service': (('cpu_usage', 'down'), ('memory_percent', 'down')),
+}
+
+class FixImpactTracker:
+    def __init__(self, sampler=None, audit=None):
+        self.sampler = sampler
+        self.audit = audit
+        self._stats = {}        # fix_id -> {'runs', 'improved', 'deltas': {metric: sum}}
+        self._loaded = audit is None
+        self._loading = threading.Lock()   # held while the history is read, so measure() waits for it
+        self._lock = threading.Lock()
+
+    def tracks(self, fix_id):
+        return fix_id in IMPACT_METRICS
+
+    def snapshot(self, fix_id):
+        """Current values of the fix's metrics, taken from the sampler's cache"""
+        values = {}
+        for metric, _ in IMPACT_METRICS.get(fix_id, ()):
+            value = self._read(metric)
+            if value is not None:
+                values[metric] = value
+        return {'ts': time.time(), 'values': values}
+
+    def schedule(self, fix_id, before, audit_key=None):
+        """Measure again after the settling window, in a timer thread"""
+        timer = threading.Timer(self.settle_seconds(), self.measure, args=(fix_id, before, audit_key))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def settle_seconds(self):
+        """Long enough for two samples after the fix, so rates cover only the new state"""
+        interval = getattr(self.sampler, 'interval', 0) * getattr(self.sampler, 'slowdown', 1)
+        return max(Config.FIX_IMPACT_SETTLE_SECONDS, 2 * interval + 1)
+
+    def measure(self, fix_id, before, audit_key=None):
+        """
+        Compare the snapshot taken before the fix with the current values
+
+        Returns:
+            Impact dictionary with per-metric before/after/delta and whether the
+            fix improved anything, or None if there was nothing to compare
+        """
+        # Fold the history first; loaded later, it would replay this impact's audit annotation again
+        self._load_history()
+        after = self.snapshot(fix_id)
+        metrics = {}
+        for metric, direction in IMPACT_METRICS.get(fix_id, ()):
+            old = before['values'].get(metric)
+            new = after['values'].get(metric)
+            if old is None or new is None:
+                continue
+            delta = new - old
+            change = delta if direction == 'up' else -delta
+            metrics[metric] = {
+                'before': old,
+                'after': new,
+                'delta': round(delta, 2),
+                'improved': change > self._noise(metric, old)
+            }
+        if not metrics:
+            return None
+
+        impact = {
+            'settle_seconds': round(after['ts'] - before['ts'], 1),
+            'metrics': metrics,
+            'improved': any(m['improved'] for m in metrics.values())
+        }
+        self._fold(fix_id, impact)
+        if self.audit is not None and audit_key is not None:
+            self.audit.annotate(fix_id, audit_key, impact=impact)
+        return impact
+
+    def effectiveness(self):
+        """
+        Per-fix effectiveness: runs, how many improved a metric, mean deltas and
+        a score, the smoothed improvement rate (improved + 1) / (runs + 2)
+        """
+        self._load_history()
+        with self._lock:
+            return {
+                fix_id: {
+                    'runs': stats['runs'],
+                    'improved': stats['improved'],
+                    'score': self._score(stats),
+                    'mean_deltas': {metric: round(total / stats['runs'], 2)
+                                    for metric, total in stats['deltas'].items()}
+                }
+                for fix_id, stats in self._stats.items()
+            }
+
+    def score(self, fix_id):
+        """Effectiveness score of a fix; 0.5 when it has never been measured"""
+        self._load_history()
+        with self._lock:
+            stats = self._stats.get(fix_id)
+            return self._score(stats) if stats else 0.5
+
+    def rank(self, suggested_fixes):
+        """Order suggested fixes by effectiveness, most effective first, and annotate them"""
+        for fix in suggested_fixes:
+            fix['effectiveness'] = self.score(fix['fix_id'])
+        return sorted(suggested_fixes, key=lambda fix: fix['effectiveness'], reverse=True)
+
+    @staticmethod
+    def _score(stats):
+        return round((stats['improved'] + 1) / (stats['runs'] + 2), 3)
+
+    def _fold(self, fix_id, impact):
+        with self._lock:
+            stats = self._stats.setdefault(fix_id, {'runs': 0, 'improved': 0, 'deltas': {}})
+            stats['runs'] += 1
+            stats['improved'] += int(impact['improved'])
+            for metric, values in impact['metrics'].items():
+                stats['deltas'][metric] = stats['deltas'].get(metric, 0) + values['delta']
+
+    def _load_history(self):
+        """Seed the statistics from impacts already in the audit log, once, before any new impact is folded"""
+        if self._loaded:
+            return
+        with self._loading:
+            if self._loaded:
+                return
+            try:
+                records = self.audit.query(outcome='success', limit=Config.FIX_IMPACT_HISTORY)
+            except Exception:
+                records = []
+            for record in records:
+                if isinstance(record.get('impact'), dict):
+                    self._fold(record['fix_id'], record['impact'])
+            self._loaded = True
+
+    def _read(self, metric):
+        if metric == 'disk_free':
+            return self._disk_free()
+        if self.sampler is None:
+            return None
+        if metric == 'cpu_usage':
+            cpu = self.sampler.get('cpu')
+            return cpu['usage'] if cpu else None
+        if metric.startswith('memory_') or metric == 'swap_percent':
+            memory = self.sampler.get('memory')
+            if not memory:
+                return None
+            return {
+                'memory_available': memory['available'],
+                'memory_percent': memory['percent'],
+                'swap_percent': memory['swap_percent']
+            }[metric]
+        if metric.startswith('network_'):
+            network = self.sampler.get('network')
+            if not network:
+                return None
+            fields = ('errin', 'errout') if metric == 'network_errors' else ('dropin', 'dropout')
+            return round(sum(rates[field] for rates in network['interfaces'].values() for field in fields), 2)
+        return None
+
+    @staticmethod
+    def _disk_free():
+        """Free bytes across the temp directories' filesystems; statvfs is cheap and never blocks on I/O"""
+        free = {}
+        for path in get_temp_cleaner().directories:
+            try:
+                free[os.stat(path).st_dev] = psutil.disk_usage(path).free
+            except OSError:
+                continue
+        return sum(free.values()) if free else None
+
+    @staticmethod
+    def _noise(metric, before):
+        """Smallest change that counts, so sampling jitter is not reported as an effect"""
+        if metric in ('memory_available', 'disk_free'):
+            return max(before * 0.005, 1024 * 1024)
+        if metric in ('network_errors', 'network_drops'):
+            return 0
+        return Config.FIX_IMPACT_MIN_PERCENT
+
+_shared_tracker = None
+_shared_lock = threading.Lock()
+
+def get_fix_impact_tracker():
+    """Return the process-wide tracker, attached to the shared sampler and audit log"""
+    global _shared_tracker
+    with _shared_lock:
+        if _shared_tracker is None:
+            from audit_log import get_audit_log
+            audit = get_audit_log() if Config.LOG_ACTIONS else None
+            _shared_tracker = FixImpactTracker(sampler=get_sampler(), audit=audit)
+        return _shared_tracker
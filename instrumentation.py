@@ -0,0 +1,172 @@
+"""
+Instrumentation Module
+Low-overhead counters and histograms for SPTool's own timings, rendered in the
+Prometheus text exposition format by the /metrics endpoint
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}   # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+
+        samples = []
+        for key, state in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                samples.append((self.name + '_bucket', dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((self.name + '_bucket', dict(labels, le='+Inf'), state[-1]))
+            samples.append((self.name + '_sum', labels, state[-2]))
+            samples.append((self.name + '_count', labels, state[-1]))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """
+        Add a callable run at scrape time. It must only read cached state and
+        return a list of (name, type, help, [(labels, value), ...]) families
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """Render every metric in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(_format_sample(name, labels, value))
+
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception:
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(_format_sample(name, labels, value))
+
+        return '\n'.join(lines) + '\n'
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _format_sample(name, labels, value):
+    if labels:
+        rendered = ','.join(
+            '{}="{}"'.format(key, str(val).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for key, val in labels.items()
+        )
+        return f'{name}{{{rendered}}} {_format_value(value)}'
+    return f'{name} {_format_value(value)}'
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'sptool_http_request_duration_seconds', 'Time spent handling API requests',
+    ('endpoint', 'method', 'status')))
+DIAGNOSTIC_SECTION_SECONDS = REGISTRY.register(Histogram(
+    'sptool_diagnostic_section_duration_seconds', 'Time spent collecting each get_full_diagnostic section',
+    ('section',)))
+DIAGNOSIS_CHECK_SECONDS = REGISTRY.register(Histogram(
+    'sptool_diagnosis_check_duration_seconds', 'Time spent in each IssueDiagnoser check',
+    ('check',)))
+FIX_EXECUTIONS = REGISTRY.register(Counter(
+    'sptool_fix_executions_total', 'Fix requests by fix_id and outcome',
+    ('fix_id', 'outcome')))
+FIX_SECONDS = REGISTRY.register(Histogram(
+    'sptool_fix_duration_seconds', 'Time spent running fix commands',
+    ('fix_id',)))
+CHAT_SECONDS = REGISTRY.register(Histogram(
+    'sptool_chat_duration_seconds', 'Time spent in ChatAgent.chat',
+    ('outcome',)))
+CHAT_TOKENS = REGISTRY.register(Counter(
+    'sptool_chat_tokens_total', 'OpenAI tokens used, from response.usage',
+    ('type',)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'sptool_cache_requests_total', 'Lookups in SPTool caches by result',
+    ('cache', 'result')))
+ADMISSION_DECISIONS = REGISTRY.register(Counter(
+    'sptool_admission_decisions_total', 'Requests to guarded endpoints by admission result',
+    ('endpoint', 'result')))
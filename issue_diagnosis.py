@@ -4,11 +4,23 @@ Analyzes system data and identifies problems with suggested fixes
 """
 from config import Config
 from system_diagnostics import SystemDiagnostics
+from data_sources import ReplaySource
+from disk_usage import get_disk_usage_analyzer
+from fix_impact import get_fix_impact_tracker
+from instrumentation import DIAGNOSIS_CHECK_SECONDS
+
+# Issue severities, least to most urgent
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2}
 
 class IssueDiagnoser:
-    def __init__(self):
-        self.diagnostics = SystemDiagnostics()
+    def __init__(self, diagnostics=None):
+        self.diagnostics = diagnostics or SystemDiagnostics()
         self.config = Config()
+        # Replayed traces describe another time and host, so there is nothing to scan
+        replay = isinstance(self.diagnostics.source, ReplaySource)
+        self.disk_usage = None if replay else get_disk_usage_analyzer()
+        self.fix_impact = None if replay or not Config.FIX_IMPACT_ENABLED else get_fix_impact_tracker()
+        self._listeners = []
     
     def diagnose_all(self):
         """Run full system diagnosis and return identified issues"""
@@ -18,60 +30,235 @@ class IssueDiagnoser:
         data = self.diagnostics.get_full_diagnostic()
         
         # Check CPU issues
-        cpu_issues = self._check_cpu(data.get('cpu', {}))
+        with DIAGNOSIS_CHECK_SECONDS.time(check='cpu'):
+            cpu_issues = self._check_cpu(data.get('cpu', {}), data.get('pressure', {}))
+            cpu_issues += self._check_cpu_cores(data.get('cpu', {}))
         issues.extend(cpu_issues)
         
         # Check memory issues
-        memory_issues = self._check_memory(data.get('memory', {}))
+        with DIAGNOSIS_CHECK_SECONDS.time(check='memory'):
+            memory_issues = self._check_memory(data.get('memory', {}), data.get('pressure', {}))
         issues.extend(memory_issues)
         
         # Check disk issues
-        disk_issues = self._check_disk(data.get('disk', []))
+        with DIAGNOSIS_CHECK_SECONDS.time(check='disk'):
+            disk_issues = self._check_disk(data.get('disk', []))
         issues.extend(disk_issues)
         
+        # Check disk I/O issues
+        with DIAGNOSIS_CHECK_SECONDS.time(check='disk_io'):
+            disk_io_issues = self._check_disk_io(data.get('disk_io', {}))
+        issues.extend(disk_io_issues)
+        
+        # Check network issues
+        with DIAGNOSIS_CHECK_SECONDS.time(check='network'):
+            network_issues = self._check_network(data.get('network', {}))
+        issues.extend(network_issues)
+        
         # Check temperature issues
-        temp_issues = self._check_temperature(data.get('temperature', {}))
+        with DIAGNOSIS_CHECK_SECONDS.time(check='temperature'):
+            temp_issues = self._check_temperature(data.get('temperature', {}))
         issues.extend(temp_issues)
         
         # Check process issues
-        process_issues = self._check_processes(data.get('processes', {}))
+        with DIAGNOSIS_CHECK_SECONDS.time(check='processes'):
+            process_issues = self._check_processes(data.get('processes', {}))
         issues.extend(process_issues)
         
+        # Check process group issues (trees, systemd units, cgroups)
+        with DIAGNOSIS_CHECK_SECONDS.time(check='process_groups'):
+            group_issues = self._check_process_groups(data.get('process_groups', {}))
+        issues.extend(group_issues)
+        
+        # Check for processes leaking memory or file descriptors
+        with DIAGNOSIS_CHECK_SECONDS.time(check='leaks'):
+            leak_issues = self._check_leaks(data.get('leaks', {}))
+        issues.extend(leak_issues)
+        
+        self._rank_fixes(issues)
+        self._notify(issues)
+        
         return {
             'total_issues': len(issues),
             'issues': issues,
             'system_data': data
         }
     
-    def _check_cpu(self, cpu_data):
-        """Check for CPU-related issues"""
+    def add_listener(self, callback):
+        """Call callback(issues) after every full diagnosis, e.g. to raise alerts"""
+        self._listeners.append(callback)
+    
+    def _notify(self, issues):
+        for callback in self._listeners:
+            try:
+                callback(issues)
+            except Exception:
+                pass
+    
+    def _rank_fixes(self, issues):
+        """Put the fixes that measurably helped before first, using recorded fix impact"""
+        if self.fix_impact is None:
+            return
+        for issue in issues:
+            if issue.get('suggested_fixes'):
+                issue['suggested_fixes'] = self.fix_impact.rank(issue['suggested_fixes'])
+    
+    def _check_cpu(self, cpu_data, pressure_data=None):
+        """
+        Check for CPU-related issues
+        
+        When PSI is available, CPU stall time is the primary signal: a busy CPU
+        with nothing waiting for it is healthy, and contention is reported even
+        if average usage looks moderate.
+        """
         issues = []
         
         if 'error' in cpu_data:
             return issues
         
         cpu_usage = cpu_data.get('usage', 0)
+        pressure_data = pressure_data or {}
+        cpu_psi = pressure_data.get('psi', {}).get('cpu', {}).get('some')
+        kill_fix = {
+            'fix_id': 'kill_process',
+            'description': 'Kill resource-intensive processes',
+            'requires_params': True
+        }
+        
+        if cpu_psi is not None:
+            stall = cpu_psi.get('avg10', 0)
+            if stall > self.config.CPU_PRESSURE_THRESHOLD:
+                issues.append({
+                    'severity': 'high' if stall > 2 * self.config.CPU_PRESSURE_THRESHOLD else 'medium',
+                    'category': 'cpu',
+                    'title': 'CPU Contention',
+                    'description': f'Runnable tasks waited for a CPU {stall}% of the last 10 seconds (CPU usage {cpu_usage}%)',
+                    'metrics': {
+                        'cpu_usage': cpu_usage,
+                        'cpu_pressure_avg10': stall,
+                        'cpu_pressure_avg60': cpu_psi.get('avg60'),
+                        'load_average': pressure_data.get('load_average'),
+                        'runnable': pressure_data.get('runnable')
+                    },
+                    'suggested_fixes': [kill_fix]
+                })
+            return issues
+        
+        load_per_cpu = pressure_data.get('load_per_cpu')
+        overloaded = load_per_cpu is not None and load_per_cpu > self.config.LOAD_PER_CPU_THRESHOLD
         
-        if cpu_usage > self.config.CPU_THRESHOLD:
+        if cpu_usage > self.config.CPU_THRESHOLD or overloaded:
+            metrics = {'cpu_usage': cpu_usage}
+            if load_per_cpu is not None:
+                metrics['load_per_cpu'] = load_per_cpu
+                metrics['load_average'] = pressure_data.get('load_average')
             issues.append({
-                'severity': 'high' if cpu_usage > 95 else 'medium',
+                'severity': 'high' if cpu_usage > 95 or overloaded else 'medium',
                 'category': 'cpu',
                 'title': 'High CPU Usage',
                 'description': f'CPU usage is at {cpu_usage}%, which may cause performance issues',
-                'metrics': {'cpu_usage': cpu_usage},
-                'suggested_fixes': [
-                    {
-                        'fix_id': 'kill_process',
-                        'description': 'Kill resource-intensive processes',
-                        'requires_params': True
-                    }
-                ]
+                'metrics': metrics,
+                'suggested_fixes': [kill_fix]
             })
         
         return issues
     
-    def _check_memory(self, memory_data):
-        """Check for memory-related issues"""
+    def _check_cpu_cores(self, cpu_data):
+        """
+        Check individual cores: pinned cores, imbalance and throttled clocks
+        
+        A single-threaded bottleneck saturates one core while the aggregate
+        usage of a large machine stays low, so cores are judged on their own.
+        """
+        issues = []
+        
+        if 'error' in cpu_data:
+            return issues
+        
+        per_cpu = cpu_data.get('per_cpu') or []
+        pinned = cpu_data.get('pinned_cores') or []
+        busiest = {entry['core']: entry['threads'] for entry in cpu_data.get('busiest_threads') or []}
+        
+        if pinned and len(pinned) < len(per_cpu):
+            threads = [dict(thread, core=core) for core in pinned for thread in busiest.get(core, [])]
+            threads.sort(key=lambda thread: thread['cpu_percent'], reverse=True)
+            fix = {
+                'fix_id': 'kill_process',
+                'description': 'Kill the process pinning the core',
+                'requires_params': True
+            }
+            if threads:
+                fix['default_params'] = {'pid': threads[0]['pid']}
+            culprit = f" (busiest: {threads[0]['name']} PID {threads[0]['pid']})" if threads else ''
+            issues.append({
+                'severity': 'high' if len(pinned) * 2 >= len(per_cpu) else 'medium',
+                'category': 'cpu',
+                'title': 'Single-Core Saturation',
+                'description': (f"{len(pinned)} of {len(per_cpu)} cores pinned at "
+                                f">= {self.config.CPU_CORE_SATURATED}% while overall usage is "
+                                f"{cpu_data.get('usage', 0)}%{culprit}"),
+                'metrics': {
+                    'pinned_cores': pinned,
+                    'core_usage': {core: per_cpu[core] for core in pinned if core < len(per_cpu)},
+                    'cpu_usage': cpu_data.get('usage'),
+                    'busiest_threads': threads
+                },
+                'suggested_fixes': [fix]
+            })
+        elif cpu_data.get('imbalance', 0) > self.config.CPU_CORE_IMBALANCE:
+            issues.append({
+                'severity': 'low',
+                'category': 'cpu',
+                'title': 'CPU Load Imbalance',
+                'description': (f"The busiest core runs {cpu_data['imbalance']} points above the median core; "
+                                'work is not spreading across cores'),
+                'metrics': {'imbalance': cpu_data['imbalance'], 'per_cpu': per_cpu},
+                'suggested_fixes': []
+            })
+        
+        ratios = cpu_data.get('frequency_ratio') or []
+        if ratios and per_cpu:
+            shared = len(ratios) != len(per_cpu)
+            throttled = [
+                core for core, usage in enumerate(per_cpu)
+                if usage >= self.config.CPU_THRESHOLD
+                and (ratios[0] if shared else ratios[core]) is not None
+                and (ratios[0] if shared else ratios[core]) < self.config.CPU_THROTTLE_RATIO
+            ]
+            if throttled:
+                temperature = cpu_data.get('temperature')
+                thermal = temperature is not None and temperature >= self.config.TEMP_THRESHOLD
+                cause = (f'thermal throttling at {temperature}°C' if thermal
+                         else 'a power or frequency cap (temperature is normal)')
+                mhz = cpu_data.get('per_cpu_mhz') or []
+                issues.append({
+                    'severity': 'high' if thermal else 'medium',
+                    'category': 'cpu',
+                    'title': 'CPU Throttling',
+                    'description': (f"{len(throttled)} busy core(s) run below "
+                                    f"{int(self.config.CPU_THROTTLE_RATIO * 100)}% of their "
+                                    f"{cpu_data.get('max_mhz')} MHz maximum, likely {cause}"),
+                    'metrics': {
+                        'throttled_cores': throttled,
+                        'core_mhz': {core: (mhz[0] if shared else mhz[core]) for core in throttled if mhz},
+                        'max_mhz': cpu_data.get('max_mhz'),
+                        'temperature': temperature,
+                        'cause': 'thermal' if thermal else 'power'
+                    },
+                    'suggested_fixes': []
+                })
+        
+        return issues
+    
+    def _check_memory(self, memory_data, pressure_data=None):
+        """
+        Check for memory-related issues
+        
+        When PSI is available, memory stall time decides whether high usage or
+        swap is actually hurting anything. Without it, swap-in and direct
+        reclaim rates from /proc/vmstat tell real pressure from memory that is
+        merely in use.
+        """
         issues = []
         
         if 'error' in memory_data:
@@ -79,50 +266,147 @@ class IssueDiagnoser:
         
         memory_percent = memory_data.get('percent', 0)
         swap_percent = memory_data.get('swap_percent', 0)
+        pressure_data = pressure_data or {}
+        memory_psi = pressure_data.get('psi', {}).get('memory')
+        paging = memory_data.get('paging') or {}
+        kill_fix = {
+            'fix_id': 'kill_process',
+            'description': 'Kill memory-intensive processes',
+            'requires_params': True
+        }
+        cache_fix = self._clear_cache_fix(memory_data)
+        fixes = [kill_fix] + ([cache_fix] if cache_fix else [])
+        
+        if paging.get('oom_kills'):
+            issues.append({
+                'severity': 'high',
+                'category': 'memory',
+                'title': 'OOM Kills',
+                'description': f"The kernel killed {paging['oom_kills']} process(es) for lack of memory in the last "
+                               f"sample ({paging.get('oom_kill_total')} since boot)",
+                'metrics': {'oom_kills': paging['oom_kills'], 'oom_kill_total': paging.get('oom_kill_total'),
+                            'memory_percent': memory_percent},
+                'suggested_fixes': [dict(kill_fix)]
+            })
+        
+        if memory_psi is not None:
+            some = memory_psi.get('some', {}).get('avg10', 0)
+            full = memory_psi.get('full', {}).get('avg10', 0)
+            if some > self.config.MEMORY_PRESSURE_THRESHOLD or full > self.config.MEMORY_FULL_PRESSURE_THRESHOLD:
+                issues.append({
+                    'severity': 'high' if full > self.config.MEMORY_FULL_PRESSURE_THRESHOLD else 'medium',
+                    'category': 'memory',
+                    'title': 'Memory Pressure',
+                    'description': f'Tasks stalled on memory {some}% of the last 10 seconds (memory usage {memory_percent}%, swap {swap_percent}%)',
+                    'metrics': {
+                        'memory_percent': memory_percent,
+                        'swap_percent': swap_percent,
+                        'memory_pressure_some_avg10': some,
+                        'memory_pressure_full_avg10': full,
+                        'breakdown': memory_data.get('breakdown'),
+                        'paging': paging or None
+                    },
+                    'suggested_fixes': fixes
+                })
+            return issues
+        
+        swap_in = paging.get('swap_in')
+        reclaiming = paging.get('allocation_stalls', 0) > 0 or paging.get('scan_direct', 0) > 0
+        thrashing = swap_in is not None and swap_in >= self.config.MEMORY_SWAPIN_THRESHOLD
         
         if memory_percent > self.config.MEMORY_THRESHOLD:
+            if not paging:
+                severity = 'high' if memory_percent > 95 else 'medium'
+                description = f'Memory usage is at {memory_percent}%, system may slow down'
+            elif reclaiming or thrashing:
+                severity = 'high'
+                description = (f'Memory usage is at {memory_percent}% and the system is short of memory: '
+                               f"{paging.get('allocation_stalls', 0)} allocation stalls/s, "
+                               f'{swap_in} pages/s swapped in')
+            else:
+                severity = 'medium' if memory_percent > 95 else 'low'
+                description = (f'Memory usage is at {memory_percent}%, but nothing is stalling in reclaim '
+                               'or swapping in yet')
             issues.append({
-                'severity': 'high' if memory_percent > 95 else 'medium',
+                'severity': severity,
                 'category': 'memory',
                 'title': 'High Memory Usage',
-                'description': f'Memory usage is at {memory_percent}%, system may slow down',
+                'description': description,
                 'metrics': {
                     'memory_percent': memory_percent,
                     'memory_used_gb': memory_data.get('used', 0),
-                    'memory_total_gb': memory_data.get('total', 0)
+                    'memory_total_gb': memory_data.get('total', 0),
+                    'largest_consumer': self._largest_memory_consumer(memory_data.get('breakdown')),
+                    'breakdown': memory_data.get('breakdown'),
+                    'paging': paging or None
                 },
-                'suggested_fixes': [
-                    {
-                        'fix_id': 'clear_cache',
-                        'description': 'Clear system cache to free memory',
-                        'requires_params': False
-                    },
-                    {
-                        'fix_id': 'kill_process',
-                        'description': 'Kill memory-intensive processes',
-                        'requires_params': True
-                    }
-                ]
+                'suggested_fixes': fixes
             })
         
-        if swap_percent > 50:
+        if swap_percent > 50 or thrashing:
+            if thrashing:
+                severity, title = 'high', 'Swap Thrashing'
+                description = f'{swap_in} pages/s are being swapped back in (swap usage {swap_percent}%)'
+            elif swap_in is not None:
+                severity, title = 'low', 'High Swap Usage'
+                description = f'Swap usage is at {swap_percent}%, but little is swapped back in, so those pages are idle'
+            else:
+                severity, title = 'medium', 'High Swap Usage'
+                description = f'Swap usage is at {swap_percent}%, indicating memory pressure'
             issues.append({
-                'severity': 'medium',
+                'severity': severity,
                 'category': 'memory',
-                'title': 'High Swap Usage',
-                'description': f'Swap usage is at {swap_percent}%, indicating memory pressure',
-                'metrics': {'swap_percent': swap_percent},
-                'suggested_fixes': [
-                    {
-                        'fix_id': 'clear_cache',
-                        'description': 'Clear system cache',
-                        'requires_params': False
-                    }
-                ]
+                'title': title,
+                'description': description,
+                'metrics': {'swap_percent': swap_percent, 'swap_in': swap_in, 'swap_out': paging.get('swap_out')},
+                'suggested_fixes': [dict(kill_fix)]
             })
         
         return issues
     
+    def _clear_cache_fix(self, memory_data):
+        """
+        The clear_cache fix, only when dropping caches would actually help
+        
+        drop_caches frees clean page cache and reclaimable slab, which the
+        kernel reclaims on demand anyway, and re-reading the dropped files
+        causes an I/O storm. It pays off when dentry/inode slab has grown
+        large, or when allocations stall in direct reclaim while the cache is
+        cold (few refaults, so little of it would be read back).
+        """
+        breakdown = memory_data.get('breakdown')
+        if not breakdown or not breakdown.get('total'):
+            return None
+        paging = memory_data.get('paging') or {}
+        droppable_gb = breakdown['droppable']
+        if droppable_gb * 1024 < self.config.CLEAR_CACHE_MIN_DROPPABLE_MB:
+            return None
+        refaults = paging.get('file_refaults')
+        if refaults is not None and refaults > self.config.CLEAR_CACHE_MAX_REFAULTS:
+            return None
+        
+        slab_percent = breakdown['slab_reclaimable'] / breakdown['total'] * 100
+        if slab_percent >= self.config.CLEAR_CACHE_SLAB_PERCENT:
+            reason = f'{slab_percent:.0f}% of RAM is reclaimable dentry/inode slab'
+        elif refaults is not None and (paging.get('allocation_stalls', 0) > 0 or paging.get('scan_direct', 0) > 0):
+            reason = 'allocations stall in direct reclaim while the page cache is cold'
+        else:
+            return None
+        return {
+            'fix_id': 'clear_cache',
+            'description': f'Drop caches to free about {droppable_gb} GB ({reason})',
+            'requires_params': False
+        }
+    
+    @staticmethod
+    def _largest_memory_consumer(breakdown):
+        """The kind of non-reclaimable memory holding the most: processes, tmpfs, kernel slab or hugepages"""
+        if not breakdown:
+            return None
+        kinds = {'processes': breakdown['anon'], 'shmem/tmpfs': breakdown['shmem'],
+                 'kernel slab': breakdown['slab_unreclaimable'], 'hugepages': breakdown['hugepages']}
+        return max(kinds, key=kinds.get)
+    
     def _check_disk(self, disk_data):
         """Check for disk-related issues"""
         issues = []
@@ -144,6 +428,7 @@ class IssueDiagnoser:
                         'disk_free_gb': disk.get('free', 0),
                         'mountpoint': disk.get('mountpoint', 'Unknown')
                     },
+                    'disk_usage': self._disk_usage(disk.get('mountpoint')),
                     'suggested_fixes': [
                         {
                             'fix_id': 'clear_temp',
@@ -155,6 +440,172 @@ class IssueDiagnoser:
         
         return issues
     
+    def _disk_usage(self, mountpoint):
+        """
+        What fills the mountpoint, from the cached scan; a fresh scan runs in the
+        background unless degraded mode has shed background work
+        """
+        if self.disk_usage is None or not mountpoint:
+            return None
+        try:
+            return self.disk_usage.analyze(mountpoint, defer=self.diagnostics.is_degraded())
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def _check_disk_io(self, disk_io_data):
+        """Check for disk I/O saturation and latency using sampled rates"""
+        issues = []
+        
+        if not disk_io_data.get('available', False):
+            return issues
+        
+        for device in disk_io_data.get('devices', []):
+            name = device.get('device')
+            where = ', '.join(device.get('mountpoints', [])) or name
+            utilization = device.get('utilization_percent')
+            await_ms = device.get('await_ms', 0)
+            iops = device.get('read_iops', 0) + device.get('write_iops', 0)
+            metrics = {
+                'device': name,
+                'mountpoints': device.get('mountpoints', []),
+                'utilization_percent': utilization,
+                'await_ms': await_ms,
+                'read_iops': device.get('read_iops'),
+                'write_iops': device.get('write_iops'),
+                'read_bps': device.get('read_bps'),
+                'write_bps': device.get('write_bps')
+            }
+            
+            if utilization is not None and utilization > self.config.DISK_UTIL_THRESHOLD:
+                issues.append({
+                    'severity': 'high' if utilization > 98 else 'medium',
+                    'category': 'disk_io',
+                    'title': f'Disk I/O Saturated on {where}',
+                    'description': f'{name} was busy {utilization}% of the time ({iops} IOPS, {await_ms} ms average wait)',
+                    'metrics': metrics,
+                    'suggested_fixes': []
+                })
+            elif await_ms > self.config.DISK_AWAIT_THRESHOLD and iops >= self.config.DISK_MIN_IOPS:
+                issues.append({
+                    'severity': 'medium',
+                    'category': 'disk_io',
+                    'title': f'High Disk Latency on {where}',
+                    'description': f'I/O requests on {name} wait {await_ms} ms on average at {iops} IOPS',
+                    'metrics': metrics,
+                    'suggested_fixes': []
+                })
+        
+        return issues
+    
+    def _check_network(self, network_data):
+        """Check for network-related issues using sampled rates and socket states"""
+        issues = []
+        
+        if 'error' in network_data:
+            return issues
+        
+        restart_fix = {
+            'fix_id': 'restart_network',
+            'description': 'Restart network manager',
+            'requires_params': False
+        }
+        
+        rates = network_data.get('rates') or {}
+        for name, iface in rates.get('interfaces', {}).items():
+            utilization = iface.get('utilization_percent')
+            if utilization is not None and utilization > self.config.NET_UTILIZATION_THRESHOLD:
+                issues.append({
+                    'severity': 'high' if utilization > 95 else 'medium',
+                    'category': 'network',
+                    'title': f'Network Link Saturated: {name}',
+                    'description': f'{name} is at {utilization}% of its {iface.get("speed_mbps")} Mbit/s link speed',
+                    'metrics': {
+                        'interface': name,
+                        'utilization_percent': utilization,
+                        'bytes_sent_per_sec': iface.get('bytes_sent'),
+                        'bytes_recv_per_sec': iface.get('bytes_recv')
+                    },
+                    'suggested_fixes': []
+                })
+            
+            error_rate = iface.get('errin', 0) + iface.get('errout', 0)
+            if error_rate > self.config.NET_ERROR_RATE_THRESHOLD:
+                issues.append({
+                    'severity': 'medium',
+                    'category': 'network',
+                    'title': f'Network Errors on {name}',
+                    'description': f'{name} is seeing {error_rate} errors/s, which points at a faulty cable, driver or duplex mismatch',
+                    'metrics': {
+                        'interface': name,
+                        'errin_per_sec': iface.get('errin'),
+                        'errout_per_sec': iface.get('errout')
+                    },
+                    'suggested_fixes': [restart_fix]
+                })
+            
+            drop_rate = iface.get('dropin', 0) + iface.get('dropout', 0)
+            packet_rate = iface.get('packets_sent', 0) + iface.get('packets_recv', 0)
+            drop_percent = round(drop_rate / (packet_rate + drop_rate) * 100, 2) if drop_rate else 0
+            if drop_percent > self.config.NET_DROP_PERCENT_THRESHOLD:
+                issues.append({
+                    'severity': 'medium',
+                    'category': 'network',
+                    'title': f'Packet Drops on {name}',
+                    'description': f'{drop_percent}% of packets on {name} are being dropped ({drop_rate}/s)',
+                    'metrics': {
+                        'interface': name,
+                        'drop_percent': drop_percent,
+                        'dropin_per_sec': iface.get('dropin'),
+                        'dropout_per_sec': iface.get('dropout')
+                    },
+                    'suggested_fixes': [restart_fix]
+                })
+        
+        connections = network_data.get('connections') or {}
+        states = connections.get('states', {})
+        
+        close_wait = states.get('CLOSE_WAIT', 0)
+        if close_wait > self.config.NET_CLOSE_WAIT_THRESHOLD:
+            issues.append({
+                'severity': 'medium',
+                'category': 'network',
+                'title': 'Sockets Stuck in CLOSE_WAIT',
+                'description': f'{close_wait} connections were closed by the remote end but not by the local application',
+                'metrics': {'close_wait': close_wait},
+                'suggested_fixes': []
+            })
+        
+        time_wait = states.get('TIME_WAIT', 0)
+        if time_wait > self.config.NET_TIME_WAIT_THRESHOLD:
+            issues.append({
+                'severity': 'medium',
+                'category': 'network',
+                'title': 'Many Sockets in TIME_WAIT',
+                'description': f'{time_wait} connections are waiting to expire, which can exhaust ephemeral ports',
+                'metrics': {'time_wait': time_wait},
+                'suggested_fixes': []
+            })
+        
+        syn_sent = states.get('SYN_SENT', 0)
+        if syn_sent > self.config.NET_SYN_SENT_THRESHOLD:
+            issues.append({
+                'severity': 'high',
+                'category': 'network',
+                'title': 'Outbound Connections Not Completing',
+                'description': f'{syn_sent} connections are waiting for a reply, so remote hosts or DNS answers may be unreachable',
+                'metrics': {'syn_sent': syn_sent},
+                'suggested_fixes': [
+                    {
+                        'fix_id': 'flush_dns',
+                        'description': 'Flush DNS cache',
+                        'requires_params': False
+                    },
+                    restart_fix
+                ]
+            })
+        
+        return issues
+    
     def _check_temperature(self, temp_data):
         """Check for temperature-related issues"""
         issues = []
@@ -220,6 +671,106 @@ class IssueDiagnoser:
         
         return issues
     
+    def _check_leaks(self, leak_data):
+        """Report processes with sustained RSS or FD growth as probable leaks"""
+        issues = []
+        
+        if not leak_data.get('available', False):
+            return issues
+        
+        for leak in leak_data.get('leaks', []):
+            hours = leak['hours_to_exhaustion']
+            if leak['kind'] == 'memory':
+                title = f'Probable Memory Leak: {leak["name"]}'
+                level = f'RSS {leak["rss_mb"]} MB'
+                limit = 'available memory'
+            else:
+                title = f'Probable File Descriptor Leak: {leak["name"]}'
+                level = f'{leak["num_fds"]} open FDs'
+                limit = f'its FD limit ({leak["fd_limit"]})'
+            projection = f'; {limit} runs out in about {hours} h at this rate' if hours is not None else ''
+            issues.append({
+                'severity': 'high' if hours is not None and hours < self.config.LEAK_URGENT_HOURS else 'medium',
+                'category': 'memory' if leak['kind'] == 'memory' else 'process',
+                'title': title,
+                'description': (f'Process {leak["name"]} (PID: {leak["pid"]}) grew steadily by '
+                                f'{leak["growth_per_hour"]} {leak["unit"]}/h over {leak["window_minutes"]} min '
+                                f'({level}){projection}'),
+                'metrics': dict(leak),
+                'suggested_fixes': [
+                    {
+                        'fix_id': 'kill_process',
+                        'description': f'Restart or kill {leak["name"]} (PID: {leak["pid"]}) to reclaim the leak',
+                        'requires_params': True,
+                        'default_params': {'pid': leak['pid']}
+                    }
+                ]
+            })
+        
+        return issues
+    
+    def _check_process_groups(self, groups_data):
+        """Check for process trees, systemd units or cgroups consuming too much in aggregate"""
+        issues = []
+        
+        if 'error' in groups_data:
+            return issues
+        
+        reported_pids = set()
+        
+        # Units and cgroups name the real owner, so report them before raw trees
+        for by in ('unit', 'cgroup', 'tree'):
+            grouping = groups_data.get(by, {})
+            if not grouping.get('available', False):
+                continue
+            
+            for group in grouping.get('groups', []):
+                name = group.get('group')
+                top_pid = group.get('top_process', {}).get('pid')
+                if name in ('/', 'kernel') or top_pid in reported_pids:
+                    continue
+                if group.get('process_count', 0) < self.config.GROUP_MIN_PROCESSES:
+                    continue
+                
+                cpu_percent = group.get('cpu_percent') or 0
+                memory_percent = group.get('memory_percent') or 0
+                
+                if cpu_percent > self.config.GROUP_CPU_THRESHOLD:
+                    resource, value = 'CPU', cpu_percent
+                elif memory_percent > self.config.GROUP_MEMORY_THRESHOLD:
+                    resource, value = 'memory', memory_percent
+                else:
+                    continue
+                
+                reported_pids.add(top_pid)
+                issues.append({
+                    'severity': 'high' if value > 80 else 'medium',
+                    'category': 'process_group',
+                    'title': f'High {resource} Usage by {by}: {name}',
+                    'description': f'{group.get("process_count")} processes in {name} are using {value}% {resource} in total',
+                    'metrics': {
+                        'group_by': by,
+                        'group': name,
+                        'process_count': group.get('process_count'),
+                        'cpu_percent': cpu_percent,
+                        'memory_percent': memory_percent,
+                        'memory_mb': group.get('memory_mb'),
+                        'read_bps': group.get('read_bps'),
+                        'write_bps': group.get('write_bps'),
+                        'top_process': group.get('top_process')
+                    },
+                    'suggested_fixes': [
+                        {
+                            'fix_id': 'kill_process',
+                            'description': f'Kill the busiest process in {name} (PID: {top_pid})',
+                            'requires_params': True,
+                            'default_params': {'pid': top_pid}
+                        }
+                    ]
+                })
+        
+        return issues
+    
     def diagnose_symptom(self, symptom):
         """Diagnose based on user-described symptom"""
         symptom_lower = symptom.lower()
@@ -231,32 +782,36 @@ class IssueDiagnoser:
         if any(word in symptom_lower for word in ['slow', 'sluggish', 'lag', 'performance']):
             return {
                 'symptom': symptom,
-                'likely_causes': self._check_cpu(data['cpu']) + self._check_memory(data['memory']),
+                'likely_causes': (self._check_cpu(data['cpu'], data['pressure']) +
+                                  self._check_cpu_cores(data['cpu']) +
+                                  self._check_memory(data['memory'], data['pressure']) +
+                                  self._check_disk_io(data['disk_io'])),
                 'system_data': data
             }
         
         elif any(word in symptom_lower for word in ['memory', 'ram', 'out of memory']):
             return {
                 'symptom': symptom,
-                'likely_causes': self._check_memory(data['memory']),
+                'likely_causes': self._check_memory(data['memory'], data['pressure']),
                 'system_data': data
             }
         
         elif any(word in symptom_lower for word in ['disk', 'space', 'storage', 'full']):
             return {
                 'symptom': symptom,
-                'likely_causes': self._check_disk(data['disk']),
+                'likely_causes': self._check_disk(data['disk']) + self._check_disk_io(data['disk_io']),
                 'system_data': data
             }
         
         elif any(word in symptom_lower for word in ['network', 'internet', 'connection', 'wifi']):
-            return {
-                'symptom': symptom,
-                'likely_causes': [{
-                    'severity': 'medium',
+            likely_causes = self._check_network(data['network'])
+            
+            if not likely_causes:
+                likely_causes = [{
+                    'severity': 'low',
                     'category': 'network',
                     'title': 'Network Issues',
-                    'description': 'Network connectivity problems detected',
+                    'description': 'Interface counters and socket states look healthy; the problem may be DNS or upstream',
                     'suggested_fixes': [
                         {
                             'fix_id': 'flush_dns',
@@ -269,7 +824,11 @@ class IssueDiagnoser:
                             'requires_params': False
                         }
                     ]
-                }],
+                }]
+            
+            return {
+                'symptom': symptom,
+                'likely_causes': likely_causes,
                 'system_data': data
             }
         
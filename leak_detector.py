@@ -0,0 +1,148 @@
+"""
+Leak Detector Module
+Tracks RSS and open file descriptors per process at a slow cadence and fits a
+least-squares slope over a bounded window of samples per PID. Processes that
+grow steadily are reported as probable leaks, with their growth rate and the
+projected time until memory or their FD limit runs out
+"""
+import collections
+import threading
+import psutil
+from config import Config
+from data_sources import LiveSource
+from process_table import ProcessTable
+from metrics_sampler import get_sampler
+
+class LeakDetector:
+    def __init__(self, table=None, source=None, sampler=None):
+        self.source = source or LiveSource()
+        self.sampler = sampler
+        self.table = table or ProcessTable(source=self.source)
+        self._history = {}      # pid -> (create_time, name, deque of (t, rss_bytes, fds))
+        self._last_sample = None
+        self._lock = threading.Lock()
+
+    def maybe_sample(self):
+        """Sampler listener: take a sample at most every LEAK_SAMPLE_INTERVAL seconds"""
+        now = self.source.monotonic()
+        # Back off together with the sampler while the host is degraded
+        interval = Config.LEAK_SAMPLE_INTERVAL * getattr(self.sampler, 'slowdown', 1)
+        if self._last_sample is not None and now - self._last_sample < interval:
+            return
+        self.sample()
+
+    def sample(self):
+        """Record RSS and FD counts for every process and drop the histories of exited ones"""
+        now = self.source.monotonic()
+        self._last_sample = now
+        rows = self.table.refresh()
+        with self._lock:
+            for pid, row in rows.items():
+                self.table._add_fds(row)
+                rss = int(row['rss_mb'] * 1024 * 1024)
+                entry = self._history.get(pid)
+                if entry is None or entry[0] != row.get('create_time'):
+                    entry = (row.get('create_time'), row['name'],
+                             collections.deque(maxlen=Config.LEAK_HISTORY_SAMPLES))
+                    self._history[pid] = entry
+                entry[2].append((now, rss, row['num_fds']))
+
+            for pid in [pid for pid in self._history if pid not in rows]:
+                del self._history[pid]
+
+    def suspects(self):
+        """
+        Processes whose RSS or FD count has grown steadily over the window
+
+        Growth counts as sustained when the window has at least LEAK_MIN_SAMPLES
+        points, the fitted slope exceeds the per-hour threshold and the fit
+        explains at least LEAK_MIN_R2 of the variance.
+
+        Returns:
+            Dictionary with 'available', 'tracked' and 'leaks' (list of suspects)
+        """
+        with self._lock:
+            histories = [(pid, name, list(samples)) for pid, (_, name, samples) in self._history.items()]
+
+        leaks = []
+        available_bytes = None
+        for pid, name, samples in histories:
+            if len(samples) < Config.LEAK_MIN_SAMPLES:
+                continue
+            times = [t for t, _, _ in samples]
+            window_minutes = round((times[-1] - times[0]) / 60, 1)
+
+            slope, r2 = _fit(times, [rss for _, rss, _ in samples])
+            rss_mb_per_hour = slope * 3600 / (1024 * 1024)
+            if rss_mb_per_hour >= Config.LEAK_RSS_MB_PER_HOUR and r2 >= Config.LEAK_MIN_R2:
+                if available_bytes is None:
+                    available_bytes = self.source.virtual_memory().available
+                leaks.append({
+                    'pid': pid,
+                    'name': name,
+                    'kind': 'memory',
+                    'rss_mb': round(samples[-1][1] / (1024 * 1024), 1),
+                    'growth_per_hour': round(rss_mb_per_hour, 1),
+                    'unit': 'MB',
+                    'r2': round(r2, 3),
+                    'window_minutes': window_minutes,
+                    'hours_to_exhaustion': round(available_bytes / slope / 3600, 1)
+                })
+
+            fds = [fd for _, _, fd in samples]
+            if None in fds:
+                continue
+            slope, r2 = _fit(times, fds)
+            fds_per_hour = slope * 3600
+            if fds_per_hour >= Config.LEAK_FD_PER_HOUR and r2 >= Config.LEAK_MIN_R2:
+                limit = self._fd_limit(pid)
+                leaks.append({
+                    'pid': pid,
+                    'name': name,
+                    'kind': 'fd',
+                    'num_fds': fds[-1],
+                    'fd_limit': limit,
+                    'growth_per_hour': round(fds_per_hour, 1),
+                    'unit': 'FDs',
+                    'r2': round(r2, 3),
+                    'window_minutes': window_minutes,
+                    'hours_to_exhaustion': (round(max(limit - fds[-1], 0) / slope / 3600, 1)
+                                            if limit and limit > 0 else None)
+                })
+
+        leaks.sort(key=lambda leak: leak['hours_to_exhaustion'] if leak['hours_to_exhaustion'] is not None
+                   else float('inf'))
+        return {'available': True, 'tracked': len(histories), 'leaks': leaks}
+
+    def _fd_limit(self, pid):
+        """Soft RLIMIT_NOFILE of the process, where psutil can read it"""
+        try:
+            return self.source.Process(pid).rlimit(psutil.RLIMIT_NOFILE)[0]
+        except (AttributeError, psutil.Error, OSError):
+            return None
+
+def _fit(xs, ys):
+    """Least-squares slope of ys over xs and the coefficient of determination"""
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    syy = sum((y - mean_y) ** 2 for y in ys)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    if sxx == 0 or syy == 0:
+        return 0.0, 0.0
+    slope = sxy / sxx
+    return slope, (sxy * sxy) / (sxx * syy)
+
+_shared_detector = None
+_shared_lock = threading.Lock()
+
+def get_leak_detector():
+    """Return the process-wide detector, sampled from the shared sampler's thread"""
+    global _shared_detector
+    with _shared_lock:
+        if _shared_detector is None:
+            sampler = get_sampler()
+            _shared_detector = LeakDetector(sampler=sampler)
+            sampler.add_listener(_shared_detector.maybe_sample)
+        return _shared_detector
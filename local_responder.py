@@ -0,0 +1,363 @@
+"""
+Local Responder Module
+Answers common troubleshooting questions offline in milliseconds. Questions are
+matched with TF-IDF over an inverted index of a small knowledge base and the
+fix catalog, and answers are enriched with the issues from the latest cached
+diagnosis
+"""
+import math
+import re
+import threading
+import time
+from config import Config
+
+# Troubleshooting knowledge base: the text that is matched and the answer given.
+# 'categories' pick the live issues that are added to the answer.
+KNOWLEDGE_BASE = [
+    {
+        'id': 'slow_system',
+        'title': 'Why is my computer slow?',
+        'keywords': 'computer laptop pc machine system slow sluggish freeze unresponsive performance hang',
+        'categories': ('cpu', 'memory', 'disk_io'),
+        'answer': 'Slowness almost always comes from one of three places: CPU contention (tasks '
+                  'waiting for a CPU), memory pressure (swapping or reclaim) or slow disk I/O. '
+                  'Check the top processes by CPU and memory, and run a full diagnosis to see '
+                  'pressure stall times and disk latency.'
+    },
+    {
+        'id': 'high_cpu',
+        'title': 'High CPU usage',
+        'keywords': 'cpu processor usage high 100 percent busy load average fan',
+        'categories': ('cpu', 'process'),
+        'answer': 'Open Top Processes and sort by CPU to find what is busy. A single runaway '
+                  'process can be stopped with the kill_process fix. If many processes share the '
+                  'load, compare the load average per CPU: sustained values above 1-2 mean work '
+                  'is queuing for the CPU.'
+    },
+    {
+        'id': 'high_memory',
+        'title': 'High memory usage or out of memory',
+        'keywords': 'memory ram usage high full out oom killer leak swap swapping',
+        'categories': ('memory', 'process'),
+        'answer': 'High memory use alone is fine; Linux uses free RAM for cache. It becomes a '
+                  'problem when memory pressure (PSI) rises or the system swaps. Sort Top '
+                  'Processes by memory and check whether one process keeps growing, which '
+                  'suggests a leak. Restarting or killing it frees the memory.'
+    },
+    {
+        'id': 'swap',
+        'title': 'Heavy swapping',
+        'keywords': 'swap swapping paging thrash thrashing',
+        'categories': ('memory',),
+        'answer': 'Swapping means RAM is overcommitted. Find the largest processes by memory and '
+                  'stop what is not needed. Clearing the page cache does not help with swapping; '
+                  'freeing anonymous memory does.'
+    },
+    {
+        'id': 'disk_full',
+        'title': 'Disk full or low disk space',
+        'keywords': 'disk full space storage low partition usage free no left',
+        'categories': ('disk',),
+        'answer': 'Check which partition is full in the disk section of the diagnosis. Old '
+                  'temporary files can be removed with the clear_temp fix; large logs, caches and '
+                  'downloads are the usual culprits.'
+    },
+    {
+        'id': 'disk_slow',
+        'title': 'Slow disk, slow drive or high disk I/O wait',
+        'keywords': 'disk drive slow io latency await iowait utilization saturated read write',
+        'categories': ('disk_io',),
+        'answer': 'Look at per-device utilization and average wait in the disk I/O section. A '
+                  'device busy close to 100% of the time or with waits above 50 ms is saturated; '
+                  'find the processes with the highest I/O rate in the process drill-down.'
+    },
+    {
+        'id': 'network_down',
+        'title': 'No internet or network connection',
+        'keywords': 'network internet connection offline wifi ethernet down disconnected unreachable not working',
+        'categories': ('network',),
+        'answer': 'First check whether the interface is up and has an address. If it does, try '
+                  'flushing the DNS cache (flush_dns); if the interface itself is stuck, restart '
+                  'the network manager (restart_network).'
+    },
+    {
+        'id': 'dns',
+        'title': 'DNS problems',
+        'keywords': 'dns resolve resolution name lookup domain website host not found',
+        'categories': ('network',),
+        'answer': 'Name resolution failures with a working connection are usually a stale or '
+                  'broken resolver cache. The flush_dns fix clears it.'
+    },
+    {
+        'id': 'network_slow',
+        'title': 'Slow network or low network speed',
+        'keywords': 'network slow bandwidth throughput saturated packet loss drops errors latency',
+        'categories': ('network',),
+        'answer': 'The network section shows per-interface throughput against link speed, error '
+                  'and drop rates. A saturated link or rising error counts points to the '
+                  'interface or cable; many CLOSE_WAIT or SYN_SENT sockets point to an '
+                  'application or upstream service.'
+    },
+    {
+        'id': 'temperature',
+        'title': 'High temperature or overheating',
+        'keywords': 'temperature hot overheating heat thermal throttling fan',
+        'categories': ('temperature',),
+        'answer': 'Sustained temperatures above 80°C usually come from a CPU-heavy process or '
+                  'poor airflow. Reduce the load by stopping CPU-intensive processes and check '
+                  'that fans and vents are clear.'
+    },
+    {
+        'id': 'kill_process',
+        'title': 'How do I stop or kill a process?',
+        'keywords': 'kill stop end terminate process pid task hung frozen application hogging runaway',
+        'categories': ('process',),
+        'answer': 'Use the kill_process fix with the PID from Top Processes. SPTool checks that the '
+                  'PID exists and asks for confirmation first, and refuses init, kernel threads, '
+                  'core OS services and SPTool itself.'
+    },
+    {
+        'id': 'zombie',
+        'title': 'Zombie or defunct processes',
+        'keywords': 'zombie defunct process orphan',
+        'categories': ('process',),
+        'answer': 'Zombies use no CPU or memory; they are exit records waiting for their parent. '
+                  'Killing the zombie does nothing; restarting or killing its parent clears them.'
+    },
+    {
+        'id': 'cache',
+        'title': 'Clearing caches',
+        'keywords': 'cache clear drop buffers page cached memory free',
+        'categories': ('memory',),
+        'answer': 'The clear_cache fix drops the page cache. It frees "cached" memory, which the '
+                  'kernel would reclaim on demand anyway, and slows the next disk reads, so it '
+                  'rarely helps. SPTool only suggests it when reclaimable dentry/inode slab has grown '
+                  'large, or when allocations stall in reclaim while the cache is cold.'
+    },
+    {
+        'id': 'service_group',
+        'title': 'A service or container using too much',
+        'keywords': 'service unit systemd container cgroup docker group tree children workers',
+        'categories': ('process_group',),
+        'answer': 'Process groups add up usage per process tree, systemd unit and cgroup, which '
+                  'shows a service with many small workers that no single process reveals. See '
+                  'the process groups section of the diagnosis.'
+    },
+    {
+        'id': 'what_can_you_do',
+        'title': 'What can SPTool do?',
+        'keywords': 'help what can you do features capabilities commands how use sptool',
+        'categories': (),
+        'answer': 'SPTool diagnoses CPU, memory, disk, network and temperature problems, shows '
+                  'the top processes and process groups, and can run whitelisted fixes such as '
+                  'clearing temporary files, flushing DNS or killing a process, always after '
+                  'your confirmation.'
+    },
+]
+
+STOPWORDS = frozenset('''
+a an and are as at be but by can do does for from has have how i if in is it its me my
+of on or so that the this to too up was what when where which who why will with you your
+'''.split())
+
+# Everyday words mapped to the terms the knowledge base uses
+SYNONYMS = {
+    'ram': 'memory', 'mem': 'memory', 'storage': 'disk', 'space': 'disk', 'hdd': 'disk',
+    'ssd': 'disk', 'drive': 'disk', 'internet': 'network', 'wifi': 'network', 'wlan': 'network',
+    'hot': 'temperature', 'overheat': 'temperature', 'laggy': 'slow', 'lag': 'slow',
+    'sluggish': 'slow', 'processor': 'cpu', 'app': 'process', 'program': 'process',
+}
+
+def tokenize(text):
+    """Lowercase words without stopwords, mapped through SYNONYMS and lightly stemmed"""
+    tokens = []
+    for word in re.findall(r'[a-z0-9]+', text.lower()):
+        if word in STOPWORDS:
+            continue
+        word = SYNONYMS.get(word, word)
+        for suffix in ('ing', 'es', 's'):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        tokens.append(SYNONYMS.get(word, word))
+    return tokens
+
+class LocalResponder:
+    def __init__(self, diagnoser=None, executor=None):
+        self._diagnoser = diagnoser
+        self._executor = executor
+        self.fixes = {}
+        self._documents = []
+        self._index = {}        # term -> [(document index, tf-idf weight)]
+        self._idf = {}
+        self._diagnosis = None  # (monotonic time, diagnose_all() result)
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._build_index()
+
+    @property
+    def diagnoser(self):
+        if self._diagnoser is None:
+            from issue_diagnosis import IssueDiagnoser
+            self._diagnoser = IssueDiagnoser()
+        return self._diagnoser
+
+    def answer(self, message):
+        """
+        Answer a question from the knowledge base and fix catalog
+
+        Returns:
+            Dictionary with 'response', 'confidence' (cosine similarity of the
+            best match), 'confident' and the matched document id
+        """
+        matches = self.search(message, limit=2)
+        if not matches:
+            return {
+                'success': True,
+                'source': 'local',
+                'response': self._fallback_text(),
+                'confidence': 0.0,
+                'confident': False,
+                'matched': None
+            }
+
+        document, score = matches[0]
+        response = document['answer']
+        live = self._live_issues(document.get('categories', ()))
+        if live:
+            response += '\n\n**Right now:**\n' + '\n'.join(
+                f"- [{issue['severity']}] {issue['title']}: {issue['description']}" for issue in live)
+        related = [self.fixes[fix_id] for fix_id in document.get('fix_ids', ()) if fix_id in self.fixes]
+        if related:
+            response += '\n\n**Available fixes:**\n' + '\n'.join(
+                f"- `{fix['id']}`: {fix['description']} (risk: {fix['risk']})" for fix in related)
+
+        return {
+            'success': True,
+            'source': 'local',
+            'response': response,
+            'confidence': round(score, 3),
+            'confident': score >= Config.LOCAL_CHAT_MIN_SCORE,
+            'matched': document['id']
+        }
+
+    def quick_analysis(self):
+        """Summarize the current diagnosis without the LLM"""
+        diagnosis = self._current_diagnosis(wait=True)
+        issues = diagnosis['issues'] if diagnosis else []
+        if not issues:
+            text = 'No issues detected: CPU, memory, disk, network and processes are within thresholds.'
+        else:
+            ordered = sorted(issues, key=lambda i: {'high': 0, 'medium': 1}.get(i['severity'], 2))
+            text = f"{len(issues)} issue(s) found:\n" + '\n'.join(
+                f"- [{issue['severity']}] {issue['title']}: {issue['description']}" for issue in ordered[:5])
+        return {'success': True, 'source': 'local', 'response': text, 'confident': True}
+
+    def search(self, text, limit=3):
+        """Return up to `limit` (document, cosine score) pairs, best first"""
+        counts = {}
+        for term in tokenize(text):
+            if term in self._idf:
+                counts[term] = counts.get(term, 0) + 1
+        if not counts:
+            return []
+
+        query = {term: (1 + math.log(count)) * self._idf[term] for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in query.values()))
+        scores = {}
+        for term, weight in query.items():
+            for doc, doc_weight in self._index[term]:
+                scores[doc] = scores.get(doc, 0) + weight * doc_weight
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self._documents[doc], score / norm) for doc, score in ranked]
+
+    def _build_index(self):
+        """Build normalized TF-IDF vectors and the inverted index once, at startup"""
+        documents = [dict(entry) for entry in KNOWLEDGE_BASE]
+
+        executor = self._executor
+        if executor is None:
+            from command_executor import CommandExecutor
+            executor = CommandExecutor()
+        for fix in executor.get_available_fixes():
+            self.fixes[fix['id']] = fix
+            documents.append({
+                'id': f"fix:{fix['id']}",
+                'title': fix['description'],
+                'keywords': fix['id'].replace('_', ' '),
+                'categories': (),
+                'fix_ids': (fix['id'],),
+                'answer': f"SPTool can run the `{fix['id']}` fix: {fix['description']}. Preview it "
+                          f"from the fixes panel first; it always asks for confirmation."
+            })
+        # Link knowledge base answers to the fixes they mention
+        for document in documents[:len(KNOWLEDGE_BASE)]:
+            document['fix_ids'] = tuple(fix_id for fix_id in self.fixes if fix_id in document['answer'])
+
+        term_counts = []
+        df = {}
+        for document in documents:
+            # Titles and keywords say what a document is about, so they count more than the
+            # answer; fix entries are short and get less weight so they don't crowd out answers
+            repeat = 2 if document['id'].startswith('fix:') else 3
+            text = ' '.join([document['title'], document['keywords']] * repeat + [document['answer']])
+            counts = {}
+            for term in tokenize(text):
+                counts[term] = counts.get(term, 0) + 1
+            term_counts.append(counts)
+            for term in counts:
+                df[term] = df.get(term, 0) + 1
+
+        total = len(documents)
+        self._idf = {term: math.log((1 + total) / (1 + freq)) + 1 for term, freq in df.items()}
+        for doc, counts in enumerate(term_counts):
+            weights = {term: (1 + math.log(count)) * self._idf[term] for term, count in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+            for term, weight in weights.items():
+                self._index.setdefault(term, []).append((doc, weight / norm))
+        self._documents = documents
+
+    def _live_issues(self, categories):
+        if not categories:
+            return []
+        diagnosis = self._current_diagnosis(wait=False)
+        if not diagnosis:
+            return []
+        return [issue for issue in diagnosis['issues'] if issue.get('category') in categories][:3]
+
+    def _current_diagnosis(self, wait):
+        """
+        Latest diagnose_all() result. A stale or missing result is refreshed in the
+        background so answers never wait for it, unless `wait` is set.
+        """
+        with self._lock:
+            cached = self._diagnosis
+            fresh = cached and time.monotonic() - cached[0] < Config.LOCAL_CHAT_DIAGNOSIS_TTL
+            start = not fresh and not self._refreshing
+            if start:
+                self._refreshing = True
+        if fresh:
+            return cached[1]
+        if wait:
+            if start:
+                self._refresh()
+            else:
+                while self._refreshing:
+                    time.sleep(0.05)
+            return self._diagnosis[1] if self._diagnosis else None
+        if start:
+            threading.Thread(target=self._refresh, name='sptool-local-diagnosis', daemon=True).start()
+        return cached[1] if cached else None
+
+    def _refresh(self):
+        try:
+            self._diagnosis = (time.monotonic(), self.diagnoser.diagnose_all())
+        except Exception:
+            pass
+        finally:
+            self._refreshing = False
+
+    def _fallback_text(self):
+        topics = ', '.join(entry['title'].rstrip('?').lower() for entry in KNOWLEDGE_BASE[:8])
+        return ("I couldn't match that to a known problem. I can answer questions about: "
+                f"{topics}. Running a full diagnosis will show anything wrong right now.")
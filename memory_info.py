@@ -0,0 +1,146 @@
+"""
+Memory Info Module
+Reads the Linux memory breakdown from /proc/meminfo, paging and reclaim
+counters from /proc/vmstat and the largest slab caches from /proc/slabinfo.
+Each file is opened once and re-read with one buffered pread, like the PSI
+files in pressure.py
+"""
+import os
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Rate name -> /proc/vmstat counters summed into it (kernels differ in which exist)
+VMSTAT_RATES = {
+    'page_faults': ('pgfault',),
+    'major_faults': ('pgmajfault',),
+    'swap_in': ('pswpin',),
+    'swap_out': ('pswpout',),
+    'scan_kswapd': ('pgscan_kswapd',),
+    'scan_direct': ('pgscan_direct',),
+    'allocation_stalls': ('allocstall', 'allocstall_dma', 'allocstall_dma32', 'allocstall_normal',
+                          'allocstall_movable', 'allocstall_device'),
+    'file_refaults': ('workingset_refault', 'workingset_refault_file'),
+}
+
+class MemoryInfoReader:
+    def __init__(self):
+        self._fds = {
+            'meminfo': self._open('/proc/meminfo'),
+            'vmstat': self._open('/proc/vmstat'),
+            # Root only on most distributions; /proc/meminfo still has the slab totals
+            'slabinfo': self._open('/proc/slabinfo'),
+        }
+        self.available = self._fds['meminfo'] is not None
+
+    def read(self, slab_top=5):
+        """
+        Read the memory breakdown and the largest slab caches
+
+        Returns:
+            Dictionary with 'available', 'breakdown' (bytes per kind of memory,
+            including 'droppable': what drop_caches could free) and 'slab_top'
+        """
+        content = self._pread('meminfo')
+        if content is None:
+            return {'available': False}
+        meminfo = {}
+        for line in content.splitlines():
+            key, _, rest = line.partition(':')
+            fields = rest.split()
+            if fields:
+                # Values are in kB except the HugePages_* counts
+                meminfo[key] = int(fields[0]) * 1024 if len(fields) > 1 else int(fields[0])
+
+        get = meminfo.get
+        file_pages = get('Active(file)', 0) + get('Inactive(file)', 0)
+        return {
+            'available': True,
+            'breakdown': {
+                'total': get('MemTotal', 0),
+                'free': get('MemFree', 0),
+                'available': get('MemAvailable', 0),
+                'anon': get('AnonPages', 0),
+                'page_cache': file_pages,
+                'shmem': get('Shmem', 0),
+                'dirty': get('Dirty', 0) + get('Writeback', 0),
+                'slab_reclaimable': get('SReclaimable', 0),
+                'slab_unreclaimable': get('SUnreclaim', 0),
+                'kernel': get('KernelStack', 0) + get('PageTables', 0) + get('SUnreclaim', 0),
+                'hugepages': get('HugePages_Total', 0) * get('Hugepagesize', 0),
+                # Clean file pages and reclaimable slab are all that drop_caches frees
+                'droppable': max(file_pages - get('Dirty', 0) - get('Writeback', 0), 0) + get('SReclaimable', 0)
+            },
+            'slab_top': self._slab_top(slab_top)
+        }
+
+    def read_vmstat(self):
+        """Raw /proc/vmstat counters"""
+        content = self._pread('vmstat')
+        if content is None:
+            return {}
+        counters = {}
+        for line in content.splitlines():
+            key, _, value = line.partition(' ')
+            if value:
+                counters[key] = int(value)
+        return counters
+
+    def _slab_top(self, limit):
+        """Largest slab caches by memory, or None when /proc/slabinfo is unreadable"""
+        content = self._pread('slabinfo')
+        if content is None:
+            return None
+        caches = []
+        for line in content.splitlines()[2:]:
+            # name active_objs num_objs objsize objperslab pagesperslab : tunables ... : slabdata active num shared
+            fields = line.split()
+            try:
+                size = int(fields[-2]) * int(fields[5]) * PAGE_SIZE
+            except (IndexError, ValueError):
+                continue
+            caches.append({'name': fields[0], 'bytes': size, 'objects': int(fields[2])})
+        caches.sort(key=lambda cache: cache['bytes'], reverse=True)
+        return caches[:limit]
+
+    def close(self):
+        """Close the held /proc file descriptors"""
+        for fd in self._fds.values():
+            if fd is not None:
+                os.close(fd)
+        self._fds = {}
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _pread(self, name):
+        fd = self._fds.get(name)
+        if fd is None:
+            return None
+        try:
+            chunks = []
+            offset = 0
+            while True:
+                chunk = os.pread(fd, 65536, offset)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                offset += len(chunk)
+            return b''.join(chunks).decode()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _open(path):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except (OSError, AttributeError):
+            return None
+        try:
+            os.pread(fd, 1, 0)  # only root may read slabinfo, whatever open() allows
+            return fd
+        except OSError:
+            os.close(fd)
+            return None
@@ -0,0 +1,346 @@
+"""
+Metrics History Module
+Keeps a bounded in-memory history of system snapshots in columnar form: one
+list per metric aligned with the snapshot timestamps, one set of parallel
+arrays (pid, start time, CPU seconds, RSS, name) per snapshot for processes,
+and the mount and interface tables, shared between snapshots while they do
+not change. diff() compares two snapshots by reading only the columns and
+arrays of those snapshots. Series and process names last seen before the
+oldest kept snapshot are dropped, so interface and mount churn does not grow
+the history beyond its time window
+"""
+import bisect
+import math
+import threading
+from array import array
+from datetime import datetime
+import psutil
+from config import Config
+from data_sources import LiveSource
+from metrics_sampler import get_sampler
+
+class MetricsHistory:
+    def __init__(self, source=None, sampler=None):
+        self.source = source or LiveSource()
+        self.sampler = sampler
+        self.cpu_count = self.source.cpu_count() or 1
+        self._ts = []           # wall-clock time per snapshot
+        self._columns = {}      # metric name -> values aligned with _ts (nan when missing)
+        self._column_seen = {}  # metric name -> id of the last snapshot with a value
+        self._procs = []        # per snapshot: (pids, start times, cpu seconds, rss, name ids) arrays
+        self._mounts = []       # per snapshot: tuple of (mountpoint, device, fstype)
+        self._interfaces = []   # per snapshot: tuple of (name, is_up, speed, addresses)
+        self._names = []        # interned process names (None once free for reuse)
+        self._name_ids = {}
+        self._name_seen = []    # name id -> id of the last snapshot using it
+        self._free_name_ids = []
+        self.dropped_series = 0 # new series refused at HISTORY_MAX_SERIES
+        self._first_id = 0      # id of the oldest snapshot kept
+        self._last_record = None
+        self._lock = threading.Lock()
+
+    def maybe_record(self):
+        """Sampler listener: record a snapshot at most every HISTORY_INTERVAL seconds"""
+        now = self.source.monotonic()
+        interval = Config.HISTORY_INTERVAL * getattr(self.sampler, 'slowdown', 1)
+        if self._last_record is not None and now - self._last_record < interval:
+            return
+        self.record()
+
+    def record(self):
+        """Take a snapshot and drop the oldest beyond HISTORY_SNAPSHOTS; returns its id"""
+        self._last_record = self.source.monotonic()
+        metrics = self._collect_metrics()
+        procs = self._collect_processes()
+        mounts = tuple(sorted((p.mountpoint, p.device, p.fstype) for p in self.source.disk_partitions()))
+        interfaces = self._collect_interfaces()
+        metrics['process_count'] = len(procs[0])
+        metrics = {name: float(value) for name, value in metrics.items() if value is not None}
+
+        with self._lock:
+            count = len(self._ts)
+            snapshot_id = self._first_id + count
+            self._ts.append(self.source.time())
+            for name, value in metrics.items():
+                column = self._columns.get(name)
+                if column is None:
+                    if len(self._columns) >= Config.HISTORY_MAX_SERIES:
+                        self.dropped_series += 1
+                        continue
+                    column = self._columns[name] = [math.nan] * count
+                column.append(value)
+                self._column_seen[name] = snapshot_id
+            for name, column in self._columns.items():
+                if len(column) == count:
+                    column.append(math.nan)
+            self._procs.append(procs)
+            # Unchanged tables share one tuple, so a quiet host costs one reference per snapshot
+            self._mounts.append(self._mounts[-1] if self._mounts and self._mounts[-1] == mounts else mounts)
+            self._interfaces.append(self._interfaces[-1] if self._interfaces and self._interfaces[-1] == interfaces
+                                    else interfaces)
+
+            excess = len(self._ts) - Config.HISTORY_SNAPSHOTS
+            if excess > 0:
+                for series in (self._ts, self._procs, self._mounts, self._interfaces, *self._columns.values()):
+                    del series[:excess]
+                self._first_id += excess
+                self._prune()
+            return snapshot_id
+
+    def _prune(self):
+        """Drop series and free process names no kept snapshot has a value for; call with the lock held"""
+        for name in [name for name, seen in self._column_seen.items() if seen < self._first_id]:
+            del self._columns[name]
+            del self._column_seen[name]
+        for name_id, seen in enumerate(self._name_seen):
+            if seen < self._first_id and self._names[name_id] is not None:
+                del self._name_ids[self._names[name_id]]
+                self._names[name_id] = None
+                self._free_name_ids.append(name_id)
+
+    def _collect_metrics(self):
+        """Flat name -> value from the sampler's cache, PSI and filesystem usage"""
+        metrics = {}
+        get = self.sampler.get if self.sampler is not None else (lambda section: None)
+        cpu = get('cpu')
+        if cpu:
+            metrics['cpu_usage_percent'] = cpu['usage']
+        memory = get('memory')
+        if memory:
+            metrics['memory_percent'] = memory['percent']
+            metrics['memory_total_bytes'] = memory['total']
+            metrics['memory_available_bytes'] = memory['available']
+            metrics['swap_percent'] = memory['swap_percent']
+        vmstat = get('vmstat')
+        if vmstat:
+            for name, value in vmstat['rates'].items():
+                metrics[f'vmstat_{name}_per_second'] = value
+        network = get('network')
+        if network:
+            for name, rates in network['interfaces'].items():
+                metrics[f'net_{name}_bytes_recv_per_second'] = rates['bytes_recv']
+                metrics[f'net_{name}_bytes_sent_per_second'] = rates['bytes_sent']
+                metrics[f'net_{name}_errors_per_second'] = rates['errin'] + rates['errout']
+                metrics[f'net_{name}_drops_per_second'] = rates['dropin'] + rates['dropout']
+        disk_io = get('disk_io')
+        if disk_io:
+            for name, stats in disk_io['devices'].items():
+                for field in ('read_bps', 'write_bps', 'await_ms', 'utilization_percent'):
+                    if stats[field] is not None:
+                        metrics[f'disk_{name}_{field}'] = stats[field]
+        try:
+            for resource, kinds in self.source.pressure().get('psi', {}).items():
+                for kind, values in kinds.items():
+                    metrics[f'psi_{resource}_{kind}_avg10_percent'] = values.get('avg10')
+        except Exception:
+            pass
+        for partition in self.source.disk_partitions():
+            try:
+                metrics[f'mount_{partition.mountpoint}_used_percent'] = self.source.disk_usage(partition.mountpoint).percent
+            except (OSError, psutil.Error):
+                continue
+        return metrics
+
+    def _collect_processes(self):
+        """Parallel arrays sorted by PID: pid, start time, CPU seconds, RSS bytes, name id"""
+        rows = []
+        snapshot_id = self._first_id + len(self._ts)
+        for proc in self.source.process_iter(['pid', 'name', 'create_time', 'cpu_times', 'memory_info']):
+            info = proc.info
+            times, memory = info.get('cpu_times'), info.get('memory_info')
+            if times is None or memory is None:
+                continue
+            name = info.get('name') or ''
+            name_id = self._name_ids.get(name)
+            if name_id is None:
+                if self._free_name_ids:
+                    name_id = self._free_name_ids.pop()
+                    self._names[name_id] = name
+                else:
+                    name_id = len(self._names)
+                    self._names.append(name)
+                    self._name_seen.append(snapshot_id)
+                self._name_ids[name] = name_id
+            self._name_seen[name_id] = snapshot_id
+            rows.append((info['pid'], info.get('create_time') or 0.0, times.user + times.system, memory.rss, name_id))
+        rows.sort()
+        return (array('q', (r[0] for r in rows)), array('d', (r[1] for r in rows)),
+                array('d', (r[2] for r in rows)), array('q', (r[3] for r in rows)), array('I', (r[4] for r in rows)))
+
+    def _collect_interfaces(self):
+        stats = self.source.net_if_stats()
+        try:
+            addrs = self.source.net_if_addrs()
+        except (OSError, psutil.Error):
+            addrs = {}
+        return tuple(sorted(
+            (name, stat.isup, stat.speed, tuple(sorted(a.address for a in addrs.get(name, ()) if a.address)))
+            for name, stat in stats.items()
+        ))
+
+    def snapshots(self):
+        """Ids and times of the snapshots kept, oldest first"""
+        with self._lock:
+            return [{'id': self._first_id + i, 'timestamp': datetime.fromtimestamp(ts).isoformat()}
+                    for i, ts in enumerate(self._ts)]
+
+    def _index_of(self, snapshot_id):
+        """Index of a snapshot id, or None when it is not kept"""
+        index = snapshot_id - self._first_id
+        return index if 0 <= index < len(self._ts) else None
+
+    def _index_at(self, timestamp):
+        """Index of the last snapshot taken at or before epoch seconds `timestamp`, or None"""
+        index = bisect.bisect_right(self._ts, timestamp) - 1
+        return index if index >= 0 else None
+
+    def diff(self, from_id=None, to_id=None, from_time=None, to_time=None):
+        """
+        Structured diff between two snapshots
+
+        Args:
+            from_id, from_time: The earlier snapshot, by id or by epoch seconds
+                                (the last snapshot at or before that time)
+            to_id, to_time: The later snapshot, likewise; the latest when neither is given
+
+        Returns:
+            Dictionary with new and vanished processes, the largest CPU and
+            memory share changes, mount and interface changes, and metrics that
+            moved by more than the HISTORY_DIFF_* thresholds; {'error'} if either
+            snapshot is not in the history
+        """
+        with self._lock:
+            a = self._index_of(from_id) if from_id is not None else self._index_at(from_time)
+            if to_id is not None:
+                b = self._index_of(to_id)
+            else:
+                b = self._index_at(to_time) if to_time is not None else len(self._ts) - 1
+            if a is None or b is None or b < 0:
+                return {'error': 'Snapshot not in history', 'oldest': self._snapshot_ref(0) if self._ts else None}
+            return {
+                'from': self._snapshot_ref(a),
+                'to': self._snapshot_ref(b),
+                'elapsed_seconds': round(self._ts[b] - self._ts[a], 1),
+                'processes': self._diff_processes(a, b),
+                'mounts': self._diff_tables(self._mounts[a], self._mounts[b]),
+                'interfaces': self._diff_tables(self._interfaces[a], self._interfaces[b]),
+                'metrics': self._diff_metrics(a, b)
+            }
+
+    def _snapshot_ref(self, index):
+        return {'id': self._first_id + index, 'timestamp': datetime.fromtimestamp(self._ts[index]).isoformat()}
+
+    def _diff_processes(self, a, b):
+        pids_a, starts_a, _, rss_a, names_a = self._procs[a]
+        pids_b, starts_b, _, rss_b, names_b = self._procs[b]
+        # A PID reused by a new process is a different process
+        index_a = {(pid, start): i for i, (pid, start) in enumerate(zip(pids_a, starts_a))}
+        index_b = {(pid, start): i for i, (pid, start) in enumerate(zip(pids_b, starts_b))}
+        cpu_a, cpu_b = self._cpu_percents(a), self._cpu_percents(b)
+        memory_total = self._value('memory_total_bytes', b)
+
+        def describe(snapshot, i, names, rss, cpu):
+            return {'pid': self._procs[snapshot][0][i], 'name': self._names[names[i]],
+                    'rss_mb': round(rss[i] / (1024 ** 2), 1), 'cpu_percent': cpu.get(i)}
+
+        new = [describe(b, i, names_b, rss_b, cpu_b) for key, i in index_b.items() if key not in index_a]
+        vanished = [describe(a, i, names_a, rss_a, cpu_a) for key, i in index_a.items() if key not in index_b]
+        limit = Config.HISTORY_DIFF_TOP
+        new.sort(key=lambda p: (p['cpu_percent'] or 0, p['rss_mb']), reverse=True)
+        vanished.sort(key=lambda p: (p['cpu_percent'] or 0, p['rss_mb']), reverse=True)
+
+        changes = []
+        for key, j in index_b.items():
+            i = index_a.get(key)
+            if i is None:
+                continue
+            cpu_change = (cpu_b.get(j) or 0) - (cpu_a.get(i) or 0)
+            rss_change = rss_b[j] - rss_a[i]
+            changes.append({
+                'pid': key[0], 'name': self._names[names_b[j]],
+                'cpu_percent_before': cpu_a.get(i), 'cpu_percent_after': cpu_b.get(j),
+                'cpu_change': round(cpu_change, 1),
+                'rss_mb_before': round(rss_a[i] / (1024 ** 2), 1), 'rss_mb_after': round(rss_b[j] / (1024 ** 2), 1),
+                'memory_share_change': round(rss_change / memory_total * 100, 2) if memory_total else None,
+                '_score': abs(cpu_change) / 100 + abs(rss_change) / (memory_total or 1024 ** 3)
+            })
+        changes.sort(key=lambda c: c['_score'], reverse=True)
+        for change in changes:
+            del change['_score']
+
+        return {
+            'new_count': len(new),
+            'vanished_count': len(vanished),
+            'new': new[:limit],
+            'vanished': vanished[:limit],
+            'share_changes': changes[:limit]
+        }
+
+    def _cpu_percents(self, index):
+        """Each process's CPU share since the previous snapshot, by position in the snapshot's arrays"""
+        if index == 0:
+            return {}
+        pids, starts, cpu, _, _ = self._procs[index]
+        prev_pids, prev_starts, prev_cpu, _, _ = self._procs[index - 1]
+        previous = {(pid, start): seconds for pid, start, seconds in zip(prev_pids, prev_starts, prev_cpu)}
+        elapsed = self._ts[index] - self._ts[index - 1]
+        if elapsed < 1:
+            return {}   # CPU times advance in clock ticks, too coarse for shorter intervals
+        percents = {}
+        for i, key in enumerate(zip(pids, starts)):
+            before = previous.get(key)
+            if before is not None:
+                percents[i] = round(max(cpu[i] - before, 0) / elapsed / self.cpu_count * 100, 1)
+        return percents
+
+    @staticmethod
+    def _diff_tables(rows_a, rows_b):
+        """Added, removed and changed rows, keyed by their first field"""
+        if rows_a is rows_b:
+            return {'added': [], 'removed': [], 'changed': []}
+        keyed_a = {row[0]: row for row in rows_a}
+        keyed_b = {row[0]: row for row in rows_b}
+        return {
+            'added': [list(keyed_b[key]) for key in keyed_b if key not in keyed_a],
+            'removed': [list(keyed_a[key]) for key in keyed_a if key not in keyed_b],
+            'changed': [{'before': list(keyed_a[key]), 'after': list(keyed_b[key])}
+                        for key in keyed_b if key in keyed_a and keyed_a[key] != keyed_b[key]]
+        }
+
+    def _diff_metrics(self, a, b):
+        """Metrics that moved by HISTORY_DIFF_MIN_POINTS (percentages) or HISTORY_DIFF_MIN_RATIO (the rest)"""
+        moved = []
+        for name, column in self._columns.items():
+            old, new = column[a], column[b]
+            if math.isnan(old) or math.isnan(new) or old == new:
+                continue
+            change = new - old
+            if name.endswith('_percent'):
+                significant = abs(change) >= Config.HISTORY_DIFF_MIN_POINTS
+            else:
+                base = max(abs(old), abs(new))
+                significant = base >= 1 and abs(change) / base >= Config.HISTORY_DIFF_MIN_RATIO
+            if significant:
+                moved.append({'name': name, 'before': old, 'after': new, 'change': round(change, 2),
+                              'change_ratio': round(change / abs(old), 2) if old else None})
+        moved.sort(key=lambda m: abs(m['change_ratio']) if m['change_ratio'] is not None else math.inf, reverse=True)
+        return moved
+
+    def _value(self, name, index):
+        column = self._columns.get(name)
+        if column is None or math.isnan(column[index]):
+            return None
+        return column[index]
+
+_shared_history = None
+_shared_lock = threading.Lock()
+
+def get_metrics_history():
+    """Return the process-wide history, recorded from the shared sampler's thread"""
+    global _shared_history
+    with _shared_lock:
+        if _shared_history is None:
+            sampler = get_sampler()
+            _shared_history = MetricsHistory(sampler=sampler)
+            sampler.add_listener(_shared_history.maybe_record)
+        return _shared_history
@@ -0,0 +1,432 @@
+"""
+Metrics Sampler Module
+Background thread that samples cumulative system counters at a fixed interval
+and turns consecutive samples into per-second rates
+"""
+import logging
+import statistics
+import threading
+import psutil
+from config import Config
+from data_sources import LiveSource
+from memory_info import VMSTAT_RATES
+from instrumentation import REGISTRY, CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+class MetricsSampler:
+    def __init__(self, interval=None, source=None):
+        self.interval = interval or Config.SAMPLER_INTERVAL
+        self.source = source or LiveSource()
+        self._latest = {}   # section -> computed rates from the last two samples
+        self._prev = {}     # section -> (monotonic time, raw counters)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.slowdown = 1   # interval multiplier, raised by the degraded-mode governor
+        self._listeners = []
+        self._core_streaks = []     # consecutive samples each core has been saturated
+        # (section, function returning raw counters, function turning two samples into rates)
+        self.sections = [
+            ('cpu', self._sample_cpu, self._compute_cpu),
+            ('cpu_freq', self._sample_cpu_freq, self._compute_cpu_freq),
+            ('core_load', self._sample_core_load, self._compute_core_load),
+            ('memory', self._sample_memory, self._compute_memory),
+            ('vmstat', self._sample_vmstat, self._compute_vmstat),
+            ('network', self._sample_network, self._compute_network),
+            ('disk_io', self._sample_disk_io, self._compute_disk_io),
+        ]
+
+    def start(self):
+        """Take a baseline sample and start the background thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self.sample_once()
+        self._thread = threading.Thread(target=self._run, name='sptool-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * self.slowdown + 1)
+            self._thread = None
+
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def get(self, section):
+        """Latest computed rates for a section, or None before the second sample"""
+        with self._lock:
+            value = self._latest.get(section)
+        CACHE_REQUESTS.inc(cache='sampler', result='hit' if value is not None else 'miss')
+        return value
+
+    def sample_once(self):
+        """Sample every section once and update the computed rates"""
+        for name, sample, compute in self.sections:
+            try:
+                now = self._monotonic()
+                raw = sample()
+            except Exception:
+                continue
+
+            prev = self._prev.get(name)
+            self._prev[name] = (now, raw)
+            if prev is None or now <= prev[0]:
+                continue
+
+            try:
+                computed = compute(prev[1], raw, now - prev[0])
+            except Exception as e:
+                # E.g. a core or interface appeared between samples: this sample is the
+                # next baseline, and the section has no rates until then
+                logger.warning('Sampler section %s failed: %r', name, e)
+                computed = None
+
+            with self._lock:
+                if computed is None:
+                    self._latest.pop(name, None)
+                else:
+                    self._latest[name] = computed
+
+    def _time(self):
+        return self.source.time()
+
+    def _monotonic(self):
+        return self.source.monotonic()
+
+    def add_listener(self, callback):
+        """Call callback() from the sampler thread after every background sample"""
+        self._listeners.append(callback)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval * self.slowdown):
+            try:
+                self.sample_once()
+            except Exception as e:
+                logger.warning('Sampler pass failed: %r', e)
+            for callback in self._listeners:
+                try:
+                    callback()
+                except Exception:
+                    pass
+
+    def _sample_cpu(self):
+        """Raw per-core CPU times"""
+        return self.source.cpu_times(percpu=True)
+
+    def _compute_cpu(self, prev, current, elapsed):
+        """Aggregate and per-core busy percent between the two samples"""
+        per_cpu = []
+        busy_total = all_total = 0
+        for before, after in zip(prev, current):
+            total = max(sum(after) - sum(before), 0)
+            idle = max((after.idle + getattr(after, 'iowait', 0)) - (before.idle + getattr(before, 'iowait', 0)), 0)
+            busy = max(total - idle, 0)
+            per_cpu.append(round(busy / total * 100, 1) if total else 0.0)
+            busy_total += busy
+            all_total += total
+
+        saturated = [core for core, value in enumerate(per_cpu) if value >= Config.CPU_CORE_SATURATED]
+        self._core_streaks = [
+            (self._core_streaks[core] + 1 if core < len(self._core_streaks) else 1) if core in saturated else 0
+            for core in range(len(per_cpu))
+        ]
+
+        return {
+            'interval': round(elapsed, 2),
+            'timestamp': self._time(),
+            'usage': round(busy_total / all_total * 100, 1) if all_total else 0.0,
+            'per_cpu': per_cpu,
+            'saturated_cores': saturated,
+            'pinned_cores': [core for core, streak in enumerate(self._core_streaks)
+                             if streak >= Config.CPU_CORE_PINNED_SAMPLES],
+            # How far the busiest core runs ahead of the typical one
+            'imbalance': round(max(per_cpu) - statistics.median(per_cpu), 1) if per_cpu else 0.0
+        }
+
+    def _sample_cpu_freq(self):
+        """Per-core clocks and temperature sensors, where the platform exposes them"""
+        try:
+            temperatures = self.source.sensors_temperatures() or {}
+        except (AttributeError, LookupError, NotImplementedError, OSError):
+            temperatures = {}
+        return {'freq': self.source.cpu_freq(percpu=True) or [], 'temperatures': temperatures}
+
+    def _compute_cpu_freq(self, prev, current, elapsed):
+        """Clocks are levels; report each core's clock as a fraction of its maximum"""
+        freq = current['freq']
+        return {
+            'timestamp': self._time(),
+            'per_cpu_mhz': [round(f.current) for f in freq],
+            'max_mhz': round(max((f.max for f in freq), default=0)) or None,
+            # One entry per cpufreq policy; a single entry means the clock is shared
+            'ratio': [round(f.current / f.max, 2) if f.max else None for f in freq],
+            'temperature': _cpu_temperature(current['temperatures'])
+        }
+
+    def _sample_core_load(self):
+        """
+        CPU time and last core of every process, read only while a core is saturated
+
+        Threads are listed for the processes that were busiest on a saturated
+        core in the previous sample, and only the threads that ran since then
+        are asked which core they are on.
+        """
+        with self._lock:
+            cpu = self._latest.get('cpu')
+        if not cpu or not cpu['saturated_cores']:
+            return None
+        saturated = set(cpu['saturated_cores'])
+
+        processes = {}
+        for proc in self.source.process_iter(['pid', 'name', 'cpu_times', 'cpu_num']):
+            info = proc.info
+            times = info.get('cpu_times')
+            if times is None or info.get('cpu_num') is None:
+                continue
+            processes[info['pid']] = (info['name'], times.user + times.system, info['cpu_num'])
+
+        threads = {}
+        previous = (self._prev.get('core_load') or (None, None))[1]
+        if previous:
+            busiest = sorted(
+                (pid for pid, (_, cpu_time, core) in processes.items()
+                 if core in saturated and pid in previous['processes']),
+                key=lambda pid: processes[pid][1] - previous['processes'][pid][1], reverse=True
+            )[:Config.CPU_CORE_TOP_PROCESSES]
+            for pid in busiest:
+                try:
+                    listed = self.source.Process(pid).threads()
+                except (psutil.Error, OSError):
+                    continue
+                for thread in listed:
+                    cpu_time = thread.user_time + thread.system_time
+                    before = previous['threads'].get(thread.id)
+                    if before is not None and cpu_time <= before[1]:
+                        threads[thread.id] = (pid, cpu_time, None)
+                        continue
+                    try:
+                        threads[thread.id] = (pid, cpu_time, self.source.Process(thread.id).cpu_num())
+                    except (psutil.Error, OSError):
+                        continue
+
+        return {'saturated': sorted(saturated), 'processes': processes, 'threads': threads}
+
+    def _compute_core_load(self, prev, current, elapsed):
+        """Busiest threads (or processes, until threads have two samples) on each saturated core"""
+        if not current or not prev:
+            return {'interval': round(elapsed, 2), 'timestamp': self._time(), 'cores': []}
+
+        def percent(cpu_time, before):
+            return round(max(cpu_time - before, 0) / elapsed * 100, 1)
+
+        by_thread = {}
+        for tid, (pid, cpu_time, core) in current['threads'].items():
+            before = prev['threads'].get(tid)
+            if core is not None and before is not None and before[0] == pid:
+                by_thread.setdefault(core, []).append({
+                    'tid': tid, 'pid': pid, 'name': current['processes'].get(pid, ('',))[0],
+                    'cpu_percent': percent(cpu_time, before[1])
+                })
+        by_process = {}
+        for pid, (name, cpu_time, core) in current['processes'].items():
+            before = prev['processes'].get(pid)
+            if before is not None:
+                by_process.setdefault(core, []).append({
+                    'tid': None, 'pid': pid, 'name': name, 'cpu_percent': percent(cpu_time, before[1])
+                })
+
+        cores = []
+        for core in current['saturated']:
+            entries = by_thread.get(core) or by_process.get(core, [])
+            entries = sorted((e for e in entries if e['cpu_percent'] > 0),
+                             key=lambda e: e['cpu_percent'], reverse=True)
+            cores.append({'core': core, 'threads': entries[:Config.CPU_CORE_TOP_PROCESSES]})
+
+        return {'interval': round(elapsed, 2), 'timestamp': self._time(), 'cores': cores}
+
+    def _sample_memory(self):
+        """Current memory and swap usage"""
+        return {'virtual': self.source.virtual_memory(), 'swap': self.source.swap_memory()}
+
+    def _compute_memory(self, prev, current, elapsed):
+        """Memory is a level rather than a counter; report the latest sample"""
+        mem = current['virtual']
+        swap = current['swap']
+        return {
+            'timestamp': self._time(),
+            'total': mem.total,
+            'available': mem.available,
+            'used': mem.used,
+            'percent': mem.percent,
+            'swap_used': swap.used,
+            'swap_percent': swap.percent
+        }
+
+    def export_metrics(self):
+        """Gauge families for /metrics, built only from the cached samples"""
+        with self._lock:
+            latest = dict(self._latest)
+
+        families = []
+        cpu = latest.get('cpu')
+        if cpu:
+            families.append(('sptool_host_cpu_usage_percent', 'gauge', 'Host CPU busy percent',
+                             [({}, cpu['usage'])]))
+            families.append(('sptool_host_cpu_core_usage_percent', 'gauge', 'Per-core CPU busy percent',
+                             [({'core': str(i)}, value) for i, value in enumerate(cpu['per_cpu'])]))
+
+        cpu_freq = latest.get('cpu_freq')
+        if cpu_freq:
+            families.append(('sptool_host_cpu_frequency_mhz', 'gauge', 'Current clock per cpufreq policy',
+                             [({'core': str(i)}, value) for i, value in enumerate(cpu_freq['per_cpu_mhz'])]))
+
+        memory = latest.get('memory')
+        if memory:
+            families.append(('sptool_host_memory_usage_percent', 'gauge', 'Host memory used percent',
+                             [({}, memory['percent'])]))
+            families.append(('sptool_host_memory_available_bytes', 'gauge', 'Host memory available',
+                             [({}, memory['available'])]))
+            families.append(('sptool_host_swap_usage_percent', 'gauge', 'Host swap used percent',
+                             [({}, memory['swap_percent'])]))
+
+        vmstat = latest.get('vmstat')
+        if vmstat:
+            families.append(('sptool_host_vmstat_pages_per_second', 'gauge',
+                             'Paging and reclaim activity from /proc/vmstat',
+                             [({'event': name}, value) for name, value in vmstat['rates'].items()]))
+
+        network = latest.get('network')
+        if network:
+            for field, unit in (('bytes_sent', 'bytes'), ('bytes_recv', 'bytes'),
+                                ('errin', 'errors'), ('errout', 'errors'),
+                                ('dropin', 'packets'), ('dropout', 'packets')):
+                families.append((f'sptool_host_network_{field}_per_second', 'gauge',
+                                 f'Per-interface {field} rate ({unit}/s)',
+                                 [({'interface': name}, rates[field])
+                                  for name, rates in network['interfaces'].items()]))
+
+        disk_io = latest.get('disk_io')
+        if disk_io:
+            for field in ('read_iops', 'write_iops', 'read_bps', 'write_bps', 'await_ms', 'utilization_percent'):
+                families.append((f'sptool_host_disk_{field}', 'gauge', f'Per-device disk {field}',
+                                 [({'device': name}, stats[field])
+                                  for name, stats in disk_io['devices'].items()]))
+
+        return families
+
+    def _sample_vmstat(self):
+        """Raw paging and reclaim counters (Linux)"""
+        return self.source.vmstat()
+
+    def _compute_vmstat(self, prev, current, elapsed):
+        """Page fault, swap, reclaim and refault rates in pages per second, plus new OOM kills"""
+        if not current:
+            return None
+        rates = {}
+        for name, counters in VMSTAT_RATES.items():
+            delta = sum(current.get(key, 0) - prev.get(key, 0) for key in counters)
+            rates[name] = round(max(delta, 0) / elapsed, 1)
+        return {
+            'interval': round(elapsed, 2),
+            'timestamp': self._time(),
+            'rates': rates,
+            'oom_kills': max(current.get('oom_kill', 0) - prev.get('oom_kill', 0), 0),
+            'oom_kill_total': current.get('oom_kill')
+        }
+
+    def _sample_network(self):
+        """Raw per-interface counters plus link state"""
+        return {
+            'counters': self.source.net_io_counters(pernic=True),
+            'stats': self.source.net_if_stats()
+        }
+
+    def _compute_network(self, prev, current, elapsed):
+        """Per-interface byte, packet, error and drop rates with link utilization"""
+        interfaces = {}
+        for name, counters in current['counters'].items():
+            before = prev['counters'].get(name)
+            if before is None:
+                continue
+
+            rates = {
+                field: round(max(getattr(counters, field) - getattr(before, field), 0) / elapsed, 2)
+                for field in ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+                              'errin', 'errout', 'dropin', 'dropout')
+            }
+
+            stats = current['stats'].get(name)
+            speed = stats.speed if stats else 0  # Mbit/s, 0 when unknown
+            rates['is_up'] = stats.isup if stats else None
+            rates['speed_mbps'] = speed
+            rates['utilization_percent'] = (
+                round(max(rates['bytes_sent'], rates['bytes_recv']) * 8 / (speed * 1e6) * 100, 1)
+                if speed else None
+            )
+            interfaces[name] = rates
+
+        return {
+            'interval': round(elapsed, 2),
+            'timestamp': self._time(),
+            'interfaces': interfaces
+        }
+
+    def _sample_disk_io(self):
+        """Raw per-device I/O counters"""
+        return self.source.disk_io_counters(perdisk=True) or {}
+
+    def _compute_disk_io(self, prev, current, elapsed):
+        """Per-device IOPS, throughput, average wait and utilization"""
+        devices = {}
+        for name, counters in current.items():
+            before = prev.get(name)
+            if before is None:
+                continue
+
+            reads = max(counters.read_count - before.read_count, 0)
+            writes = max(counters.write_count - before.write_count, 0)
+            io_time = max(counters.read_time - before.read_time, 0) + max(counters.write_time - before.write_time, 0)
+            busy_time = getattr(counters, 'busy_time', None)  # Linux/FreeBSD only
+
+            devices[name] = {
+                'read_iops': round(reads / elapsed, 1),
+                'write_iops': round(writes / elapsed, 1),
+                'read_bps': round(max(counters.read_bytes - before.read_bytes, 0) / elapsed, 1),
+                'write_bps': round(max(counters.write_bytes - before.write_bytes, 0) / elapsed, 1),
+                'await_ms': round(io_time / (reads + writes), 2) if reads + writes else 0,
+                'utilization_percent': (
+                    min(round(max(busy_time - before.busy_time, 0) / (elapsed * 1000) * 100, 1), 100)
+                    if busy_time is not None else None
+                )
+            }
+
+        return {
+            'interval': round(elapsed, 2),
+            'timestamp': self._time(),
+            'devices': devices
+        }
+
+# hwmon drivers that report the CPU package or cores
+CPU_SENSORS = ('coretemp', 'k10temp', 'zenpower', 'cpu_thermal', 'cpu-thermal', 'soc_thermal')
+
+def _cpu_temperature(temperatures):
+    """Hottest reading of the CPU sensors, or None when there are none"""
+    readings = [entry.current for name in CPU_SENSORS for entry in temperatures.get(name, ()) if entry.current]
+    return max(readings) if readings else None
+
+_shared_sampler = None
+_shared_lock = threading.Lock()
+
+def get_sampler():
+    """Return the process-wide sampler, starting it on first use"""
+    global _shared_sampler
+    with _shared_lock:
+        if _shared_sampler is None:
+            _shared_sampler = MetricsSampler()
+            _shared_sampler.start()
+            REGISTRY.add_collector(_shared_sampler.export_metrics)
+        return _shared_sampler
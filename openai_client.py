@@ -0,0 +1,153 @@
+"""
+OpenAI Client Module
+Shared client layer for OpenAI calls: one pooled HTTP session, request timeouts,
+a token-bucket rate limit, a concurrency cap, jittered retries on transient
+errors and coalescing of identical in-flight requests
+"""
+import json
+import random
+import threading
+import time
+from config import Config
+from throttling import TokenBucket, InflightCall
+
+class OpenAIClient:
+    def __init__(self, api_key=None, api_base=None):
+        self.api_key = api_key if api_key is not None else Config.OPENAI_API_KEY
+        self.api_base = api_base or Config.OPENAI_API_BASE or None
+        self.timeout = Config.OPENAI_TIMEOUT
+        self.max_retries = Config.OPENAI_MAX_RETRIES
+        self.backoff = Config.OPENAI_RETRY_BACKOFF
+        self.bucket = TokenBucket(Config.OPENAI_REQUESTS_PER_MINUTE / 60, Config.OPENAI_BURST)
+        self.semaphore = threading.BoundedSemaphore(Config.OPENAI_MAX_CONCURRENCY)
+        self.stats = {'requests': 0, 'retries': 0, 'coalesced': 0, 'throttled': 0}
+        self._openai = None
+        self._session = None
+        self._inflight = {}     # request key -> InflightCall being made by another thread
+        self._lock = threading.Lock()
+
+    def chat_completion(self, messages, model=None, max_tokens=500, temperature=0.7, coalesce=False):
+        """
+        Create a chat completion
+
+        Args:
+            messages: Chat messages
+            coalesce: Share the result with identical requests already in flight
+                      instead of sending a duplicate
+
+        Returns:
+            The openai response object
+
+        Raises:
+            openai.error.OpenAIError once retries are exhausted, or RateLimitError
+            if the local rate limit cannot be met within the timeout
+        """
+        kwargs = {
+            'model': model or Config.OPENAI_MODEL,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+        }
+        if not coalesce:
+            return self._create(kwargs)
+
+        key = json.dumps(kwargs, sort_keys=True)
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = InflightCall()
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._create(kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def _create(self, kwargs):
+        openai = self.module()
+        retryable = (openai.error.RateLimitError, openai.error.Timeout, openai.error.APIConnectionError,
+                     openai.error.ServiceUnavailableError, openai.error.TryAgain)
+
+        attempt = 0
+        while True:
+            if not self.bucket.acquire(timeout=self.timeout):
+                self._count('throttled')
+                raise openai.error.RateLimitError('SPTool OpenAI request rate limit reached')
+            with self.semaphore:
+                self._count('requests')
+                try:
+                    return openai.ChatCompletion.create(
+                        api_key=self.api_key,
+                        api_base=self.api_base,
+                        request_timeout=self.timeout,
+                        **kwargs
+                    )
+                except openai.error.OpenAIError as e:
+                    transient = isinstance(e, retryable) or (
+                        isinstance(e, openai.error.APIError) and (e.http_status or 500) >= 500)
+                    if not transient or attempt >= self.max_retries:
+                        raise
+                    delay = self._retry_delay(e, attempt)
+            attempt += 1
+            self._count('retries')
+            time.sleep(delay)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _retry_delay(self, error, attempt):
+        """Server-provided Retry-After if any, otherwise full-jitter exponential backoff"""
+        headers = getattr(error, 'headers', None) or {}
+        retry_after = headers.get('retry-after') or headers.get('Retry-After')
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), self.timeout)
+        except ValueError:
+            pass
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def module(self):
+        """The openai module, imported on first use and pointed at one pooled session for all threads"""
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    import openai
+                    import requests
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_connections=Config.OPENAI_MAX_CONCURRENCY,
+                        pool_maxsize=Config.OPENAI_MAX_CONCURRENCY
+                    )
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    # Otherwise openai opens a new session, and TLS connection, per thread
+                    openai.requestssession = session
+                    self._session = session
+                    self._openai = openai
+        return self._openai
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+def get_openai_client():
+    """Return the process-wide OpenAI client"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = OpenAIClient()
+        return _shared_client
@@ -0,0 +1,335 @@
+"""
+Post-mortem Module
+Offline analysis of recorded trace archives (see data_sources.py). The trace is
+split into time slices that are replayed through IssueDiagnoser on a process
+pool, and the per-frame results are folded into a timeline of issue onsets and
+the processes that were on top while they lasted
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import mmap
+import os
+import sys
+import time
+from datetime import datetime
+from data_sources import ReplaySource, _open_trace
+from config import Config
+from issue_diagnosis import SEVERITY_RANK
+
+SLICE_FRAMES = 200          # Frames replayed per worker task
+TOP_OFFENDERS = 3           # Processes kept per frame from the top CPU/memory lists
+TYPES_MARKER = b',"types":{'
+
+def iter_slices(path, slice_frames=SLICE_FRAMES):
+    """
+    Split a trace into slices of `slice_frames` frames without loading it
+
+    Uncompressed traces are memory-mapped and sliced by byte offset, so workers
+    read their own range and nothing but offsets crosses the process boundary.
+    Gzip traces cannot be seeked and are read sequentially, one slice of lines
+    at a time. Every slice after the first starts warmup_frames() early, so the
+    rate sections have a previous sample and the per-core saturation streaks
+    are rebuilt; those warm-up frames are not reported.
+
+    Yields:
+        Dictionaries with 'types' (namedtuple definitions written before the
+        slice), 'warmup' (frames to replay unreported) and either 'range'
+        (start, end offsets) or 'lines'
+    """
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+
+    if compressed:
+        lines = _open_trace(path)
+        try:
+            yield from _slice_lines(((None, None, line.encode()) for line in lines), slice_frames)
+        finally:
+            lines.close()
+        return
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _slice_lines(_iter_mmap_lines(mm), slice_frames)
+
+def _iter_mmap_lines(mm, start=0, end=None):
+    """Yield (start, end, mmap) for each line in a byte range of the map"""
+    end = len(mm) if end is None else end
+    pos = start
+    while pos < end:
+        newline = mm.find(b'\n', pos, end)
+        line_end = end if newline == -1 else newline + 1
+        yield pos, line_end, mm
+        pos = line_end
+
+def warmup_frames():
+    """
+    Frames replayed before a slice so its first frame is diagnosed as in a serial
+    replay: one for the rate baseline, then enough for a pinned core's streak
+    """
+    return Config.CPU_CORE_PINNED_SAMPLES + 1
+
+def _slice_lines(lines, slice_frames):
+    """
+    Group lines into slices. `lines` yields (start, end, data): either offsets
+    into the memory map `data`, or start=end=None and `data` is the line itself
+    """
+    types = {}              # replaced, never mutated, so slices can keep a reference
+    previous = collections.deque(maxlen=warmup_frames())   # (start, line, types before it) of the last frames
+    current = None
+    count = 0
+
+    for start, end, data in lines:
+        if start is None:
+            start_, end_, line = 0, len(data), data
+        else:
+            start_, end_, line = start, end, None
+        if data.find(b'{', start_, end_) == -1:
+            continue
+
+        if current is None:
+            first = previous[0] if previous else (start, None, types)
+            current = {'types': first[2], 'warmup': len(previous), 'start': first[0],
+                       'lines': [frame[1] for frame in previous] if line is not None else []}
+
+        types_before = types
+        if data.find(TYPES_MARKER, start_, end_) != -1:
+            types = {**types, **json.loads(data[start_:end_]).get('types', {})}
+
+        if line is not None:
+            current['lines'].append(line)
+        previous.append((start, line, types_before))
+        count += 1
+        if count == slice_frames:
+            yield _finish_slice(current, end)
+            current = None
+            count = 0
+
+    if current is not None:
+        yield _finish_slice(current, end)
+
+def _finish_slice(current, end):
+    if current['start'] is None:
+        return {'types': current['types'], 'warmup': current['warmup'], 'lines': current['lines']}
+    return {'types': current['types'], 'warmup': current['warmup'], 'range': (current['start'], end)}
+
+def analyse_slice(path, slice_):
+    """
+    Replay one slice through IssueDiagnoser
+
+    Returns:
+        List of compact per-frame summaries: timestamp, issues and top offenders
+    """
+    from system_diagnostics import SystemDiagnostics
+    from issue_diagnosis import IssueDiagnoser
+
+    f = mm = None
+    if 'lines' in slice_:
+        lines = slice_['lines']
+    else:
+        f = open(path, 'rb')
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        lines = (mm[start:end] for start, end, _ in _iter_mmap_lines(mm, *slice_['range']))
+
+    source = ReplaySource(lines=lines, types=slice_['types'])
+    diagnoser = IssueDiagnoser(diagnostics=SystemDiagnostics(source=source))
+    frames = []
+    try:
+        skip = slice_['warmup']
+        while source.advance():
+            diagnoser.diagnostics.sampler.sample_once()
+            if skip:
+                skip -= 1
+                continue
+            frames.append(_summarize_frame(source.time(), diagnoser.diagnose_all()))
+    finally:
+        source.close()
+        if mm is not None:
+            mm.close()
+            f.close()
+    return frames
+
+def _summarize_frame(timestamp, diagnosis):
+    processes = diagnosis['system_data'].get('processes', {})
+    return {
+        'ts': timestamp,
+        'issues': [
+            {key: issue.get(key) for key in ('category', 'title', 'severity', 'description')}
+            for issue in diagnosis['issues']
+        ],
+        'top_cpu': [
+            (proc.get('name'), proc.get('pid'), proc.get('cpu_percent') or 0)
+            for proc in processes.get('top_cpu', [])[:TOP_OFFENDERS]
+        ],
+        'top_memory': [
+            (proc.get('name'), proc.get('pid'), proc.get('memory_percent') or 0)
+            for proc in processes.get('top_memory', [])[:TOP_OFFENDERS]
+        ],
+    }
+
+class Timeline:
+    """Folds per-frame summaries, in time order, into issue episodes and offender totals"""
+
+    def __init__(self):
+        self.frames = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.episodes = []
+        self._active = {}       # (category, title) -> open episode
+        self._offenders = {}    # process name -> totals
+
+    def add(self, frame):
+        ts = frame['ts']
+        self.frames += 1
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+
+        seen = set()
+        for issue in frame['issues']:
+            key = (issue['category'], issue['title'])
+            seen.add(key)
+            episode = self._active.get(key)
+            if episode is None:
+                episode = self._active[key] = {
+                    'category': issue['category'],
+                    'title': issue['title'],
+                    'severity': issue['severity'],
+                    'description': issue['description'],
+                    'onset': ts,
+                    'cleared': None,
+                    'last_seen': ts,
+                    'frames': 0,
+                    'top_cpu_at_onset': [name for name, _, _ in frame['top_cpu']],
+                    'top_memory_at_onset': [name for name, _, _ in frame['top_memory']],
+                }
+            episode['frames'] += 1
+            episode['last_seen'] = ts
+            if SEVERITY_RANK.get(issue['severity'], 0) > SEVERITY_RANK.get(episode['severity'], 0):
+                episode['severity'] = issue['severity']
+
+        for key in [key for key in self._active if key not in seen]:
+            episode = self._active.pop(key)
+            episode['cleared'] = ts
+            self.episodes.append(episode)
+
+        for list_name, value_name in (('top_cpu', 'cpu'), ('top_memory', 'memory')):
+            for name, pid, value in frame[list_name]:
+                offender = self._offenders.setdefault(name, {
+                    'name': name, 'pids': set(), 'frames_top_cpu': 0, 'frames_top_memory': 0,
+                    'peak_cpu_percent': 0, 'peak_memory_percent': 0
+                })
+                offender['pids'].add(pid)
+                offender[f'frames_{list_name}'] += 1
+                peak = f'peak_{value_name}_percent'
+                offender[peak] = max(offender[peak], round(value, 1))
+
+    def report(self, limit=10):
+        """Episodes ordered by onset (still-open ones last seen at the end) and the top offenders"""
+        episodes = self.episodes + list(self._active.values())
+        episodes.sort(key=lambda e: (e['onset'], e['title']))
+        for episode in episodes:
+            end = episode['cleared'] if episode['cleared'] is not None else episode['last_seen']
+            episode['duration_seconds'] = round(end - episode['onset'], 1)
+
+        offenders = sorted(
+            self._offenders.values(),
+            key=lambda o: (o['frames_top_cpu'] + o['frames_top_memory'], o['peak_cpu_percent']),
+            reverse=True
+        )[:limit]
+
+        return {
+            'frames': self.frames,
+            'start': self.first_ts,
+            'end': self.last_ts,
+            'episodes': episodes,
+            'offenders': [dict(o, pids=sorted(p for p in o['pids'] if p is not None)) for o in offenders],
+        }
+
+def analyse(path, workers=None, slice_frames=SLICE_FRAMES):
+    """
+    Analyse a trace archive with a pool of `workers` processes
+
+    At most two slices per worker are in flight, so memory stays bounded no
+    matter how large the archive is. workers=1 replays in this process.
+
+    Returns:
+        Report dictionary from Timeline.report()
+    """
+    workers = workers or os.cpu_count() or 1
+    timeline = Timeline()
+    slices = iter_slices(path, slice_frames)
+
+    if workers == 1:
+        for slice_ in slices:
+            for frame in analyse_slice(path, slice_):
+                timeline.add(frame)
+        return timeline.report()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for slice_ in slices:
+            pending.append(pool.submit(analyse_slice, path, slice_))
+            while len(pending) >= workers * 2:
+                for frame in pending.popleft().result():
+                    timeline.add(frame)
+        while pending:
+            for frame in pending.popleft().result():
+                timeline.add(frame)
+    return timeline.report()
+
+def format_report(report, path):
+    """Render a report as plain text"""
+    def clock(ts):
+        return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts is not None else '-'
+
+    lines = [f"SPTool post-mortem: {path}"]
+    lines.append(f"Window: {clock(report['start'])} -> {clock(report['end'])} ({report['frames']} frames)")
+    lines.append('')
+    lines.append('Issue timeline')
+    if not report['episodes']:
+        lines.append('  No issues detected')
+    for episode in report['episodes']:
+        state = f"cleared {clock(episode['cleared'])}" if episode['cleared'] is not None else 'still active'
+        lines.append(f"  {clock(episode['onset'])}  [{episode['severity']}] {episode['title']}"
+                     f" ({episode['duration_seconds']}s, {state})")
+        lines.append(f"      {episode['description']}")
+        if episode['top_cpu_at_onset']:
+            lines.append(f"      top CPU at onset: {', '.join(map(str, episode['top_cpu_at_onset']))}")
+
+    lines.append('')
+    lines.append('Top offenders')
+    lines.append(f"  {'Process':<28}{'CPU frames':>12}{'Peak CPU%':>11}{'Mem frames':>12}{'Peak Mem%':>11}")
+    for offender in report['offenders']:
+        lines.append(f"  {str(offender['name'])[:27]:<28}{offender['frames_top_cpu']:>12}"
+                     f"{offender['peak_cpu_percent']:>11}{offender['frames_top_memory']:>12}"
+                     f"{offender['peak_memory_percent']:>11}")
+    return '\n'.join(lines) + '\n'
+
+def main():
+    parser = argparse.ArgumentParser(description='Post-mortem analysis of a recorded SPTool trace')
+    parser.add_argument('path', help='Trace written by "python data_sources.py record"')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--slice-frames', type=int, default=SLICE_FRAMES, help='Frames per worker task')
+    parser.add_argument('--json', action='store_true', help='Write the report as JSON')
+    parser.add_argument('--output', '-o', help='Write the report to this file instead of stdout')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report = analyse(args.path, workers=args.workers, slice_frames=args.slice_frames)
+    report['analysis_seconds'] = round(time.perf_counter() - started, 2)
+
+    text = json.dumps(report, indent=2) if args.json else format_report(report, args.path)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Analysed {report['frames']} frames in {report['analysis_seconds']}s; report written to {args.output}")
+    else:
+        sys.stdout.write(text)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
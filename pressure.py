@@ -0,0 +1,100 @@
+"""
+Pressure Module
+Reads Linux Pressure Stall Information (PSI), load averages and run-queue length.
+The /proc files are opened once and re-read with pread, so each reading is a
+handful of syscalls with no path lookups
+"""
+import os
+import psutil
+
+PSI_RESOURCES = ('cpu', 'memory', 'io')
+
+class PressureReader:
+    def __init__(self):
+        self._fds = {}
+        for resource in PSI_RESOURCES:
+            self._fds[resource] = self._open(f'/proc/pressure/{resource}')
+        self._fds['loadavg'] = self._open('/proc/loadavg')
+        self.psi_available = any(self._fds.get(resource) is not None for resource in PSI_RESOURCES)
+
+    def read(self):
+        """
+        Read PSI for cpu, memory and io plus load average and run-queue length
+
+        Returns:
+            Dictionary with 'psi' per resource (some/full avg10, avg60, avg300 in %,
+            total stall in microseconds), 'load_average', 'load_per_cpu' and 'runnable'
+        """
+        cpu_count = psutil.cpu_count() or 1
+        result = {
+            'psi_available': self.psi_available,
+            'psi': {},
+            'cpu_count': cpu_count
+        }
+
+        for resource in PSI_RESOURCES:
+            content = self._pread(resource)
+            if content is not None:
+                result['psi'][resource] = self._parse_psi(content)
+
+        content = self._pread('loadavg')
+        if content is not None:
+            # "0.07 0.03 0.00 1/73 3358": 1/5/15 min load, runnable/total threads, last pid
+            fields = content.split()
+            load = [float(x) for x in fields[:3]]
+            runnable, _, total = fields[3].partition('/')
+            result['runnable'] = int(runnable)
+            result['total_threads'] = int(total)
+        else:
+            try:
+                load = list(psutil.getloadavg())
+            except (AttributeError, OSError):
+                load = None
+
+        if load is not None:
+            result['load_average'] = [round(x, 2) for x in load]
+            result['load_per_cpu'] = round(load[0] / cpu_count, 2)
+
+        return result
+
+    def close(self):
+        """Close the held /proc file descriptors"""
+        for name, fd in self._fds.items():
+            if fd is not None:
+                os.close(fd)
+        self._fds = {}
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _pread(self, name):
+        fd = self._fds.get(name)
+        if fd is None:
+            return None
+        try:
+            return os.pread(fd, 4096, 0).decode()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _open(path):
+        try:
+            return os.open(path, os.O_RDONLY)
+        except (OSError, AttributeError):
+            return None
+
+    @staticmethod
+    def _parse_psi(content):
+        """Parse 'some avg10=0.54 avg60=0.71 avg300=0.58 total=4532437' lines"""
+        parsed = {}
+        for line in content.splitlines():
+            kind, _, rest = line.partition(' ')
+            values = {}
+            for field in rest.split():
+                key, _, value = field.partition('=')
+                values[key] = int(value) if key == 'total' else float(value)
+            parsed[kind] = values
+        return parsed
@@ -0,0 +1,290 @@
+"""
+Process Group Module
+Aggregates CPU, memory and I/O by process tree, systemd unit and cgroup v2 path,
+reading /proc and /sys/fs/cgroup directly instead of making per-process psutil calls
+"""
+import os
+import platform
+import time
+
+PROC_ROOT = '/proc'
+CGROUP_ROOT = '/sys/fs/cgroup'
+UNIT_SUFFIXES = ('.service', '.scope', '.socket', '.mount', '.slice')
+
+class ProcessGroupAggregator:
+    GROUP_BY = ('tree', 'unit', 'cgroup')
+
+    def __init__(self):
+        self.available = platform.system() == 'Linux' and os.path.isdir(PROC_ROOT)
+        self.cgroup_v2 = os.path.exists(os.path.join(CGROUP_ROOT, 'cgroup.controllers'))
+        self.clock_ticks = os.sysconf('SC_CLK_TCK') if self.available else 100
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if self.available else 4096
+        self.cpu_count = os.cpu_count() or 1
+        self._prev_procs = {}    # pid -> (starttime, cpu_ticks, read_bytes, write_bytes)
+        self._prev_cgroups = {}  # cgroup path -> (usage_usec, rbytes, wbytes)
+        self._prev_time = None
+
+    def collect(self, by='tree', limit=15):
+        """
+        Aggregate resource usage by group
+
+        Args:
+            by: 'tree' (child-of-init subtree), 'unit' (systemd unit) or 'cgroup'
+            limit: Number of groups to return, sorted by CPU then memory
+
+        Returns:
+            Dictionary with the groups and the sampling interval used for rates
+        """
+        if by not in self.GROUP_BY:
+            raise ValueError(f'Unknown grouping "{by}"')
+        return self.collect_all(limit=limit, groupings=(by,)).get(by, {'available': False})
+
+    def collect_all(self, limit=15, groupings=GROUP_BY):
+        """Aggregate by several groupings from a single pass over /proc"""
+        if not self.available:
+            return {by: {'available': False} for by in groupings}
+
+        now = time.monotonic()
+        elapsed = now - self._prev_time if self._prev_time else None
+        procs = self._read_procs()
+        total_memory = self._total_memory()
+        self._prev_time = now
+
+        return {by: self._aggregate(procs, by, limit, elapsed, total_memory) for by in groupings}
+
+    def _aggregate(self, procs, by, limit, elapsed, total_memory):
+        """Sum per-process deltas into groups and convert them to rates"""
+        groups = {}
+        roots = {}
+        for pid, proc in procs.items():
+            key = self._group_key(pid, proc, procs, by, roots)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    'group': key,
+                    'process_count': 0,
+                    'cpu_ticks': 0,
+                    'rss_bytes': 0,
+                    'read_bytes': 0,
+                    'write_bytes': 0,
+                    'top_pid': pid,
+                    'top_name': proc['name'],
+                    'top_ticks': -1,
+                }
+            group['process_count'] += 1
+            group['cpu_ticks'] += proc['delta_ticks']
+            group['rss_bytes'] += proc['rss_bytes']
+            group['read_bytes'] += proc['delta_read']
+            group['write_bytes'] += proc['delta_write']
+            if proc['delta_ticks'] > group['top_ticks']:
+                group['top_ticks'] = proc['delta_ticks']
+                group['top_pid'] = pid
+                group['top_name'] = proc['name']
+
+        results = []
+        for group in groups.values():
+            result = {
+                'group': group['group'],
+                'process_count': group['process_count'],
+                'top_process': {'pid': group['top_pid'], 'name': group['top_name']},
+                'memory_mb': self._bytes_to_mb(group['rss_bytes']),
+                'memory_percent': round(group['rss_bytes'] / total_memory * 100, 2) if total_memory else 0,
+                'cpu_percent': None,
+                'read_bps': None,
+                'write_bps': None,
+            }
+            if elapsed:
+                cpu_seconds = group['cpu_ticks'] / self.clock_ticks
+                result['cpu_percent'] = round(cpu_seconds / elapsed / self.cpu_count * 100, 1)
+                result['read_bps'] = round(group['read_bytes'] / elapsed, 1)
+                result['write_bps'] = round(group['write_bytes'] / elapsed, 1)
+            results.append(result)
+
+        if by == 'cgroup' and self.cgroup_v2:
+            self._apply_cgroup_accounting(results, elapsed, total_memory)
+
+        results.sort(key=lambda g: (g['cpu_percent'] or 0, g['memory_mb']), reverse=True)
+        return {
+            'available': True,
+            'by': by,
+            'interval': round(elapsed, 2) if elapsed else None,
+            'total_groups': len(results),
+            'groups': results[:limit]
+        }
+
+    def _read_procs(self):
+        """Read stat, cgroup and io for every PID in one pass over /proc"""
+        procs = {}
+        prev_procs = self._prev_procs
+        current = {}
+
+        for entry in os.listdir(PROC_ROOT):
+            if not entry.isdigit():
+                continue
+            pid = int(entry)
+            base = f'{PROC_ROOT}/{entry}'
+            try:
+                with open(f'{base}/stat', 'rb') as f:
+                    stat = f.read().decode('utf-8', 'replace')
+                with open(f'{base}/cgroup', 'rb') as f:
+                    cgroup = f.read().decode('utf-8', 'replace')
+            except OSError:
+                continue
+
+            name = stat[stat.find('(') + 1:stat.rfind(')')]
+            fields = stat[stat.rfind(')') + 2:].split()
+            ppid = int(fields[1])
+            ticks = int(fields[11]) + int(fields[12])
+            starttime = int(fields[19])
+            rss_bytes = int(fields[21]) * self.page_size
+
+            read_bytes = write_bytes = 0
+            try:
+                with open(f'{base}/io', 'rb') as f:
+                    for line in f.read().split(b'\n'):
+                        if line.startswith(b'read_bytes:'):
+                            read_bytes = int(line.split()[1])
+                        elif line.startswith(b'write_bytes:'):
+                            write_bytes = int(line.split()[1])
+            except OSError:
+                pass
+
+            prev = prev_procs.get(pid)
+            if prev and prev[0] == starttime:
+                delta_ticks = max(ticks - prev[1], 0)
+                delta_read = max(read_bytes - prev[2], 0)
+                delta_write = max(write_bytes - prev[3], 0)
+            else:
+                delta_ticks = delta_read = delta_write = 0
+
+            current[pid] = (starttime, ticks, read_bytes, write_bytes)
+            procs[pid] = {
+                'name': name,
+                'ppid': ppid,
+                'cgroup': self._parse_cgroup(cgroup),
+                'rss_bytes': rss_bytes,
+                'delta_ticks': delta_ticks,
+                'delta_read': delta_read,
+                'delta_write': delta_write,
+            }
+
+        # Exited processes drop out here
+        self._prev_procs = current
+        return procs
+
+    def _group_key(self, pid, proc, procs, by, roots):
+        """Group name for a process under the chosen grouping"""
+        if by == 'cgroup':
+            return proc['cgroup']
+        if by == 'unit':
+            return self._unit_from_cgroup(proc['cgroup'])
+
+        # Walk up to the ancestor whose parent is init, so every kernel thread
+        # lands under kthreadd, remembering the answer for every PID on the way
+        path = []
+        root = pid
+        while root not in roots and root in procs and procs[root]['ppid'] not in (0, 1) and len(path) < 64:
+            path.append(root)
+            root = procs[root]['ppid']
+        key = roots.get(root)
+        if key is None:
+            root_name = procs[root]['name'] if root in procs else proc['name']
+            key = roots[root] = f'{root_name} ({root})'
+        for member in path:
+            roots[member] = key
+        return key
+
+    def _apply_cgroup_accounting(self, results, elapsed, total_memory):
+        """Replace summed process figures with the kernel's cgroup v2 accounting"""
+        current = {}
+        for result in results:
+            path = os.path.join(CGROUP_ROOT, result['group'].lstrip('/'))
+            try:
+                usage_usec = self._read_keyed(os.path.join(path, 'cpu.stat')).get('usage_usec')
+                with open(os.path.join(path, 'memory.current'), 'rb') as f:
+                    memory_bytes = int(f.read())
+            except (OSError, ValueError):
+                continue
+            rbytes, wbytes = self._read_io_stat(os.path.join(path, 'io.stat'))
+
+            result['memory_mb'] = self._bytes_to_mb(memory_bytes)
+            if total_memory:
+                result['memory_percent'] = round(memory_bytes / total_memory * 100, 2)
+            result['source'] = 'cgroup'
+
+            prev = self._prev_cgroups.get(result['group'])
+            if prev and elapsed and usage_usec is not None:
+                result['cpu_percent'] = round(max(usage_usec - prev[0], 0) / 1e6 / elapsed / self.cpu_count * 100, 1)
+                result['read_bps'] = round(max(rbytes - prev[1], 0) / elapsed, 1)
+                result['write_bps'] = round(max(wbytes - prev[2], 0) / elapsed, 1)
+            if usage_usec is not None:
+                current[result['group']] = (usage_usec, rbytes, wbytes)
+
+        self._prev_cgroups = current
+
+    @staticmethod
+    def _parse_cgroup(content):
+        """cgroup v2 path from /proc/<pid>/cgroup, falling back to the first v1 hierarchy"""
+        fallback = '/'
+        for line in content.splitlines():
+            parts = line.split(':', 2)
+            if len(parts) != 3:
+                continue
+            if parts[0] == '0':
+                return parts[2] or '/'
+            if fallback == '/':
+                fallback = parts[2] or '/'
+        return fallback
+
+    @staticmethod
+    def _unit_from_cgroup(path):
+        """Deepest systemd unit named in a cgroup path"""
+        for part in reversed(path.split('/')):
+            if part.endswith(UNIT_SUFFIXES):
+                return part
+        return 'kernel' if path == '/' else path
+
+    @staticmethod
+    def _read_keyed(path):
+        """Parse a flat 'key value' cgroup file"""
+        values = {}
+        with open(path, 'rb') as f:
+            for line in f.read().decode().splitlines():
+                parts = line.split()
+                if len(parts) == 2:
+                    values[parts[0]] = int(parts[1])
+        return values
+
+    @staticmethod
+    def _read_io_stat(path):
+        """Total rbytes/wbytes across devices from a cgroup io.stat file"""
+        rbytes = wbytes = 0
+        try:
+            with open(path, 'rb') as f:
+                for line in f.read().decode().splitlines():
+                    for field in line.split()[1:]:
+                        key, _, value = field.partition('=')
+                        if key == 'rbytes':
+                            rbytes += int(value)
+                        elif key == 'wbytes':
+                            wbytes += int(value)
+        except (OSError, ValueError):
+            pass
+        return rbytes, wbytes
+
+    @staticmethod
+    def _total_memory():
+        """MemTotal in bytes from /proc/meminfo"""
+        try:
+            with open(f'{PROC_ROOT}/meminfo', 'rb') as f:
+                for line in f:
+                    if line.startswith(b'MemTotal:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return 0
+
+    @staticmethod
+    def _bytes_to_mb(bytes_value):
+        """Convert bytes to megabytes"""
+        return round(bytes_value / (1024 ** 2), 1)
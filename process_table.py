@@ -0,0 +1,229 @@
+"""
+Process Table Module
+Keeps an incremental table of running processes so per-process rates
+(I/O throughput, context switches) can be computed between refreshes
+"""
+import psutil
+from data_sources import LiveSource
+
+class ProcessTable:
+    # Metrics read from /proc/<pid>/stat, statm and status, which a single
+    # oneshot() context serves for every process on the host
+    CHEAP_METRICS = ('cpu_percent', 'memory_percent', 'rss_mb', 'num_threads',
+                     'ctx_switches_per_sec', 'children')
+    # Metrics that need an extra read per process (io, fd directory, smaps)
+    IO_METRICS = ('read_bps', 'write_bps')
+    FD_METRICS = ('num_fds',)
+    USS_METRICS = ('uss_mb',)
+    SORT_KEYS = CHEAP_METRICS + IO_METRICS + FD_METRICS + USS_METRICS
+
+    # Expensive metrics are measured only for a pool of this many candidates per
+    # result, picked by cheap metrics that track them, plus the last results
+    CANDIDATE_FACTOR = 4
+    PROXIES = {
+        'read_bps': ('ctx_switches_per_sec', 'cpu_percent', 'ctx_switches'),
+        'write_bps': ('ctx_switches_per_sec', 'cpu_percent', 'ctx_switches'),
+        'num_fds': ('num_threads', 'rss_mb'),
+        'uss_mb': ('rss_mb',),
+    }
+
+    def __init__(self, source=None):
+        self.source = source or LiveSource()
+        self._clock = self.source.monotonic
+        self._procs = {}   # pid -> psutil.Process, kept so cpu_percent has a baseline
+        self._rows = {}    # pid -> latest cheap row
+        self._prev = {}    # pid -> previous counter readings and their timestamps
+        self._recent = {}  # sort key -> PIDs returned last time, kept in the next pool
+        self.last_refresh = None
+
+    def refresh(self):
+        """Walk the process list once and update the cheap metrics for every PID"""
+        now = self._clock()
+        seen = set()
+        rows = {}
+        children = {}
+
+        for pid in self.source.pids():
+            proc = self._procs.get(pid)
+            try:
+                if proc is None:
+                    proc = self.source.Process(pid)
+                    self._procs[pid] = proc
+                with proc.oneshot():
+                    create_time = proc.create_time()
+                    mem = proc.memory_info()
+                    ctx = proc.num_ctx_switches()
+                    row = {
+                        'pid': pid,
+                        'create_time': create_time,
+                        'name': proc.name(),
+                        'ppid': proc.ppid(),
+                        'cpu_percent': proc.cpu_percent(),
+                        'memory_percent': round(proc.memory_percent(), 2),
+                        'rss_mb': self._bytes_to_mb(mem.rss),
+                        'num_threads': proc.num_threads(),
+                        'ctx_switches': ctx.voluntary + ctx.involuntary,
+                    }
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                self._procs.pop(pid, None)
+                continue
+            except psutil.AccessDenied:
+                continue
+
+            prev = self._prev_for(pid, create_time)
+            row['ctx_switches_per_sec'] = self._rate(prev, 'ctx_switches', row['ctx_switches'], now)
+            prev['ctx_switches'] = row['ctx_switches']
+            prev['ctx_time'] = now
+
+            rows[pid] = row
+            seen.add(pid)
+            children.setdefault(row['ppid'], 0)
+            children[row['ppid']] += 1
+
+        for row in rows.values():
+            row['children'] = children.get(row['pid'], 0)
+
+        # Evict processes that have exited
+        for pid in list(self._procs):
+            if pid not in seen:
+                del self._procs[pid]
+        for pid in list(self._prev):
+            if pid not in seen:
+                del self._prev[pid]
+
+        self._rows = rows
+        self.last_refresh = now
+        return rows
+
+    def top(self, sort_by='cpu_percent', limit=10):
+        """
+        Return the top processes by a metric, with full details for those only
+
+        Args:
+            sort_by: One of SORT_KEYS
+            limit: Number of processes to return
+
+        Returns:
+            List of detail dictionaries, highest first
+        """
+        if sort_by not in self.SORT_KEYS:
+            raise ValueError(f'Unknown sort key "{sort_by}"')
+
+        rows = self.refresh()
+
+        if sort_by in self.CHEAP_METRICS:
+            candidates = self._rank(rows.values(), sort_by)[:limit]
+        elif sort_by in self.USS_METRICS:
+            candidates = [row for row in self._pool(rows, sort_by, limit) if self._add_uss(row)]
+            candidates = self._rank(candidates, sort_by)[:limit]
+        elif sort_by in self.IO_METRICS:
+            candidates = [row for row in self._pool(rows, sort_by, limit) if self._add_io(row)]
+            candidates = sorted(candidates, key=lambda row: self._io_rank(row, sort_by), reverse=True)[:limit]
+        else:
+            candidates = [row for row in self._pool(rows, sort_by, limit) if self._add_fds(row)]
+            candidates = self._rank(candidates, sort_by)[:limit]
+
+        self._recent[sort_by] = [row['pid'] for row in candidates]
+        return [self._details(row) for row in candidates]
+
+    def _pool(self, rows, sort_by, limit):
+        """Candidates for an expensive metric: the top of each proxy metric and the last results"""
+        size = limit * self.CANDIDATE_FACTOR
+        pool = {pid: rows[pid] for pid in self._recent.get(sort_by, ()) if pid in rows}
+        for key in self.PROXIES[sort_by]:
+            for row in self._rank(rows.values(), key)[:size]:
+                pool.setdefault(row['pid'], row)
+        return list(pool.values())
+
+    def _io_rank(self, row, key):
+        """I/O rate to rank by; the average since the process started until there is a rate"""
+        if row[key] is not None:
+            return row[key]
+        total = self._prev.get(row['pid'], {}).get(key.replace('_bps', '_bytes'), 0)
+        age = self.source.time() - row['create_time']
+        return total / age if age > 0 else 0
+
+    def details(self, pid):
+        """Return the full drill-down for a single PID"""
+        if pid not in self._rows:
+            self.refresh()
+        row = self._rows.get(pid)
+        if row is None:
+            return None
+        return self._details(row)
+
+    def _details(self, row):
+        """Fill in every expensive metric that is not already on the row"""
+        if 'read_bps' not in row:
+            self._add_io(row)
+        if 'num_fds' not in row:
+            self._add_fds(row)
+        if 'uss_mb' not in row:
+            self._add_uss(row)
+        return dict(row)
+
+    def _add_io(self, row):
+        """Add read/write bytes per second; False if the counters are not readable"""
+        proc = self._procs.get(row['pid'])
+        try:
+            io = proc.io_counters()
+        except (AttributeError, psutil.NoSuchProcess, psutil.AccessDenied):
+            row.setdefault('read_bps', None)
+            row.setdefault('write_bps', None)
+            return False
+
+        now = self._clock()
+        prev = self._prev.setdefault(row['pid'], {})
+        row['read_bps'] = self._rate(prev, 'read_bytes', io.read_bytes, now, 'io_time')
+        row['write_bps'] = self._rate(prev, 'write_bytes', io.write_bytes, now, 'io_time')
+        prev['read_bytes'] = io.read_bytes
+        prev['write_bytes'] = io.write_bytes
+        prev['io_time'] = now
+        return True
+
+    def _add_fds(self, row):
+        """Add the open file descriptor count; False if not readable"""
+        proc = self._procs.get(row['pid'])
+        try:
+            row['num_fds'] = proc.num_fds() if hasattr(proc, 'num_fds') else proc.num_handles()
+            return True
+        except (AttributeError, psutil.NoSuchProcess, psutil.AccessDenied):
+            row['num_fds'] = None
+            return False
+
+    def _add_uss(self, row):
+        """Add unique set size; False if not readable"""
+        proc = self._procs.get(row['pid'])
+        try:
+            row['uss_mb'] = self._bytes_to_mb(proc.memory_full_info().uss)
+            return True
+        except (AttributeError, psutil.NoSuchProcess, psutil.AccessDenied):
+            row['uss_mb'] = None
+            return False
+
+    def _prev_for(self, pid, create_time):
+        """Previous counters for a PID, reset if the PID has been reused"""
+        prev = self._prev.get(pid)
+        if prev is None or prev.get('create_time') != create_time:
+            prev = {'create_time': create_time}
+            self._prev[pid] = prev
+        return prev
+
+    @staticmethod
+    def _rate(prev, key, value, now, time_key='ctx_time'):
+        """Per-second rate of a cumulative counter since the previous reading"""
+        if key not in prev or time_key not in prev:
+            return None
+        elapsed = now - prev[time_key]
+        if elapsed <= 0:
+            return None
+        return round(max(value - prev[key], 0) / elapsed, 1)
+
+    @staticmethod
+    def _rank(rows, key):
+        return sorted(rows, key=lambda x: x.get(key) or 0, reverse=True)
+
+    @staticmethod
+    def _bytes_to_mb(bytes_value):
+        """Convert bytes to megabytes"""
+        return round(bytes_value / (1024 ** 2), 1)
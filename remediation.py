@@ -0,0 +1,190 @@
+"""
+Remediation Module
+Opt-in auto-remediation. Policies map issue fingerprints (category and a title
+pattern) to whitelisted fixes of low risk. They are evaluated on the
+background sampler's thread at a fixed interval, and a fix runs once its
+issue has been seen on enough consecutive evaluations. Per-policy cooldowns,
+per-policy and global hourly budgets, and a shadow mode that only dry-runs
+keep it safe. Every execution is audited with the policy that triggered it
+"""
+import collections
+import fnmatch
+import threading
+import time
+from config import Config
+
+HOUR = 3600
+
+class RemediationEngine:
+    def __init__(self, diagnose, executor, sampler=None, policies=None, shadow=None):
+        """
+        Args:
+            diagnose: Function returning a diagnose_all() result
+            executor: CommandExecutor that runs (or dry-runs) the fixes
+            sampler: Sampler whose thread drives evaluate(); see start()
+            policies: Policy dictionaries; defaults to AUTO_REMEDIATION_POLICIES
+            shadow: Only dry-run fixes; defaults to AUTO_REMEDIATION_SHADOW
+        """
+        self.diagnose = diagnose
+        self.executor = executor
+        self.sampler = sampler
+        self.shadow = Config.AUTO_REMEDIATION_SHADOW if shadow is None else shadow
+        self.policies, self.rejected = self._validate(
+            Config.AUTO_REMEDIATION_POLICIES if policies is None else policies)
+        self._state = {policy['name']: {'matches': 0, 'runs': collections.deque(), 'last_run': None,
+                                        'decision': None}
+                       for policy in self.policies}
+        self._runs = collections.deque()    # monotonic times of every execution, for the global budget
+        self.history = collections.deque(maxlen=Config.AUTO_REMEDIATION_HISTORY)
+        self.last_error = None
+        self._last_evaluation = None
+        self._evaluating = threading.Lock()
+        self._lock = threading.Lock()
+
+    def _validate(self, policies):
+        """Keep policies whose fix is available, unparameterized and within AUTO_REMEDIATION_RISKS"""
+        valid, rejected = [], []
+        catalog = self.executor.whitelisted_commands
+        for policy in policies:
+            name = policy.get('name') or policy.get('fix_id')
+            fix = catalog.get(policy.get('fix_id'))
+            if fix is None:
+                reason = f"fix {policy.get('fix_id')!r} is not available on this host"
+            elif fix['risk'] not in Config.AUTO_REMEDIATION_RISKS:
+                reason = f"fix risk {fix['risk']!r} is not allowed unattended"
+            elif fix.get('parameterized'):
+                reason = 'parameterized fixes need a human to choose the parameters'
+            elif not policy.get('title'):
+                reason = 'a title pattern is required'
+            else:
+                valid.append({
+                    'name': name,
+                    'category': policy.get('category'),
+                    'title': policy['title'],
+                    'fix_id': policy['fix_id'],
+                    'confirmations': policy.get('confirmations', 2),
+                    'cooldown': policy.get('cooldown', HOUR),
+                    'max_per_hour': policy.get('max_per_hour', 1)
+                })
+                continue
+            rejected.append({'name': name, 'reason': reason})
+        return valid, rejected
+
+    def start(self):
+        """Evaluate from the sampler's thread every AUTO_REMEDIATION_INTERVAL seconds"""
+        if self.sampler is not None:
+            self.sampler.add_listener(self.maybe_evaluate)
+
+    def maybe_evaluate(self):
+        """Sampler listener: start an evaluation when one is due and none is running"""
+        now = time.monotonic()
+        interval = Config.AUTO_REMEDIATION_INTERVAL * getattr(self.sampler, 'slowdown', 1)
+        if self._last_evaluation is not None and now - self._last_evaluation < interval:
+            return
+        if not self._evaluating.acquire(blocking=False):
+            return
+        self._last_evaluation = now
+        # Diagnosis takes seconds, so it must not hold up the sampler
+        threading.Thread(target=self._evaluate_in_background, name='sptool-remediation', daemon=True).start()
+
+    def _evaluate_in_background(self):
+        try:
+            self.evaluate()
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            self._evaluating.release()
+
+    def evaluate(self, issues=None):
+        """
+        Match the current issues against the policies and run the fixes that are due
+
+        Returns:
+            List of the decisions taken in this evaluation
+        """
+        if issues is None:
+            issues = self.diagnose()['issues']
+        decisions = []
+        for policy in self.policies:
+            matched = [issue for issue in issues if self._matches(policy, issue)]
+            with self._lock:
+                state = self._state[policy['name']]
+                state['matches'] = state['matches'] + 1 if matched else 0
+                if not matched:
+                    state['decision'] = None
+                    continue
+                reason = self._blocked(policy, state)
+                if reason is None:
+                    now = time.monotonic()
+                    state['runs'].append(now)
+                    self._runs.append(now)
+                    state['last_run'] = now
+            if reason is not None:
+                if reason != state['decision']:
+                    # Repeats of the same suppression are not worth a history entry every interval
+                    decisions.append(self._remember(policy, matched[0], decision=reason))
+                state['decision'] = reason
+                continue
+
+            state['decision'] = 'executed'
+            result = self.executor.execute_fix(policy['fix_id'], dry_run=self.shadow,
+                                               trigger=f"policy:{policy['name']}")
+            decisions.append(self._remember(
+                policy, matched[0], decision='shadow' if self.shadow else 'executed',
+                success=result.get('success', False),
+                summary=result.get('command') if self.shadow else (result.get('stdout') or result.get('error'))
+            ))
+        return decisions
+
+    def _blocked(self, policy, state):
+        """Why the policy may not run now, or None; call with the lock held"""
+        now = time.monotonic()
+        for runs in (state['runs'], self._runs):
+            while runs and now - runs[0] > HOUR:
+                runs.popleft()
+        if state['matches'] < policy['confirmations']:
+            return 'confirming'
+        if state['last_run'] is not None and now - state['last_run'] < policy['cooldown']:
+            return 'cooldown'
+        if len(state['runs']) >= policy['max_per_hour']:
+            return 'policy_budget'
+        if len(self._runs) >= Config.AUTO_REMEDIATION_MAX_PER_HOUR:
+            return 'global_budget'
+        return None
+
+    @staticmethod
+    def _matches(policy, issue):
+        if policy['category'] and issue.get('category') != policy['category']:
+            return False
+        return fnmatch.fnmatchcase(issue.get('title', ''), policy['title'])
+
+    def _remember(self, policy, issue, **fields):
+        entry = dict(ts=time.time(), policy=policy['name'], fix_id=policy['fix_id'],
+                     issue=issue.get('title'), severity=issue.get('severity'), **fields)
+        self.history.append(entry)
+        return entry
+
+    def status(self):
+        """Policies with their budgets, rejected policies and recent decisions"""
+        now = time.monotonic()
+        with self._lock:
+            policies = [
+                dict(policy,
+                     consecutive_matches=self._state[policy['name']]['matches'],
+                     runs_last_hour=sum(1 for t in self._state[policy['name']]['runs'] if now - t <= HOUR),
+                     cooldown_remaining=max(round(policy['cooldown'] - (now - self._state[policy['name']]['last_run'])), 0)
+                     if self._state[policy['name']]['last_run'] is not None else 0)
+                for policy in self.policies
+            ]
+            runs_last_hour = sum(1 for t in self._runs if now - t <= HOUR)
+        return {
+            'enabled': Config.AUTO_REMEDIATION_ENABLED,
+            'shadow': self.shadow,
+            'interval': Config.AUTO_REMEDIATION_INTERVAL,
+            'runs_last_hour': runs_last_hour,
+            'max_per_hour': Config.AUTO_REMEDIATION_MAX_PER_HOUR,
+            'policies': policies,
+            'rejected_policies': list(self.rejected),
+            'history': list(self.history)[::-1],
+            'last_error': self.last_error
+        }
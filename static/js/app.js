@@ -539,13 +539,10 @@ class IntegratedChat {
             const data = await response.json();
             
             if (!data.configured) {
-                this.showStatus('AI chat not configured. Add OPENAI_API_KEY to .env file.');
+                // The built-in knowledge base still answers common questions
+                this.showStatus('Offline mode: answers come from the built-in knowledge base. Add OPENAI_API_KEY to .env for AI answers.');
                 if (this.askAiBtn) {
-                    this.askAiBtn.disabled = true;
-                    this.askAiBtn.title = 'AI not configured';
-                }
-                if (this.sendBtn) {
-                    this.sendBtn.disabled = true;
+                    this.askAiBtn.title = 'Offline answers (AI not configured)';
                 }
             } else {
                 this.showStatus('AI Assistant ready');
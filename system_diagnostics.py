@@ -2,36 +2,84 @@
 System Diagnostics Module
 Collects system information across different operating systems
 """
+import heapq
+import os
 import subprocess
 import platform
 import psutil
 from datetime import datetime
+from process_table import ProcessTable
+from metrics_sampler import MetricsSampler, get_sampler
+from data_sources import LiveSource
+from degraded_mode import get_governor
+from leak_detector import get_leak_detector
+from config import Config
+from instrumentation import DIAGNOSTIC_SECTION_SECONDS
 
 class SystemDiagnostics:
-    def __init__(self):
+    def __init__(self, source=None):
+        """
+        Args:
+            source: Data source to read from (see data_sources.py); defaults to the
+                    live system. Non-live sources get their own sampler, driven by
+                    whoever advances the source, instead of the shared background one
+        """
         self.os_type = platform.system()  # 'Linux', 'Windows', 'Darwin' (macOS)
+        self.source = source or LiveSource()
+        self.process_table = ProcessTable(source=self.source)
+        self.sampler = get_sampler() if source is None else MetricsSampler(source=self.source)
+        # Degraded-host mode watches this process, so it only applies to the live system
+        self.governor = get_governor() if source is None else None
+        # Leak tracking needs a long history of the live system
+        self.leak_detector = get_leak_detector() if source is None and Config.LEAK_DETECTION_ENABLED else None
+        self._candidates = None     # (monotonic time of last full scan, heaviest processes)
         
     def get_cpu_usage(self):
-        """Get current CPU usage percentage"""
+        """Get CPU usage, per-core saturation, clocks and busiest threads from the sampler"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
-            cpu_count = psutil.cpu_count()
-            cpu_freq = psutil.cpu_freq()
+            cpu = self.sampler.get('cpu')
+            if cpu is None:
+                # Before the sampler's second sample: non-blocking, since the last call
+                per_cpu = self.source.cpu_percent(interval=None, percpu=True)
+                cpu = {'usage': round(sum(per_cpu) / len(per_cpu), 1) if per_cpu else 0.0, 'per_cpu': per_cpu,
+                       'saturated_cores': [], 'pinned_cores': [], 'imbalance': 0.0}
+            cpu_freq = self.sampler.get('cpu_freq')
+            core_load = self.sampler.get('core_load')
+            if cpu_freq and cpu_freq['per_cpu_mhz']:
+                frequency = round(sum(cpu_freq['per_cpu_mhz']) / len(cpu_freq['per_cpu_mhz']))
+            else:
+                current = self.source.cpu_freq()
+                frequency = current.current if current else 'N/A'
             
             return {
-                'usage': cpu_percent,
-                'count': cpu_count,
-                'frequency': cpu_freq.current if cpu_freq else 'N/A',
-                'per_cpu': psutil.cpu_percent(interval=1, percpu=True)
+                'usage': cpu['usage'],
+                'count': self.source.cpu_count(),
+                'frequency': frequency,
+                'per_cpu': cpu['per_cpu'],
+                'saturated_cores': cpu['saturated_cores'],
+                'pinned_cores': cpu['pinned_cores'],
+                'imbalance': cpu['imbalance'],
+                'per_cpu_mhz': cpu_freq['per_cpu_mhz'] if cpu_freq else [],
+                'max_mhz': cpu_freq['max_mhz'] if cpu_freq else None,
+                'frequency_ratio': cpu_freq['ratio'] if cpu_freq else [],
+                'temperature': cpu_freq['temperature'] if cpu_freq else None,
+                'busiest_threads': core_load['cores'] if core_load else []
             }
         except Exception as e:
             return {'error': str(e)}
     
+    def get_pressure(self):
+        """Get pressure stall information, load averages and run-queue length"""
+        try:
+            return self.source.pressure()
+        except Exception as e:
+            return {'error': str(e)}
+    
     def get_memory_usage(self):
         """Get memory usage statistics"""
         try:
-            mem = psutil.virtual_memory()
-            swap = psutil.swap_memory()
+            mem = self.source.virtual_memory()
+            swap = self.source.swap_memory()
             
             return {
                 'total': self._bytes_to_gb(mem.total),
@@ -40,18 +88,39 @@ class SystemDiagnostics:
                 'percent': mem.percent,
                 'swap_total': self._bytes_to_gb(swap.total),
                 'swap_used': self._bytes_to_gb(swap.used),
-                'swap_percent': swap.percent
+                'swap_percent': swap.percent,
+                **self._memory_breakdown()
             }
         except Exception as e:
             return {'error': str(e)}
     
+    def _memory_breakdown(self):
+        """Where the memory went (Linux) and the paging rates from the sampler"""
+        result = {}
+        try:
+            details = self.source.memory_details(slab_top=Config.MEMORY_SLAB_TOP)
+        except Exception:
+            details = {'available': False}
+        if details.get('available'):
+            result['breakdown'] = {kind: self._bytes_to_gb(value) for kind, value in details['breakdown'].items()}
+            if details.get('slab_top') is not None:
+                result['slab_top'] = [
+                    {'name': cache['name'], 'mb': round(cache['bytes'] / (1024 ** 2), 1), 'objects': cache['objects']}
+                    for cache in details['slab_top']
+                ]
+        vmstat = self.sampler.get('vmstat')
+        if vmstat:
+            result['paging'] = dict(vmstat['rates'], oom_kills=vmstat['oom_kills'],
+                                    oom_kill_total=vmstat['oom_kill_total'])
+        return result
+    
     def get_disk_usage(self):
         """Get disk usage for all partitions"""
         try:
             disks = []
-            for partition in psutil.disk_partitions():
+            for partition in self.source.disk_partitions():
                 try:
-                    usage = psutil.disk_usage(partition.mountpoint)
+                    usage = self.source.disk_usage(partition.mountpoint)
                     disks.append({
                         'device': partition.device,
                         'mountpoint': partition.mountpoint,
@@ -67,11 +136,39 @@ class SystemDiagnostics:
         except Exception as e:
             return {'error': str(e)}
     
+    def get_disk_io(self):
+        """Get per-device IOPS, throughput, await and utilization mapped to mountpoints"""
+        try:
+            rates = self.sampler.get('disk_io')
+            if not rates:
+                return {'available': False}
+            
+            mountpoints = {}
+            for partition in self.source.disk_partitions():
+                device = os.path.basename(os.path.realpath(partition.device))
+                mountpoints.setdefault(device, []).append(partition.mountpoint)
+            
+            devices = []
+            for name, stats in rates['devices'].items():
+                active = stats['read_iops'] or stats['write_iops']
+                if name not in mountpoints and not active:
+                    continue
+                devices.append(dict(stats, device=name, mountpoints=mountpoints.get(name, [])))
+            
+            return {
+                'available': True,
+                'interval': rates['interval'],
+                'devices': devices
+            }
+        except Exception as e:
+            return {'error': str(e)}
+    
     def get_network_info(self):
         """Get network interfaces and statistics"""
         try:
-            net_io = psutil.net_io_counters()
-            interfaces = psutil.net_if_addrs()
+            net_io = self.source.net_io_counters()
+            # Interface addresses are skipped while degraded
+            interfaces = {} if self.is_degraded() else self.source.net_if_addrs()
             
             return {
                 'bytes_sent': self._bytes_to_gb(net_io.bytes_sent),
@@ -79,20 +176,32 @@ class SystemDiagnostics:
                 'packets_sent': net_io.packets_sent,
                 'packets_recv': net_io.packets_recv,
                 'interfaces': {name: [addr.address for addr in addrs] 
-                              for name, addrs in interfaces.items()}
+                              for name, addrs in interfaces.items()},
+                'rates': self.sampler.get('network'),
+                'connections': self.get_connection_states()
             }
         except Exception as e:
             return {'error': str(e)}
     
+    def get_connection_states(self):
+        """Count inet sockets by TCP state in one net_connections pass"""
+        try:
+            states = {}
+            for conn in self.source.net_connections(kind='inet'):
+                states[conn.status] = states.get(conn.status, 0) + 1
+            return {'available': True, 'states': states, 'total': sum(states.values())}
+        except psutil.AccessDenied:
+            return {'available': False, 'error': 'Access denied'}
+        except Exception as e:
+            return {'available': False, 'error': str(e)}
+    
     def get_top_processes(self, limit=10):
         """Get top CPU and memory consuming processes"""
         try:
-            processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-                try:
-                    processes.append(proc.info)
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
+            if self.is_degraded():
+                processes = self._candidate_processes()
+            else:
+                processes = [proc.info for proc in self._scan_processes()]
             
             # Sort by CPU usage
             processes_by_cpu = sorted(processes, key=lambda x: x['cpu_percent'] or 0, reverse=True)[:limit]
@@ -106,10 +215,95 @@ class SystemDiagnostics:
         except Exception as e:
             return {'error': str(e)}
     
+    def _scan_processes(self):
+        """One process_iter pass over every process"""
+        return list(self.source.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']))
+    
+    def _candidate_processes(self):
+        """
+        Degraded-mode process scan: re-read only the heaviest processes from the
+        last full scan, and rescan everything every DEGRADED_FULL_SCAN_INTERVAL
+        """
+        now = self.source.monotonic()
+        if self._candidates is None or now - self._candidates[0] >= Config.DEGRADED_FULL_SCAN_INTERVAL:
+            processes = self._scan_processes()
+            count = Config.DEGRADED_PROCESS_CANDIDATES
+            candidates = {}
+            for key in ('cpu_percent', 'memory_percent'):
+                for proc in heapq.nlargest(count, processes, key=lambda p: p.info[key] or 0):
+                    candidates[proc.pid] = proc
+            self._candidates = (now, list(candidates.values()))
+            return [proc.info for proc in processes]
+        
+        processes = []
+        alive = []
+        for proc in self._candidates[1]:
+            try:
+                with proc.oneshot():
+                    processes.append({
+                        'pid': proc.pid,
+                        'name': proc.name(),
+                        'cpu_percent': proc.cpu_percent(),
+                        'memory_percent': proc.memory_percent()
+                    })
+                alive.append(proc)
+            except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+                pass
+        self._candidates = (self._candidates[0], alive)
+        return processes
+    
+    def is_degraded(self):
+        """Whether SPTool is throttling itself because the host is struggling"""
+        return bool(self.governor and self.governor.update())
+    
+    def get_degraded_mode(self):
+        """Get the degraded-host mode status"""
+        if not self.governor:
+            return {'enabled': False, 'active': False}
+        self.governor.update()
+        return self.governor.status()
+    
+    def get_process_drilldown(self, sort_by='cpu_percent', limit=10):
+        """Get top processes by any drill-down metric with RSS/USS, I/O rates, FDs and threads"""
+        try:
+            return {
+                'sort_by': sort_by,
+                'processes': self.process_table.top(sort_by=sort_by, limit=limit)
+            }
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def get_process_details(self, pid):
+        """Get the full resource drill-down for a single process"""
+        try:
+            details = self.process_table.details(int(pid))
+            if details is None:
+                return {'error': 'Process not found'}
+            return details
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def get_leaks(self):
+        """Get processes whose RSS or open FDs have been growing steadily"""
+        if self.leak_detector is None:
+            return {'available': False}
+        try:
+            return self.leak_detector.suspects()
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def get_process_groups(self, by=None, limit=10):
+        """Get CPU, memory and I/O aggregated by process tree, systemd unit and cgroup"""
+        try:
+            groups = self.source.process_groups(limit=limit)
+            return groups[by] if by else groups
+        except Exception as e:
+            return {'error': str(e)}
+    
     def get_system_info(self):
         """Get general system information"""
         try:
-            boot_time = datetime.fromtimestamp(psutil.boot_time())
+            boot_time = datetime.fromtimestamp(self.source.boot_time())
             
             return {
                 'os': self.os_type,
@@ -117,7 +311,7 @@ class SystemDiagnostics:
                 'architecture': platform.machine(),
                 'hostname': platform.node(),
                 'boot_time': boot_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'uptime_hours': (datetime.now() - boot_time).total_seconds() / 3600
+                'uptime_hours': (datetime.fromtimestamp(self.source.time()) - boot_time).total_seconds() / 3600
             }
         except Exception as e:
             return {'error': str(e)}
@@ -128,7 +322,7 @@ class SystemDiagnostics:
             return {'available': False}
         
         try:
-            temps = psutil.sensors_temperatures()
+            temps = self.source.sensors_temperatures()
             if not temps:
                 return {'available': False}
             
@@ -162,16 +356,31 @@ class SystemDiagnostics:
     
     def get_full_diagnostic(self):
         """Get complete system diagnostic report"""
-        return {
-            'timestamp': datetime.now().isoformat(),
-            'system_info': self.get_system_info(),
-            'cpu': self.get_cpu_usage(),
-            'memory': self.get_memory_usage(),
-            'disk': self.get_disk_usage(),
-            'network': self.get_network_info(),
-            'processes': self.get_top_processes(),
-            'temperature': self.get_temperature()
-        }
+        sections = [
+            ('system_info', self.get_system_info),
+            ('cpu', self.get_cpu_usage),
+            ('memory', self.get_memory_usage),
+            ('pressure', self.get_pressure),
+            ('disk', self.get_disk_usage),
+            ('disk_io', self.get_disk_io),
+            ('network', self.get_network_info),
+            ('processes', self.get_top_processes),
+            ('process_groups', self.get_process_groups),
+            ('leaks', self.get_leaks),
+            ('temperature', self.get_temperature)
+        ]
+        
+        report = {'timestamp': datetime.fromtimestamp(self.source.time()).isoformat()}
+        skipped = self.governor.SKIPPED_SECTIONS if self.is_degraded() else ()
+        for name, collect in sections:
+            if name in skipped:
+                report[name] = {'available': False, 'skipped': 'degraded_mode'}
+                continue
+            with DIAGNOSTIC_SECTION_SECONDS.time(section=name):
+                report[name] = collect()
+        if self.governor:
+            report['degraded_mode'] = self.governor.status()
+        return report
     
     @staticmethod
     def _bytes_to_gb(bytes_value):
@@ -0,0 +1,314 @@
+"""
+Temp Cleanup Module
+In-process replacement for the find/del temp-file fixes. Candidate directories
+are scanned in parallel and filtered by age, size and name policies. The
+preview reports exactly which files and how many bytes would go. Deletion runs
+in batches with progress, and skips files that a process has open. Files are
+unlinked relative to directory descriptors opened without following symlinks,
+and only if they are still the inode that was scanned, so a path swapped for a
+symlink after the scan cannot redirect the deletion
+"""
+import errno
+import fnmatch
+import os
+import platform
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+DAY = 86400
+
+class TempCleaner:
+    def __init__(self, directories=None):
+        self.directories = list(directories or self._default_directories())
+        self.progress = {'state': 'idle'}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _default_directories():
+        if platform.system() == 'Windows':
+            return [tempfile.gettempdir()]
+        return list(Config.TEMP_CLEANUP_DIRS)
+
+    def preview(self):
+        """
+        Exactly what a cleanup would delete right now
+
+        Returns:
+            Dictionary with file and byte counts, what was skipped and why, and
+            the largest candidates
+        """
+        plan = self.plan()
+        candidates = plan.pop('candidates')
+        largest = sorted(candidates, key=lambda c: c[2], reverse=True)[:Config.TEMP_CLEANUP_PREVIEW_FILES]
+        plan['largest'] = [{'path': path, 'bytes': size} for _, path, size, _ in largest]
+        return plan
+
+    def plan(self):
+        """Scan the directories in parallel and apply the policies"""
+        started = time.monotonic()
+        now = time.time()
+        open_files = _open_files() if Config.TEMP_CLEANUP_SKIP_OPEN else set()
+        invoker = _invoking_uid()
+
+        roots = []
+        for directory in self.directories:
+            try:
+                roots.append((directory, os.lstat(directory).st_dev))
+            except OSError:
+                continue
+
+        # One task per top-level entry spreads large trees across the workers
+        tasks = []
+        for directory, device in roots:
+            tasks.append((directory, directory, device, False))
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False) and not self._excluded(entry):
+                            tasks.append((directory, entry.path, device, True))
+            except OSError:
+                continue
+
+        totals = {'excluded': 0, 'open': 0, 'recent': 0, 'foreign': 0}
+        candidates = []
+        with ThreadPoolExecutor(max_workers=Config.TEMP_CLEANUP_WORKERS) as pool:
+            for found, skipped in pool.map(lambda task: self._scan(*task, now, open_files, invoker), tasks):
+                candidates.extend(found)
+                for reason, count in skipped.items():
+                    totals[reason] += count
+
+        return {
+            'directories': [directory for directory, _ in roots],
+            'files': len(candidates),
+            'bytes': sum(size for _, _, size, _ in candidates),
+            'skipped_open': totals['open'],
+            'skipped_excluded': totals['excluded'],
+            'skipped_recent': totals['recent'],
+            'skipped_foreign': totals['foreign'],
+            'policy': {
+                'min_age_days': Config.TEMP_CLEANUP_MIN_AGE_DAYS,
+                'large_file_mb': Config.TEMP_CLEANUP_LARGE_FILE_MB,
+                'large_file_age_days': Config.TEMP_CLEANUP_LARGE_FILE_AGE_DAYS,
+                'exclude': list(Config.TEMP_CLEANUP_EXCLUDE)
+            },
+            'scan_seconds': round(time.monotonic() - started, 2),
+            'candidates': candidates
+        }
+
+    def _scan(self, root, top, device, recursive, now, open_files, invoker):
+        """
+        Files under `top` that the policies allow deleting; only its own files unless recursive
+
+        Returns (root, path, size, (st_dev, st_ino)) per file, the identity
+        deletion checks the file against, and the skip counts.
+        """
+        found = []
+        skipped = {'excluded': 0, 'open': 0, 'recent': 0, 'foreign': 0}
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            try:
+                owner = os.lstat(path).st_uid
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if st.st_dev != device:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    if recursive and not self._excluded(entry):
+                        stack.append(entry.path)
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                if self._excluded(entry):
+                    skipped['excluded'] += 1
+                elif not self._old_enough(st, now):
+                    skipped['recent'] += 1
+                elif not _owned(st, owner, invoker):
+                    skipped['foreign'] += 1
+                elif entry.path in open_files:
+                    skipped['open'] += 1
+                else:
+                    found.append((root, entry.path, st.st_size, (st.st_dev, st.st_ino)))
+        return found, skipped
+
+    @staticmethod
+    def _excluded(entry):
+        return any(fnmatch.fnmatch(entry.name, pattern) for pattern in Config.TEMP_CLEANUP_EXCLUDE)
+
+    @staticmethod
+    def _old_enough(st, now):
+        """Unused (neither read nor written) for the minimum age; large files sooner"""
+        idle = now - max(st.st_atime, st.st_mtime)
+        if idle >= Config.TEMP_CLEANUP_MIN_AGE_DAYS * DAY:
+            return True
+        return (st.st_size >= Config.TEMP_CLEANUP_LARGE_FILE_MB * 1024 * 1024
+                and idle >= Config.TEMP_CLEANUP_LARGE_FILE_AGE_DAYS * DAY)
+
+    def clean(self, progress=None):
+        """
+        Delete the planned files in batches of TEMP_CLEANUP_BATCH_SIZE
+
+        Each file is checked again just before it is removed, so a file that
+        was used, opened or replaced since the scan is kept. `progress` is called
+        after every batch with the current progress dictionary.
+
+        Returns:
+            Dictionary with deleted, failed and skipped counts and bytes freed
+        """
+        with self._lock:
+            if self.progress.get('state') in ('scanning', 'running'):
+                return {'success': False, 'error': 'A cleanup is already running'}
+            self.progress = {'state': 'scanning', 'started': time.time()}
+
+        try:
+            return self._clean(progress)
+        except Exception as e:
+            self.progress = dict(self.progress, state='error', error=str(e))
+            raise
+
+    def _clean(self, progress):
+        plan = self.plan()
+        candidates = plan.pop('candidates')
+        result = {'planned': len(candidates), 'deleted': 0, 'bytes_freed': 0, 'failed': 0, 'changed': 0,
+                  'skipped_open': plan['skipped_open'], 'skipped_excluded': plan['skipped_excluded']}
+        self.progress = dict(result, state='running', started=self.progress['started'])
+
+        now = time.time()
+        invoker = _invoking_uid()
+        batch_size = Config.TEMP_CLEANUP_BATCH_SIZE
+        for start in range(0, len(candidates), batch_size):
+            # Re-read per batch: a file opened since the scan is kept
+            open_files = _open_files() if Config.TEMP_CLEANUP_SKIP_OPEN else set()
+            directories = _DirectoryCache()
+            try:
+                for root, path, _, identity in candidates[start:start + batch_size]:
+                    if path in open_files:
+                        result['skipped_open'] += 1
+                        continue
+                    try:
+                        size = self._delete(directories, root, path, identity, now, invoker)
+                    except FileNotFoundError:
+                        size = None
+                    except OSError:
+                        result['failed'] += 1
+                        continue
+                    if size is None:
+                        result['changed'] += 1
+                    else:
+                        result['deleted'] += 1
+                        result['bytes_freed'] += size
+            finally:
+                directories.close()
+            self.progress = dict(result, state='running', started=self.progress['started'])
+            if progress is not None:
+                progress(self.progress)
+
+        result['success'] = True
+        self.progress = dict(result, state='done', started=self.progress['started'], finished=time.time())
+        return result
+
+    def _delete(self, directories, root, path, identity, now, invoker):
+        """Unlink one planned file if it is still the scanned inode; returns its size, or None if kept"""
+        if not _SAFE_UNLINK:
+            st = os.lstat(path)
+            if (not stat.S_ISREG(st.st_mode) or (st.st_dev, st.st_ino) != identity
+                    or not self._old_enough(st, now)):
+                return None
+            os.unlink(path)
+            return st.st_size
+
+        parent, name = os.path.split(os.path.relpath(path, root))
+        try:
+            dir_fd = directories.open(root, parent)
+        except OSError as e:
+            if e.errno in (errno.ELOOP, errno.ENOTDIR):
+                return None     # a directory on the way became a symlink or a file since the scan
+            raise
+        # fstatat right before unlinkat, both relative to the same pinned directory
+        st = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+        if (not stat.S_ISREG(st.st_mode) or (st.st_dev, st.st_ino) != identity
+                or not self._old_enough(st, now) or not _owned(st, os.fstat(dir_fd).st_uid, invoker)):
+            return None
+        os.unlink(name, dir_fd=dir_fd)
+        return st.st_size
+
+# dir_fd-relative stat and unlink exist on Linux and macOS, not on Windows
+_SAFE_UNLINK = os.unlink in os.supports_dir_fd and os.stat in os.supports_dir_fd and hasattr(os, 'O_NOFOLLOW')
+
+class _DirectoryCache:
+    """Directory descriptors under a root, opened one component at a time without following symlinks"""
+
+    def __init__(self):
+        self._fds = {}
+
+    def open(self, root, relative):
+        key = (root, relative)
+        fd = self._fds.get(key)
+        if fd is not None:
+            return fd
+        if relative in ('', os.curdir):
+            # The configured directory itself is trusted; everything below it is not
+            fd = os.open(root, os.O_RDONLY | os.O_DIRECTORY)
+        else:
+            parent, name = os.path.split(relative)
+            fd = os.open(name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=self.open(root, parent))
+        self._fds[key] = fd
+        return fd
+
+    def close(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+
+def _invoking_uid():
+    """The user behind the cleanup, also when it runs under sudo; None on Windows"""
+    if not hasattr(os, 'getuid'):
+        return None
+    return int(os.environ.get('SUDO_UID', os.getuid()))
+
+def _owned(st, directory_owner, invoker):
+    """Files of the directory's owner or of the invoking user; other users' files are left alone"""
+    return invoker is None or st.st_uid in (directory_owner, invoker)
+
+def _open_files():
+    """Paths held open by any process we can see, read in one pass over /proc/*/fd"""
+    paths = set()
+    try:
+        pids = [entry.name for entry in os.scandir('/proc') if entry.name.isdigit()]
+    except OSError:
+        return paths
+    for pid in pids:
+        fd_dir = f'/proc/{pid}/fd'
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(f'{fd_dir}/{fd}')
+            except OSError:
+                continue
+            if target.startswith('/'):
+                paths.add(target)
+    return paths
+
+_shared_cleaner = None
+_shared_lock = threading.Lock()
+
+def get_temp_cleaner():
+    """Return the process-wide cleaner, which holds the progress of the last run"""
+    global _shared_cleaner
+    with _shared_lock:
+        if _shared_cleaner is None:
+            _shared_cleaner = TempCleaner()
+        return _shared_cleaner
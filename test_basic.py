@@ -78,6 +78,13 @@ def test_system_diagnostics():
         else:
             print(f"⚠️  Memory data: {memory}")
         
+        # Test Pressure
+        pressure = diag.get_pressure()
+        if pressure.get('psi_available'):
+            print(f"✅ CPU pressure: {pressure['psi']['cpu']['some']['avg10']}%")
+        elif 'error' in pressure:
+            print(f"⚠️  Pressure data: {pressure}")
+        
         # Test System Info
         info = diag.get_system_info()
         if 'hostname' in info:
@@ -90,6 +97,386 @@ def test_system_diagnostics():
         print(f"❌ SystemDiagnostics test failed: {e}")
         return False
 
+def test_process_drilldown():
+    """Test per-process drill-down and rate tracking"""
+    print("\nTesting Process Drill-down...")
+    
+    try:
+        import os
+        from system_diagnostics import SystemDiagnostics
+        
+        diag = SystemDiagnostics()
+        
+        for sort_by in ('cpu_percent', 'rss_mb', 'num_threads'):
+            result = diag.get_process_drilldown(sort_by=sort_by, limit=5)
+            if 'error' in result or len(result['processes']) > 5:
+                print(f"❌ Drill-down by {sort_by} failed: {result}")
+                return False
+        print("✅ Drill-down sorted by cpu_percent, rss_mb, num_threads")
+        
+        # Second pass should produce rates from the incremental table
+        details = diag.get_process_details(os.getpid())
+        details = diag.get_process_details(os.getpid())
+        if 'error' in details or details.get('num_threads', 0) < 1:
+            print(f"❌ Process details failed: {details}")
+            return False
+        print(f"✅ Own process: {details['rss_mb']} MB RSS, {details['num_threads']} threads, {details['num_fds']} FDs")
+
+        # I/O is read only for a bounded pool, and the first call already ranks the writer first
+        from contextlib import nullcontext
+        from types import SimpleNamespace
+        from process_table import ProcessTable
+
+        class FakeProcess:
+            def __init__(self, pid):
+                self.pid = pid
+                self.writer = pid == 500
+            def oneshot(self):
+                return nullcontext()
+            def create_time(self):
+                return 1000.0
+            def name(self):
+                return f'proc{self.pid}'
+            def ppid(self):
+                return 1
+            def cpu_percent(self):
+                return 0.0
+            def memory_percent(self):
+                return 0.1
+            def memory_info(self):
+                return SimpleNamespace(rss=10 * 1024 ** 2)
+            def num_threads(self):
+                return 1
+            def num_ctx_switches(self):
+                return SimpleNamespace(voluntary=10 ** 6 if self.writer else self.pid, involuntary=0)
+            def io_counters(self):
+                io_reads.append(self.pid)
+                return SimpleNamespace(read_bytes=0, write_bytes=10 ** 9 if self.writer else self.pid)
+            def num_fds(self):
+                return 4
+
+        class FakeSource:
+            def pids(self):
+                return range(2, 1000)
+            def Process(self, pid):
+                return FakeProcess(pid)
+            def monotonic(self):
+                return 50.0
+            def time(self):
+                return 2000.0
+
+        io_reads = []
+        top = ProcessTable(source=FakeSource()).top('write_bps', limit=5)
+        bound = 5 * ProcessTable.CANDIDATE_FACTOR * len(ProcessTable.PROXIES['write_bps']) + 5
+        if len(io_reads) > bound or top[0]['pid'] != 500:
+            print(f"❌ I/O ranking read {len(io_reads)} counters (bound {bound}), top PID {top[0]['pid']}")
+            return False
+        print(f"✅ Top writer ranked first with {len(io_reads)} I/O reads for 998 processes")
+
+        return True
+    except Exception as e:
+        print(f"❌ Process drill-down test failed: {e}")
+        return False
+
+def test_process_groups():
+    """Test process tree / unit / cgroup aggregation"""
+    print("\nTesting Process Groups...")
+    
+    try:
+        from system_diagnostics import SystemDiagnostics
+        
+        diag = SystemDiagnostics()
+        groups = diag.get_process_groups()
+        if 'error' in groups:
+            print(f"❌ Process groups failed: {groups}")
+            return False
+        
+        for by, grouping in groups.items():
+            if grouping.get('available'):
+                print(f"✅ {by}: {grouping['total_groups']} groups")
+            else:
+                print(f"⚠️  {by}: not available on this OS")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Process groups test failed: {e}")
+        return False
+
+def test_metrics_sampler():
+    """Test background sampler rate computation"""
+    print("\nTesting MetricsSampler...")
+    
+    try:
+        from metrics_sampler import MetricsSampler
+        
+        sampler = MetricsSampler(interval=1)
+        sampler.sample_once()
+        sampler.sample_once()
+        
+        network = sampler.get('network')
+        if not network or 'interfaces' not in network:
+            print(f"❌ Network rates missing: {network}")
+            return False
+        print(f"✅ Network rates for {len(network['interfaces'])} interfaces")
+        
+        disk_io = sampler.get('disk_io')
+        if disk_io is None or 'devices' not in disk_io:
+            print(f"⚠️  Disk I/O rates not available: {disk_io}")
+        else:
+            print(f"✅ Disk I/O rates for {len(disk_io['devices'])} devices")
+
+        # A section whose compute raises is skipped; the others and the thread keep going
+        import logging
+        import time
+        calls = []
+        def broken(prev, current, elapsed):
+            calls.append(current)
+            raise KeyError('eth1')
+        sampler = MetricsSampler(interval=0.05)
+        sampler.sections.append(('broken', lambda: len(calls), broken))
+        logging.getLogger('metrics_sampler').disabled = True
+        sampler.start()
+        try:
+            time.sleep(0.3)
+            running = sampler.is_running()
+        finally:
+            sampler.stop()
+            logging.getLogger('metrics_sampler').disabled = False
+        if not running or len(calls) < 2 or sampler.get('broken') is not None:
+            print(f"❌ Failing compute stopped the sampler ({len(calls)} computes)")
+            return False
+        # The failed sample is still the baseline for the next one
+        if sampler._prev['broken'][1] != len(calls) - 1 or sampler.get('memory') is None:
+            print(f"❌ Baseline or other sections not updated: {sampler._prev['broken']}")
+            return False
+        print(f"✅ Sampler survived {len(calls)} failing computes")
+
+        return True
+    except Exception as e:
+        print(f"❌ MetricsSampler test failed: {e}")
+        return False
+
+def test_degraded_mode():
+    """Test that degraded-host mode throttles scans and skips expensive sections"""
+    print("\nTesting Degraded Mode...")
+    
+    from config import Config
+    saved = (Config.DEGRADED_SELF_RSS_MB, Config.DEGRADED_SELF_CPU_PERCENT, Config.DEGRADED_NICE)
+    try:
+        import psutil
+        from system_diagnostics import SystemDiagnostics
+        
+        diagnostics = SystemDiagnostics()
+        if diagnostics.get_degraded_mode()['active']:
+            print("⚠️  Host is already degraded; skipping")
+            return True
+        
+        # Any RSS trips the limit; keep the current niceness so the test run isn't reniced
+        Config.DEGRADED_SELF_RSS_MB = 1
+        Config.DEGRADED_NICE = psutil.Process().nice()
+        diagnostics.governor.update(force=True)
+        
+        report = diagnostics.get_full_diagnostic()
+        if not report['degraded_mode']['active'] or report['temperature'].get('skipped') != 'degraded_mode':
+            print(f"❌ Degraded mode not applied: {report['degraded_mode']}")
+            return False
+        top = diagnostics.get_top_processes(limit=5)
+        if 'error' in top or not diagnostics._candidates:
+            print(f"❌ Candidate scan failed: {top}")
+            return False
+        print(f"✅ Degraded: {report['degraded_mode']['reasons']}, "
+              f"{len(diagnostics._candidates[1])} candidate processes")
+        
+        # The test itself has just been busy, so ignore SPTool's own CPU when clearing
+        Config.DEGRADED_SELF_RSS_MB = saved[0]
+        Config.DEGRADED_SELF_CPU_PERCENT = 10000
+        if diagnostics.governor.update(force=True):
+            print(f"❌ Degraded mode did not clear: {diagnostics.governor.signals}")
+            return False
+        print("✅ Degraded mode cleared")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Degraded mode test failed: {e}")
+        return False
+    finally:
+        Config.DEGRADED_SELF_RSS_MB, Config.DEGRADED_SELF_CPU_PERCENT, Config.DEGRADED_NICE = saved
+
+def test_disk_usage():
+    """Test the parallel disk-usage analyzer and its incremental re-scan"""
+    print("\nTesting Disk Usage Analyzer...")
+    
+    try:
+        import os
+        import tempfile
+        from disk_usage import DiskUsageAnalyzer
+        from config import Config
+        
+        root = tempfile.mkdtemp()
+        for top in range(3):
+            for sub in range(4):
+                path = os.path.join(root, f'dir{top}', f'sub{sub}')
+                os.makedirs(path)
+                for n in range(5):
+                    with open(os.path.join(path, f'f{n}'), 'wb') as f:
+                        f.write(b'x' * 4096 * (top + 1))
+        big = os.path.join(root, 'dir2', 'sub3', 'big.bin')
+        original_large = Config.DISK_USAGE_LARGE_FILE_MB
+        Config.DISK_USAGE_LARGE_FILE_MB = 1
+        try:
+            with open(big, 'wb') as f:
+                f.write(os.urandom(2 * 1024 * 1024))
+            
+            analyzer = DiskUsageAnalyzer(workers=4)
+            report = analyzer.scan(root)
+            if report['total_files'] != 61 or report['directories'] != 16:
+                print(f"❌ Unexpected totals: {report['total_files']} files, {report['directories']} dirs")
+                return False
+            if report['largest_files'][0]['path'] != big:
+                print(f"❌ Largest file not found: {report['largest_files'][:1]}")
+                return False
+            if report['tree']['children'][0]['path'] != os.path.join(root, 'dir2'):
+                print(f"❌ Tree not ordered by size: {report['tree']['children'][0]}")
+                return False
+            print(f"✅ Scanned {report['directories']} dirs / {report['total_files']} files; "
+                  f"largest: {os.path.basename(report['largest_files'][0]['path'])}")
+            
+            os.remove(big)
+            report = analyzer.scan(root)
+            if report['directories_listed'] != 1 or report['total_files'] != 60 or report['largest_files']:
+                print(f"❌ Re-scan listed {report['directories_listed']} dirs, {report['total_files']} files")
+                return False
+            print(f"✅ Re-scan listed 1 changed directory, reused {report['directories_reused']}")
+            
+            fresh = DiskUsageAnalyzer(workers=4)
+            deferred = fresh.analyze(root, defer=True)
+            if deferred.get('status') != 'deferred' or fresh._scanning:
+                print(f"❌ Deferred analysis started a scan: {deferred}")
+                return False
+            print("✅ Deferred analysis (degraded mode) started no scan")
+
+            # Concurrent wait=True callers share the scan that is already running
+            import threading
+            from disk_usage import _Dir
+            scans = []
+            scan = fresh.scan
+            fresh.scan = lambda mountpoint: scans.append(mountpoint) or scan(mountpoint)
+            reports = []
+            waiters = [threading.Thread(target=lambda: reports.append(fresh.analyze(root, wait=True)))
+                       for _ in range(4)]
+            for waiter in waiters:
+                waiter.start()
+            for waiter in waiters:
+                waiter.join()
+            if len(scans) != 1 or len(reports) != 4 or any(r is not reports[0] for r in reports):
+                print(f"❌ {len(scans)} scans for 4 waiting callers")
+                return False
+            print("✅ 4 waiting callers shared one scan")
+
+            # A worker hitting something other than OSError must not hang the walk
+            broken = {root: _Dir(os.stat(root).st_mtime_ns, 0, 0, None, ())}
+            walk = threading.Thread(target=fresh._walk, args=(root, os.stat(root), broken), daemon=True)
+            walk.start()
+            walk.join(timeout=5)
+            if walk.is_alive():
+                print("❌ Walk hung after a worker error")
+                return False
+            print("✅ Walk finished after a worker error")
+
+            import app as sptool_app
+            response = sptool_app.app.test_client().get('/api/system/disk-usage?mountpoint=' + root)
+            if response.status_code != 400:
+                print(f"❌ Unmounted path accepted: {response.status_code}")
+                return False
+            print("✅ /api/system/disk-usage rejects paths that are not mountpoints")
+        finally:
+            Config.DISK_USAGE_LARGE_FILE_MB = original_large
+        
+        return True
+    except Exception as e:
+        print(f"❌ Disk usage test failed: {e}")
+        return False
+
+def test_temp_cleanup():
+    """Test the native temp cleanup preview, policies and batched deletion"""
+    print("\nTesting Temp Cleanup...")
+    
+    try:
+        import os
+        import tempfile
+        import time
+        from config import Config
+        from temp_cleanup import TempCleaner
+        
+        root = tempfile.mkdtemp()
+        old = time.time() - 30 * 86400
+        expected_bytes = 0
+        for sub in ('a', 'b', os.path.join('b', 'c')):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+            for n in range(3):
+                path = os.path.join(root, sub, f'old{n}.tmp')
+                with open(path, 'wb') as f:
+                    f.write(b'x' * 1000)
+                os.utime(path, (old, old))
+                expected_bytes += 1000
+        with open(os.path.join(root, 'fresh.tmp'), 'wb') as f:
+            f.write(b'new')
+        lock = os.path.join(root, 'app.lock')
+        open(lock, 'w').close()
+        os.utime(lock, (old, old))
+        held = os.path.join(root, 'a', 'held.tmp')
+        handle = open(held, 'w')
+        os.utime(held, (old, old))
+        
+        original_batch = Config.TEMP_CLEANUP_BATCH_SIZE
+        Config.TEMP_CLEANUP_BATCH_SIZE = 4
+        try:
+            cleaner = TempCleaner(directories=[root])
+            preview = cleaner.preview()
+            if preview['files'] != 9 or preview['bytes'] != expected_bytes or preview['skipped_excluded'] != 1:
+                print(f"❌ Unexpected preview: {preview}")
+                return False
+            if os.name == 'posix' and preview['skipped_open'] != 1:
+                print(f"❌ Open file not skipped: {preview}")
+                return False
+            print(f"✅ Preview: {preview['files']} files, {preview['bytes']} bytes "
+                  f"(skipped {preview['skipped_recent']} recent, {preview['skipped_open']} open)")
+            
+            updates = []
+            result = cleaner.clean(progress=updates.append)
+            remaining = sorted(name for _, _, names in os.walk(root) for name in names)
+            if result['deleted'] != 9 or len(updates) != 3 or remaining != ['app.lock', 'fresh.tmp', 'held.tmp']:
+                print(f"❌ Cleanup result {result}, {len(updates)} updates, left {remaining}")
+                return False
+            print(f"✅ Deleted {result['deleted']} files in {len(updates)} batches; "
+                  f"state {cleaner.progress['state']}")
+            
+            if os.name == 'posix':
+                # Swap a scanned directory for a symlink between the scan and the deletion
+                outside = tempfile.mkdtemp()
+                for directory in (os.path.join(root, 'd'), outside):
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, 'victim.tmp')
+                    open(path, 'w').close()
+                    os.utime(path, (old, old))
+                stale = cleaner.plan()
+                os.rename(os.path.join(root, 'd'), os.path.join(root, 'd.moved'))
+                os.symlink(outside, os.path.join(root, 'd'))
+                cleaner.plan = lambda: dict(stale, candidates=list(stale['candidates']))
+                result = cleaner.clean()
+                if not os.path.exists(os.path.join(outside, 'victim.tmp')) or result['deleted'] != 0:
+                    print(f"❌ Deletion followed a swapped-in symlink: {result}")
+                    return False
+                print(f"✅ File behind a swapped-in symlink kept ({result['changed']} changed)")
+        finally:
+            Config.TEMP_CLEANUP_BATCH_SIZE = original_batch
+            handle.close()
+        
+        return True
+    except Exception as e:
+        print(f"❌ Temp cleanup test failed: {e}")
+        return False
+
 def test_command_executor():
     """Test command executor functionality"""
     print("\nTesting CommandExecutor...")
@@ -115,12 +502,515 @@ def test_command_executor():
                 print(f"✅ Dry run successful for: {test_fix}")
             else:
                 print(f"⚠️  Dry run result: {result}")
+
+        # init, SPTool itself and non-numeric PIDs are refused even in a dry run
+        import os
+        import subprocess
+        import sys
+        for pid in (1, os.getpid(), '1; true'):
+            result = executor.execute_fix('kill_process', params={'pid': pid}, dry_run=True)
+            if result['success']:
+                print(f"❌ kill_process accepted protected PID {pid!r}: {result}")
+                return False
+        child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+        try:
+            result = executor.execute_fix('kill_process', params={'pid': str(child.pid)}, dry_run=True)
+            if not result['success'] or str(child.pid) not in result['command']:
+                print(f"❌ kill_process refused an ordinary process: {result}")
+                return False
+        finally:
+            child.kill()
+            child.wait()
+        print(f"✅ Protected PIDs refused ({executor.validate_pid(1)['error']}), ordinary PID accepted")
+
+        if executor.os_type == 'Linux':
+            import time
+            from capabilities import CapabilityProbe
+            
+            # Pretend df is not installed: check_disk must leave the catalog and fail fast
+            probe = CapabilityProbe().probe()
+            probe._which['df'] = None
+            executor.capabilities = probe
+            executor.whitelisted_commands, executor.unavailable = executor._compile_catalog(
+                executor._get_whitelisted_commands())
+            if any(fix['id'] == 'check_disk' for fix in executor.get_available_fixes()):
+                print("❌ check_disk offered without df")
+                return False
+            started = time.perf_counter()
+            result = executor.execute_fix('check_disk')
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if result['success'] or 'df' not in result['error'] or elapsed_ms > 50:
+                print(f"❌ Unrunnable fix not rejected quickly: {result} ({elapsed_ms:.1f} ms)")
+                return False
+            print(f"✅ Unrunnable fix rejected in {elapsed_ms:.2f} ms: {result['error']}")
         
         return True
     except Exception as e:
         print(f"❌ CommandExecutor test failed: {e}")
         return False
 
+def test_audit_log():
+    """Test queued, structured audit records"""
+    print("\nTesting AuditLog...")
+    
+    try:
+        import os
+        import tempfile
+        from audit_log import AuditLog
+        
+        path = os.path.join(tempfile.mkdtemp(), 'audit.db')
+        audit = AuditLog(path=path)
+        audit.start()
+        audit.record('check_disk', 'dry_run', command='df -h', dry_run=True)
+        audit.record('free_memory', 'success', command='free -h', returncode=0)
+        
+        records = audit.query(outcome='success')
+        audit.stop()
+        if len(records) != 1 or records[0]['fix_id'] != 'free_memory':
+            print(f"❌ Audit query returned: {records}")
+            return False
+        print("✅ Audit records written and queried by outcome")
+
+        # A failed roll-over leaves the writer running and the records in the current file
+        import threading
+        import time
+        path = os.path.join(tempfile.mkdtemp(), 'audit.db')
+        os.mkdir(path + '.1')
+        audit = AuditLog(path=path, max_bytes=1, backup_count=1)
+        audit.start()
+        for n in range(3):
+            audit.record('check_disk', 'success', returncode=n)
+            audit.flush()
+        records = audit.query(fix_id='check_disk')
+        alive = audit._thread.is_alive()
+        audit.stop()
+        if not alive or audit.rotation_errors < 3 or len(records) != 3 or audit.dropped:
+            print(f"❌ Failed rotation: writer alive {alive}, {audit.rotation_errors} errors, {len(records)} records")
+            return False
+        print(f"✅ Writer survived {audit.rotation_errors} failed rotations without losing records")
+
+        # A stuck writer does not hold a query for long
+        audit = AuditLog(path=os.path.join(tempfile.mkdtemp(), 'audit.db'))
+        stuck = threading.Event()
+        audit._thread = threading.Thread(target=stuck.wait, daemon=True)
+        audit._thread.start()
+        audit.record('check_disk', 'success')
+        started = time.monotonic()
+        audit.query()
+        elapsed = time.monotonic() - started
+        stuck.set()
+        if elapsed > 1 or audit.pending() != 1:
+            print(f"❌ Query waited {elapsed:.1f}s, {audit.pending()} pending")
+            return False
+        print(f"✅ Query returned after {elapsed:.1f}s with 1 record pending")
+
+        return True
+    except Exception as e:
+        print(f"❌ AuditLog test failed: {e}")
+        return False
+
+def test_fix_impact():
+    """Test before/after fix impact, its audit annotation and fix ranking"""
+    print("\nTesting Fix Impact...")
+    
+    try:
+        import os
+        import tempfile
+        from audit_log import AuditLog
+        from fix_impact import FixImpactTracker
+        
+        class StubSampler:
+            interval = 0
+            slowdown = 1
+            
+            def __init__(self):
+                self.memory = {'available': 2 * 1024 ** 3, 'percent': 90.0, 'swap_percent': 40.0}
+                self.cpu = {'usage': 95.0}
+            
+            def get(self, section):
+                return {'memory': self.memory, 'cpu': self.cpu}.get(section)
+        
+        audit = AuditLog(path=os.path.join(tempfile.mkdtemp(), 'audit.db'))
+        audit.start()
+        sampler = StubSampler()
+        tracker = FixImpactTracker(sampler=sampler, audit=audit)
+        
+        before = tracker.snapshot('clear_cache')
+        key = audit.record('clear_cache', 'success', command='sync', returncode=0)
+        sampler.memory = {'available': 3 * 1024 ** 3, 'percent': 70.0, 'swap_percent': 40.0}
+        impact = tracker.measure('clear_cache', before, key)
+        if not impact['improved'] or impact['metrics']['memory_percent']['delta'] != -20.0:
+            print(f"❌ Unexpected impact: {impact}")
+            return False
+        if impact['metrics']['swap_percent']['improved']:
+            print("❌ Unchanged metric reported as improved")
+            return False
+        
+        record = audit.query(fix_id='clear_cache')[0]
+        if record.get('impact', {}).get('metrics', {}).get('memory_available', {}).get('delta') != 1024 ** 3:
+            print(f"❌ Impact not stored with the audit record: {record}")
+            return False
+        runs = tracker.effectiveness()['clear_cache']['runs']
+        if runs != 1:
+            print(f"❌ Impact measured before the first score counted {runs} times")
+            return False
+        print("✅ clear_cache impact measured, added to its audit record and counted once")
+        
+        before = tracker.snapshot('kill_process')
+        tracker.measure('kill_process', before)
+        ranked = tracker.rank([{'fix_id': 'kill_process'}, {'fix_id': 'clear_cache'}, {'fix_id': 'unmeasured'}])
+        if [fix['fix_id'] for fix in ranked] != ['clear_cache', 'unmeasured', 'kill_process']:
+            print(f"❌ Unexpected ranking: {ranked}")
+            return False
+        
+        reloaded = FixImpactTracker(sampler=sampler, audit=audit).effectiveness()
+        if reloaded.get('clear_cache', {}).get('improved') != 1:
+            print(f"❌ Effectiveness not seeded from the audit log: {reloaded}")
+            return False
+        audit.stop()
+        print(f"✅ Fixes ranked by effectiveness: {[(f['fix_id'], f['effectiveness']) for f in ranked]}")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Fix impact test failed: {e}")
+        return False
+
+def test_memory_breakdown():
+    """Test /proc memory parsing and the clear_cache gate"""
+    print("\nTesting Memory Breakdown...")
+    
+    try:
+        import platform
+        from memory_info import MemoryInfoReader
+        from issue_diagnosis import IssueDiagnoser
+        
+        if platform.system() == 'Linux':
+            reader = MemoryInfoReader()
+            details = reader.read()
+            counters = reader.read_vmstat()
+            reader.close()
+            if not details['available'] or details['breakdown']['total'] <= 0 or 'pgfault' not in counters:
+                print(f"❌ /proc/meminfo or /proc/vmstat not parsed: {details}")
+                return False
+            print(f"✅ Breakdown read: {details['breakdown']['droppable'] // (1024 * 1024)} MB droppable, "
+                  f"slab caches {'listed' if details['slab_top'] is not None else 'not readable'}")
+        
+        diagnoser = IssueDiagnoser()
+        breakdown = {'total': 16.0, 'anon': 13.0, 'shmem': 0.1, 'page_cache': 2.0, 'slab_reclaimable': 0.2,
+                     'slab_unreclaimable': 0.1, 'hugepages': 0.0, 'droppable': 2.1}
+        quiet = {'swap_in': 0.0, 'swap_out': 0.0, 'allocation_stalls': 0.0, 'scan_direct': 0.0,
+                 'file_refaults': 0.0, 'oom_kills': 0, 'oom_kill_total': 0}
+        
+        def fixes(memory_data):
+            issues = diagnoser._check_memory(dict({'percent': 90.0, 'swap_percent': 0}, **memory_data))
+            return issues, [fix['fix_id'] for issue in issues for fix in issue['suggested_fixes']]
+        
+        issues, fix_ids = fixes({'breakdown': breakdown, 'paging': quiet})
+        if 'clear_cache' in fix_ids or issues[0]['severity'] != 'low':
+            print(f"❌ Cache drop suggested, or idle high usage not low severity: {issues}")
+            return False
+        if issues[0]['metrics']['largest_consumer'] != 'processes':
+            print("❌ Anonymous memory not reported as the largest consumer")
+            return False
+        
+        stalled = dict(quiet, allocation_stalls=40.0)
+        issues, fix_ids = fixes({'breakdown': breakdown, 'paging': stalled})
+        if 'clear_cache' not in fix_ids or issues[0]['severity'] != 'high':
+            print(f"❌ Direct reclaim with a cold cache should suggest clear_cache: {issues}")
+            return False
+        _, fix_ids = fixes({'breakdown': breakdown, 'paging': dict(stalled, file_refaults=5000.0)})
+        if 'clear_cache' in fix_ids:
+            print("❌ clear_cache suggested while the page cache is being refaulted")
+            return False
+        _, fix_ids = fixes({'breakdown': dict(breakdown, slab_reclaimable=4.0, droppable=5.9), 'paging': quiet})
+        if 'clear_cache' not in fix_ids:
+            print("❌ Large reclaimable slab should suggest clear_cache")
+            return False
+        print("✅ clear_cache only suggested for reclaim stalls on a cold cache or bloated slab")
+        
+        issues, _ = fixes({'percent': 50.0, 'breakdown': breakdown, 'paging': dict(quiet, oom_kills=2, swap_in=500.0)})
+        titles = {issue['title'] for issue in issues}
+        if titles != {'OOM Kills', 'Swap Thrashing'}:
+            print(f"❌ Expected OOM Kills and Swap Thrashing, got {titles}")
+            return False
+        print("✅ OOM kills and swap thrashing reported from vmstat rates")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Memory breakdown test failed: {e}")
+        return False
+
+def test_cpu_cores():
+    """Test pinned-core detection, thread-to-core mapping and throttling checks"""
+    print("\nTesting Per-core CPU Analysis...")
+    
+    child = None
+    try:
+        import subprocess
+        import sys
+        import time
+        from collections import namedtuple
+        from metrics_sampler import MetricsSampler
+        from issue_diagnosis import IssueDiagnoser
+        
+        times = namedtuple('times', 'user system idle')
+        sampler = MetricsSampler()
+        quiet = [times(0, 0, 0)] * 4
+        for step in range(1, 4):
+            # Core 2 is busy for the whole interval, the others mostly idle
+            busy = [times(step, 0, step * 9) for _ in range(4)]
+            busy[2] = times(step * 10, 0, 0)
+            cpu = sampler._compute_cpu(quiet, busy, 1.0)
+            quiet = busy
+        if cpu['pinned_cores'] != [2] or cpu['imbalance'] < 80:
+            print(f"❌ Pinned core not detected: {cpu}")
+            return False
+        print(f"✅ Core 2 pinned, imbalance {cpu['imbalance']} points")
+        
+        child = subprocess.Popen([sys.executable, '-c', 'while True: pass'])
+        time.sleep(0.2)
+        cores = list(range(len(sampler.source.cpu_times(percpu=True))))
+        sampler._latest['cpu'] = {'saturated_cores': cores}
+        for _ in range(3):
+            sampler.sample_once()
+            sampler._latest['cpu'] = {'saturated_cores': cores}
+            time.sleep(0.3)
+        load = sampler.get('core_load')
+        threads = [thread for core in load['cores'] for thread in core['threads']]
+        if not any(thread['pid'] == child.pid and thread['tid'] == child.pid for thread in threads):
+            print(f"❌ Busy child thread not mapped to a core: {load}")
+            return False
+        print(f"✅ Busy thread mapped to core(s) {[c['core'] for c in load['cores'] if c['threads']]}")
+        
+        diagnoser = IssueDiagnoser()
+        issues = diagnoser._check_cpu_cores({
+            'usage': 30.0, 'per_cpu': [100.0, 5.0, 5.0, 5.0], 'pinned_cores': [0], 'imbalance': 95.0,
+            'busiest_threads': [{'core': 0, 'threads': [{'tid': 42, 'pid': 42, 'name': 'worker',
+                                                         'cpu_percent': 99.0}]}],
+            'frequency_ratio': [0.4], 'per_cpu_mhz': [1200], 'max_mhz': 3000, 'temperature': 95.0
+        })
+        titles = {issue['title']: issue for issue in issues}
+        if 'Single-Core Saturation' not in titles or 'CPU Throttling' not in titles:
+            print(f"❌ Expected saturation and throttling issues, got {list(titles)}")
+            return False
+        if titles['Single-Core Saturation']['suggested_fixes'][0]['default_params'] != {'pid': 42}:
+            print("❌ Saturation issue does not point at the busiest thread's process")
+            return False
+        if titles['CPU Throttling']['metrics']['cause'] != 'thermal':
+            print("❌ Hot throttled core not reported as thermal")
+            return False
+        print("✅ Single-Core Saturation and thermal CPU Throttling issues raised")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Per-core CPU test failed: {e}")
+        return False
+    finally:
+        if child and child.poll() is None:
+            child.kill()
+            child.wait()
+
+def test_remediation():
+    """Test policy validation, confirmations, cooldowns, budgets and shadow-mode audit records"""
+    print("\nTesting Auto-remediation...")
+    
+    try:
+        import os
+        import tempfile
+        from audit_log import AuditLog
+        from command_executor import CommandExecutor
+        from remediation import RemediationEngine
+        
+        executor = CommandExecutor()
+        path = os.path.join(tempfile.mkdtemp(), 'audit.db')
+        executor.audit = AuditLog(path=path)
+        fix_id = next(fix for fix, info in executor.whitelisted_commands.items()
+                      if info['risk'] == 'none' and not info.get('parameterized'))
+        policies = [
+            {'name': 'tmp', 'category': 'disk', 'title': 'Low Disk Space on *', 'fix_id': fix_id,
+             'confirmations': 2, 'cooldown': 3600, 'max_per_hour': 1},
+            {'name': 'killer', 'title': 'High CPU Process: *', 'fix_id': 'kill_process'},
+        ]
+        engine = RemediationEngine(diagnose=None, executor=executor, policies=policies, shadow=True)
+        if [p['name'] for p in engine.policies] != ['tmp'] or engine.rejected[0]['name'] != 'killer':
+            print(f"❌ High-risk or parameterized policy not rejected: {engine.rejected}")
+            return False
+        print(f"✅ Policy for {fix_id} accepted, kill_process policy rejected ({engine.rejected[0]['reason']})")
+        
+        issues = [{'category': 'disk', 'title': 'Low Disk Space on /tmp', 'severity': 'high'}]
+        decisions = [engine.evaluate(issues) for _ in range(3)]
+        kinds = [[d['decision'] for d in batch] for batch in decisions]
+        if kinds != [['confirming'], ['shadow'], ['cooldown']]:
+            print(f"❌ Unexpected decisions: {kinds}")
+            return False
+        if engine.evaluate(issues) or engine.evaluate([]) or engine.status()['runs_last_hour'] != 1:
+            print("❌ Repeated suppressions recorded, or runs not counted")
+            return False
+        print("✅ Confirmed, ran once in shadow mode, then held by the cooldown")
+        
+        records = executor.audit.query(fix_id=fix_id)
+        if not records or records[0].get('trigger') != 'policy:tmp' or not records[0]['dry_run']:
+            print(f"❌ Shadow run not audited with its trigger: {records}")
+            return False
+        print("✅ Shadow run audited as a dry run with trigger policy:tmp")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Auto-remediation test failed: {e}")
+        return False
+
+def test_alerts():
+    """Test deduplication, batching, grouping and webhook retries against a local HTTP stub"""
+    print("\nTesting Alert Dispatcher...")
+    
+    server = None
+    try:
+        import json
+        import os
+        import tempfile
+        import threading
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from config import Config
+        from alerts import AlertDispatcher, WebhookSink, FileSink
+        
+        received = []
+        attempts = []
+        class Stub(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                attempts.append(body)
+                # Fail the first attempt so delivery has to retry
+                status = 500 if len(attempts) == 1 else 200
+                if status == 200:
+                    received.append(body)
+                self.send_response(status)
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        server = HTTPServer(('127.0.0.1', 0), Stub)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        path = os.path.join(tempfile.mkdtemp(), 'alerts.jsonl')
+        original = Config.ALERT_RETRY_BACKOFF
+        Config.ALERT_RETRY_BACKOFF = 0.01
+        try:
+            dispatcher = AlertDispatcher([WebhookSink(f'http://127.0.0.1:{server.server_port}/hook'),
+                                          FileSink(path)], batch_window=0.3)
+            dispatcher.start()
+            flood = [{'category': 'disk' if i % 2 else 'network', 'title': f'Issue {i}', 'severity': 'high'}
+                     for i in range(150)]
+            for _ in range(5):
+                dispatcher.submit(flood + [{'category': 'cpu', 'title': 'Minor', 'severity': 'low'},
+                                           {'category': 'custom', 'title': 'Unranked', 'severity': 'critical'}])
+            dispatcher.flush()
+        finally:
+            Config.ALERT_RETRY_BACKOFF = original
+        
+        if len(received) != 1 or len(received[0]['alerts']) != 150 or len(attempts) != 2:
+            print(f"❌ Expected one grouped notification of 150 alerts after a retry, got {len(received)} "
+                  f"notifications in {len(attempts)} attempts")
+            return False
+        groups = {(g['category'], g['count']) for g in received[0]['groups']}
+        if groups != {('disk', 75), ('network', 75)}:
+            print(f"❌ Unexpected groups: {received[0]['groups']}")
+            return False
+        print("✅ 5 diagnoses of 150 issues -> 1 grouped notification, delivered after one retry")
+        
+        for _ in range(Config.ALERT_RESOLVE_AFTER):
+            dispatcher.submit(flood[1:])
+        dispatcher.flush()
+        dispatcher.stop()
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        resolved = [a for line in lines for a in line['alerts'] if a['state'] == 'resolved']
+        if len(lines) != 2 or [a['title'] for a in resolved] != ['Issue 0']:
+            print(f"❌ Expected one resolved alert in a second file notification, got {resolved}")
+            return False
+        print(f"✅ Missing issue resolved after {Config.ALERT_RESOLVE_AFTER} diagnoses; file sink has both batches")
+        
+        original = Config.ALERT_MIN_SEVERITY
+        Config.ALERT_MIN_SEVERITY = 'Medium'
+        try:
+            AlertDispatcher([])
+            print("❌ Mistyped ALERT_MIN_SEVERITY accepted")
+            return False
+        except ValueError as e:
+            print(f"✅ Mistyped ALERT_MIN_SEVERITY rejected: {e}")
+        finally:
+            Config.ALERT_MIN_SEVERITY = original
+        
+        return True
+    except Exception as e:
+        print(f"❌ Alert dispatcher test failed: {e}")
+        return False
+    finally:
+        if server:
+            server.shutdown()
+
+def test_leak_detector():
+    """Test RSS and FD slope tracking against a deliberately leaking child process"""
+    print("\nTesting Leak Detector...")
+    
+    child = None
+    try:
+        import subprocess
+        import sys
+        import time
+        from config import Config
+        from leak_detector import LeakDetector
+        
+        leaker = (
+            "import time, os\n"
+            "hold = []\n"
+            "while True:\n"
+            "    hold.append(bytearray(4 * 1024 * 1024))\n"
+            "    hold.append(open(os.devnull))\n"
+            "    time.sleep(0.05)\n"
+        )
+        child = subprocess.Popen([sys.executable, '-c', leaker])
+        original = Config.LEAK_MIN_SAMPLES
+        Config.LEAK_MIN_SAMPLES = 8
+        try:
+            detector = LeakDetector()
+            for _ in range(10):
+                detector.sample()
+                time.sleep(0.1)
+            result = detector.suspects()
+        finally:
+            Config.LEAK_MIN_SAMPLES = original
+        
+        kinds = {leak['kind'] for leak in result['leaks'] if leak['pid'] == child.pid}
+        if kinds != {'memory', 'fd'}:
+            print(f"❌ Leaking child not detected: {result['leaks']}")
+            return False
+        memory = next(leak for leak in result['leaks'] if leak['pid'] == child.pid and leak['kind'] == 'memory')
+        print(f"✅ Memory leak: {memory['growth_per_hour']} MB/h, exhaustion in {memory['hours_to_exhaustion']} h "
+              f"(tracking {result['tracked']} processes)")
+        
+        from issue_diagnosis import IssueDiagnoser
+        issues = IssueDiagnoser()._check_leaks(result)
+        if not any(issue['title'].startswith('Probable Memory Leak') for issue in issues):
+            print("❌ No probable-leak issue raised")
+            return False
+        
+        child.kill()
+        child.wait()
+        detector.sample()
+        if child.pid in detector._history:
+            print("❌ History of exited process not evicted")
+            return False
+        print("✅ Probable-leak issues raised; exited process evicted")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Leak detector test failed: {e}")
+        return False
+    finally:
+        if child and child.poll() is None:
+            child.kill()
+            child.wait()
+
 def test_issue_diagnosis():
     """Test issue diagnosis functionality"""
     print("\nTesting IssueDiagnoser...")
@@ -143,6 +1033,469 @@ def test_issue_diagnosis():
         print(f"❌ IssueDiagnoser test failed: {e}")
         return False
 
+def test_instrumentation():
+    """Test Prometheus text rendering"""
+    print("\nTesting Instrumentation...")
+    
+    try:
+        from instrumentation import Registry, Counter, Histogram
+        
+        registry = Registry()
+        fixes = registry.register(Counter('test_fixes_total', 'Fixes', ('outcome',)))
+        timings = registry.register(Histogram('test_seconds', 'Timings', buckets=(0.1, 1)))
+        fixes.inc(outcome='success')
+        timings.observe(0.5)
+        
+        text = registry.render()
+        expected = ['test_fixes_total{outcome="success"} 1', 'test_seconds_bucket{le="1"} 1', 'test_seconds_count 1']
+        missing = [line for line in expected if line not in text]
+        if missing:
+            print(f"❌ Missing series: {missing}")
+            return False
+        print("✅ Counters and histograms rendered in Prometheus format")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Instrumentation test failed: {e}")
+        return False
+
+def test_benchmark_harness():
+    """Test the benchmark suite against the psutil stub"""
+    print("\nTesting Benchmark Harness...")
+    
+    try:
+        from benchmark import run_benchmarks, measure_import
+        
+        results = run_benchmarks(iterations=2, processes=200, include_api=False)
+        for name, result in results.items():
+            if result['p50_ms'] <= 0 or result['p99_ms'] < result['p50_ms']:
+                print(f"❌ Bad measurement for {name}: {result}")
+                return False
+        print(f"✅ {len(results)} benchmark cases measured")
+        
+        startup = measure_import('app', runs=1)
+        if startup['imports_openai']:
+            print("❌ Importing app pulled in openai")
+            return False
+        print(f"✅ Cold import of app: {startup['p50_ms']} ms")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Benchmark harness test failed: {e}")
+        return False
+
+def test_data_sources():
+    """Test trace recording and replay through IssueDiagnoser"""
+    print("\nTesting Data Sources...")
+    
+    try:
+        import os
+        import tempfile
+        from benchmark import FakePsutil
+        from data_sources import record_trace, replay_diagnosis
+        
+        path = os.path.join(tempfile.mkdtemp(), 'trace.jsonl.gz')
+        frames = record_trace(path, frames=3, interval=0, source=FakePsutil(num_processes=50, blocking_scale=0))
+        print(f"✅ Recorded {frames} frames ({os.path.getsize(path)} bytes)")
+        
+        replayed = list(replay_diagnosis(path))
+        if len(replayed) != frames:
+            print(f"❌ Replayed {len(replayed)} of {frames} frames")
+            return False
+        print(f"✅ Replayed {len(replayed)} frames, {len(replayed[-1][1]['issues'])} issues in the last")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Data source test failed: {e}")
+        return False
+
+def test_postmortem():
+    """Test post-mortem timeline analysis across time slices"""
+    print("\nTesting Post-mortem Analysis...")
+    
+    try:
+        import os
+        import tempfile
+        from benchmark import FakePsutil
+        from data_sources import record_trace
+        from postmortem import analyse
+        
+        path = os.path.join(tempfile.mkdtemp(), 'trace.jsonl')
+        record_trace(path, frames=6, interval=0, source=FakePsutil(num_processes=50, blocking_scale=0))
+        
+        single = analyse(path, workers=1)
+        sliced = analyse(path, workers=2, slice_frames=2)
+        if single['frames'] != 6 or single['episodes'] != sliced['episodes']:
+            print(f"❌ Sliced analysis differs: {single['frames']} vs {sliced['frames']} frames")
+            return False
+        print(f"✅ {single['frames']} frames, {len(single['episodes'])} issue episodes, "
+              f"{len(single['offenders'])} offenders")
+        
+        class PinnedPsutil(FakePsutil):
+            def cpu_times(self, percpu=False):
+                times = super().cpu_times(percpu)
+                if not percpu:
+                    return times
+                # Core 0 never idles, so it is pinned from the CPU_CORE_PINNED_SAMPLES-th rate sample on
+                return [times[0]._replace(idle=0, user=times[0].user + times[0].idle)] + times[1:]
+        
+        path = os.path.join(tempfile.mkdtemp(), 'pinned.jsonl')
+        record_trace(path, frames=8, interval=0, source=PinnedPsutil(num_processes=50, blocking_scale=0))
+        single = analyse(path, workers=1)
+        sliced = analyse(path, workers=2, slice_frames=2)
+        pinned = [e for e in single['episodes'] if e['title'].startswith('Single-Core Saturation')]
+        if not pinned or single != sliced:
+            print(f"❌ Pinned core across slice boundaries differs: serial {single['episodes']}, "
+                  f"sliced {sliced['episodes']}")
+            return False
+        print(f"✅ Pinned core across slice boundaries reported as in a serial replay: {pinned[0]['title']}")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Post-mortem test failed: {e}")
+        return False
+
+def test_openai_client():
+    """Test pooling, retries and coalescing of the OpenAI client against a local mock server"""
+    print("\nTesting OpenAI Client...")
+    
+    server = None
+    try:
+        import json
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from openai_client import OpenAIClient
+        from chat_agent import ChatAgent
+        
+        seen = {'requests': 0, 'connections': set()}
+        
+        class MockOpenAI(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # keep-alive, so connection reuse is visible
+            
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                seen['requests'] += 1
+                seen['connections'].add(self.client_address)
+                if seen['requests'] == 1:
+                    self._reply(429, {'error': {'message': 'Rate limit', 'type': 'requests'}},
+                                {'Retry-After': '0'})
+                    return
+                if body['messages'][-1]['content'] == 'slow' or body['messages'][-1]['content'].startswith('Based on'):
+                    time.sleep(0.3)
+                self._reply(200, {
+                    'id': 'mock', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': 'pong'}}],
+                    'usage': {'prompt_tokens': 3, 'completion_tokens': 1, 'total_tokens': 4}
+                })
+            
+            def _reply(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('127.0.0.1', 0), MockOpenAI)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = OpenAIClient(api_key='test-key', api_base=f'http://127.0.0.1:{server.server_port}/v1')
+        
+        for _ in range(3):
+            response = client.chat_completion([{'role': 'user', 'content': 'ping'}])
+        if response.choices[0].message.content != 'pong' or client.stats['retries'] != 1:
+            print(f"❌ Unexpected response or retries: {client.stats}")
+            return False
+        if len(seen['connections']) != 1:
+            print(f"❌ Sequential calls used {len(seen['connections'])} connections")
+            return False
+        print(f"✅ 429 retried, {seen['requests']} requests over one pooled connection")
+        
+        before = seen['requests']
+        threads = [threading.Thread(target=client.chat_completion,
+                                    args=([{'role': 'user', 'content': 'slow'}],),
+                                    kwargs={'coalesce': True}) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if seen['requests'] - before != 1:
+            print(f"❌ Coalescing sent {seen['requests'] - before} requests")
+            return False
+        print(f"✅ 4 identical concurrent requests coalesced into 1 ({client.stats['coalesced']} shared)")
+        
+        class JitteryDiagnostics:
+            calls = 0
+            
+            def get_full_diagnostic(self):
+                # Live readings differ a little between two dashboards' requests
+                JitteryDiagnostics.calls += 1
+                jitter = JitteryDiagnostics.calls * 0.3
+                return {'cpu': {'usage': 61.2 + jitter}, 'memory': {'percent': 48.9 - jitter},
+                        'disk': [{'percent': 70.1}],
+                        'processes': {'top_cpu': [{'name': 'a', 'cpu_percent': 30.4 + jitter, 'memory_percent': 2},
+                                                  {'name': 'b', 'cpu_percent': 29.9 - jitter, 'memory_percent': 1}]}}
+        
+        class UnsureResponder:
+            def answer(self, message):
+                return {'success': True, 'confident': False, 'response': 'local', 'source': 'local'}
+        
+        agent = ChatAgent(diagnostics=JitteryDiagnostics(), responder=UnsureResponder())
+        agent.api_key, agent.client = 'test-key', client
+        agent.conversation_history = [{'role': 'user', 'content': 'earlier question'}]
+        before = seen['requests']
+        answers = []
+        threads = [threading.Thread(target=lambda: answers.append(agent.get_quick_analysis())) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if seen['requests'] - before != 1 or [a.get('source') for a in answers] != ['openai', 'openai']:
+            print(f"❌ Two concurrent quick analyses sent {seen['requests'] - before} requests: {answers}")
+            return False
+        print("✅ Two concurrent quick analyses of jittering metrics made 1 upstream request")
+        
+        return True
+    except Exception as e:
+        print(f"❌ OpenAI client test failed: {e}")
+        return False
+    finally:
+        if server:
+            server.shutdown()
+
+def test_local_responder():
+    """Test the offline chat responder and the local fallback in ChatAgent"""
+    print("\nTesting Local Responder...")
+    
+    try:
+        import time
+        from config import Config
+        from local_responder import LocalResponder
+        from chat_agent import ChatAgent
+        
+        responder = LocalResponder()
+        responder.answer('warm up the index')
+        started = time.perf_counter()
+        result = responder.answer('How do I kill a process that is hogging the CPU?')
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if not result['confident'] or result['source'] != 'local' or result['matched'] != 'kill_process':
+            print(f"❌ Expected a confident local answer: {result}")
+            return False
+        print(f"✅ Answered from '{result['matched']}' in {elapsed_ms:.1f} ms "
+              f"(confidence {result['confidence']})")
+        
+        result = responder.answer('write me a poem about the sea')
+        if result['confident']:
+            print(f"❌ Unrelated question matched confidently: {result['matched']}")
+            return False
+        print(f"✅ Unrelated question not confident (confidence {result['confidence']})")
+        
+        original_key = Config.OPENAI_API_KEY
+        Config.OPENAI_API_KEY = None
+        try:
+            agent = ChatAgent(responder=responder)
+            result = agent.chat('my disk is full, what can I clean up?')
+        finally:
+            Config.OPENAI_API_KEY = original_key
+        if not result['success'] or result['source'] != 'local' or len(agent.conversation_history) != 2:
+            print(f"❌ Unconfigured chat did not fall back to the local answer: {result}")
+            return False
+        print("✅ Chat without an API key answered locally")
+        
+        class BrokenClient:
+            def module(self):
+                raise ImportError('No module named openai')
+        
+        agent = ChatAgent(responder=responder)
+        agent.api_key, agent.client = 'test-key', BrokenClient()
+        result = agent.chat('write me a poem about the sea')
+        if result.get('source') != 'local' or not result.get('fallback') or 'openai' not in result.get('llm_error', ''):
+            print(f"❌ Failing LLM call did not fall back to the local answer: {result}")
+            return False
+        print("✅ LLM call raising ImportError fell back to the local answer")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Local responder test failed: {e}")
+        return False
+
+def test_admission_control():
+    """Test concurrency limits, coalescing, token buckets and the 429 response"""
+    print("\nTesting Admission Control...")
+    
+    try:
+        import threading
+        import time
+        import admission
+        from admission import AdmissionController, AdmissionRejected
+        
+        calls = []
+        def slow():
+            calls.append(1)
+            time.sleep(0.3)
+            return {'calls': len(calls)}
+        
+        controller = AdmissionController(limits={'slow': {'concurrency': 1, 'queue': 1, 'rate': 100, 'burst': 100}})
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.append(controller.run('slow', f'c{i}', slow, key='same')))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if len(calls) != 1 or len(results) != 5:
+            print(f"❌ Identical requests not coalesced: {len(calls)} computations for {len(results)} results")
+            return False
+        print("✅ 5 identical requests served by 1 computation")
+        
+        errors = []
+        def distinct(key):
+            try:
+                controller.run('slow', 'c', slow, key=key)
+            except AdmissionRejected as e:
+                errors.append(e)
+        threads = [threading.Thread(target=distinct, args=(key,)) for key in ('a', 'b', 'c')]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        if len(errors) != 1 or errors[0].retry_after < 1:
+            print(f"❌ Expected one request rejected by the full queue, got {errors}")
+            return False
+        print(f"✅ One running, one queued, one rejected with Retry-After {errors[0].retry_after}s")
+        
+        limited = AdmissionController(limits={'slow': {'concurrency': 2, 'queue': 2, 'rate': 0.1, 'burst': 2}})
+        limited.run('slow', 'greedy', dict)
+        limited.run('slow', 'greedy', dict)
+        try:
+            limited.run('slow', 'greedy', dict)
+            print("❌ Client over its burst was admitted")
+            return False
+        except AdmissionRejected as e:
+            if e.retry_after != 10:
+                print(f"❌ Unexpected Retry-After {e.retry_after}")
+                return False
+        limited.run('slow', 'polite', dict)
+        print("✅ Per-client token bucket rejects only the greedy client")
+        
+        import app as sptool_app
+        original = admission._shared_controller
+        admission._shared_controller = AdmissionController(
+            limits={'diagnosis': {'concurrency': 1, 'queue': 1, 'rate': 0.5, 'burst': 1}})
+        try:
+            admission._shared_controller._bucket('127.0.0.1', 'diagnosis',
+                                                 admission._shared_controller._endpoints['diagnosis']).acquire()
+            response = sptool_app.app.test_client().get('/api/diagnosis/full')
+        finally:
+            admission._shared_controller = original
+        if response.status_code != 429 or response.headers.get('Retry-After') != '2':
+            print(f"❌ Expected 429 with Retry-After, got {response.status_code} {dict(response.headers)}")
+            return False
+        print("✅ /api/diagnosis/full answers 429 with Retry-After when the client is over its rate")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Admission control test failed: {e}")
+        return False
+
+def test_metrics_history():
+    """Test snapshot recording, the ring bound and diffs of processes, mounts and metrics"""
+    print("\nTesting Metrics History...")
+    
+    child = None
+    try:
+        import subprocess
+        import sys
+        import time
+        from collections import namedtuple
+        from config import Config
+        from data_sources import LiveSource
+        from metrics_history import MetricsHistory
+        
+        Partition = namedtuple('Partition', 'device mountpoint fstype opts')
+        
+        class Source(LiveSource):
+            extra_partitions = []
+            
+            def disk_partitions(self, all=False):
+                return LiveSource.__getattr__(self, 'disk_partitions')(all) + self.extra_partitions
+        
+        class Sampler:
+            memory = {'total': 8 * 1024 ** 3, 'available': 6 * 1024 ** 3, 'percent': 25.0, 'swap_percent': 0.0}
+            
+            network = None
+            
+            def get(self, section):
+                return {'memory': dict(self.memory), 'network': self.network}.get(section)
+        
+        source, sampler = Source(), Sampler()
+        history = MetricsHistory(source=source, sampler=sampler)
+        first = history.record()
+        
+        child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+        source.extra_partitions = [Partition('tmpfs', '/sptool-test', 'tmpfs', 'rw')]
+        sampler.memory = dict(sampler.memory, available=1024 ** 3, percent=87.5)
+        sampler.network = {'interfaces': {'veth0': dict.fromkeys(
+            ('bytes_recv', 'bytes_sent', 'errin', 'errout', 'dropin', 'dropout'), 0.0)}}
+        second = history.record()
+        sampler.network = None
+        
+        diff = history.diff(from_id=first, to_id=second)
+        if child.pid not in [p['pid'] for p in diff['processes']['new']]:
+            print(f"❌ Started process not reported as new: {diff['processes']}")
+            return False
+        if [m[0] for m in diff['mounts']['added']] != ['/sptool-test']:
+            print(f"❌ Added mount not reported: {diff['mounts']}")
+            return False
+        moved = {m['name'] for m in diff['metrics']}
+        if not {'memory_percent', 'memory_available_bytes'} <= moved or 'swap_percent' in moved:
+            print(f"❌ Unexpected moved metrics: {sorted(moved)}")
+            return False
+        print(f"✅ Diff reports the new process, the added mount and {len(moved)} moved metrics")
+        
+        child.kill()
+        child.wait()
+        third = history.record()
+        diff = history.diff(from_id=second)
+        if diff['to']['id'] != third or child.pid not in [p['pid'] for p in diff['processes']['vanished']]:
+            print(f"❌ Exited process not reported as vanished: {diff['processes']['vanished']}")
+            return False
+        if history.diff(from_time=time.time() + 1)['from']['id'] != third:
+            print("❌ Timestamp not resolved to the latest snapshot before it")
+            return False
+        print("✅ Exited process reported as vanished; timestamps resolve to snapshots")
+        
+        original = Config.HISTORY_SNAPSHOTS
+        Config.HISTORY_SNAPSHOTS = 2
+        try:
+            history.record()
+        finally:
+            Config.HISTORY_SNAPSHOTS = original
+        ids = [s['id'] for s in history.snapshots()]
+        if ids != [third, third + 1] or 'error' not in history.diff(from_id=first):
+            print(f"❌ History not bounded: {ids}")
+            return False
+        stale = [name for name in history._columns if name.startswith('net_veth0_')]
+        if stale:
+            print(f"❌ Series of a vanished interface kept after trimming: {stale}")
+            return False
+        print("✅ Oldest snapshots and the series only they had dropped beyond HISTORY_SNAPSHOTS")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Metrics history test failed: {e}")
+        return False
+    finally:
+        if child is not None and child.poll() is None:
+            child.kill()
+
 def test_flask_app():
     """Test Flask application initialization"""
     print("\nTesting Flask App...")
@@ -180,8 +1533,29 @@ def main():
     
     results.append(("Module Imports", test_imports()))
     results.append(("System Diagnostics", test_system_diagnostics()))
+    results.append(("Process Drill-down", test_process_drilldown()))
+    results.append(("Process Groups", test_process_groups()))
+    results.append(("Metrics Sampler", test_metrics_sampler()))
+    results.append(("Per-core CPU Analysis", test_cpu_cores()))
+    results.append(("Memory Breakdown", test_memory_breakdown()))
+    results.append(("Degraded Mode", test_degraded_mode()))
+    results.append(("Disk Usage Analyzer", test_disk_usage()))
+    results.append(("Temp Cleanup", test_temp_cleanup()))
     results.append(("Command Executor", test_command_executor()))
+    results.append(("Audit Log", test_audit_log()))
+    results.append(("Fix Impact", test_fix_impact()))
+    results.append(("Auto-remediation", test_remediation()))
+    results.append(("Alert Dispatcher", test_alerts()))
+    results.append(("Leak Detector", test_leak_detector()))
     results.append(("Issue Diagnosis", test_issue_diagnosis()))
+    results.append(("Instrumentation", test_instrumentation()))
+    results.append(("OpenAI Client", test_openai_client()))
+    results.append(("Local Responder", test_local_responder()))
+    results.append(("Benchmark Harness", test_benchmark_harness()))
+    results.append(("Data Sources", test_data_sources()))
+    results.append(("Post-mortem Analysis", test_postmortem()))
+    results.append(("Admission Control", test_admission_control()))
+    results.append(("Metrics History", test_metrics_history()))
     results.append(("Flask Application", test_flask_app()))
     
     print("\n" + "=" * 60)
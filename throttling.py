@@ -0,0 +1,45 @@
+"""
+Throttling Module
+Primitives shared by the OpenAI client and admission control: a token-bucket
+rate limit and the record of a computation in flight that identical requests
+wait on instead of repeating it
+"""
+import threading
+import time
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting up to `timeout` seconds; returns False if none became available"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+class InflightCall:
+    """A computation one thread runs while others with the same key wait for its result"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None